@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the Waybar updates module
+Runs both entry points against stub package manager binaries and fixture pacman
+databases, and writes latency and peak memory results as JSON so releases can be
+compared
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = REPO_ROOT / "src"
+
+# Entry point name -> (script, arguments producing Waybar output)
+ENTRY_POINTS = {
+    "simple": (SRC_DIR / "arch_updates_simple.py", []),
+    "gui": (SRC_DIR / "arch_updates.py", ["--check"]),
+}
+# Entry point name -> (module, class) used for the in-process timings
+IMPLEMENTATIONS = {
+    "simple": ("update_checker", "ArchUpdateChecker"),
+    "gui": ("update_manager", "ArchUpdateManager"),
+}
+BACKEND_MODES = ("checkupdates", "native")
+SCENARIOS = ("startup", "cold_start", "warm_poll", "full_refresh")
+
+RESULTS_SCHEMA = 1
+
+STUB_TEMPLATE = """#!/bin/sh
+sleep {delay}
+cat '{output}'
+exit {code}
+"""
+
+
+def write_stub(stub_dir: Path, name: str, lines: List[str], delay: float, empty_code: int = 0):
+    """Create an executable that sleeps, prints canned output and exits like the real tool"""
+    output = stub_dir / f"{name}.out"
+    output.write_text("".join(f"{line}\n" for line in lines))
+    stub = stub_dir / name
+    stub.write_text(
+        STUB_TEMPLATE.format(delay=delay, output=output, code=0 if lines else empty_code)
+    )
+    stub.chmod(0o755)
+
+
+def write_stubs(stub_dir: Path, args) -> None:
+    """Stub checkupdates, yay, paru and journalctl with the configured delay and output size"""
+    stub_dir.mkdir(parents=True, exist_ok=True)
+    repo_lines = [f"bench-pkg-{i:05d} 1.0-1 -> 1.1-1" for i in range(args.repo_updates)]
+    aur_lines = [f"bench-aur-{i:05d} 1.0-1 -> 1.1-1" for i in range(args.aur_updates)]
+    # journalctl -o json --show-cursor output; the stub ignores --after-cursor, so every scan reads it all
+    journal_lines = [
+        json.dumps(
+            {
+                "__CURSOR": f"s=bench;i={i:x}",
+                "__REALTIME_TIMESTAMP": str(1700000000000000 + i * 1000000),
+                "PRIORITY": "3",
+                "_TRANSPORT": "kernel",
+                "MESSAGE": f"benchmark error {i % 5}",
+            }
+        )
+        for i in range(args.journal_lines)
+    ]
+    if journal_lines:
+        journal_lines.append(f"-- cursor: s=bench;i={args.journal_lines - 1:x}")
+    # checkupdates exits with 2 and the helpers with 1 when there is nothing to update
+    write_stub(stub_dir, "checkupdates", repo_lines, args.checkupdates_delay, empty_code=2)
+    write_stub(stub_dir, "yay", aur_lines, args.aur_delay, empty_code=1)
+    write_stub(stub_dir, "paru", aur_lines, args.aur_delay, empty_code=1)
+    write_stub(stub_dir, "journalctl", journal_lines, args.journal_delay)
+
+
+def _desc(name: str, version: str) -> bytes:
+    return f"%NAME%\n{name}\n\n%VERSION%\n{version}\n\n%CSIZE%\n1048576\n\n%ISIZE%\n4194304\n\n".encode()
+
+
+def write_fixture_dbs(db_path: Path, packages: int, updates: int) -> Path:
+    """Create a local DB and a core sync DB where the first `updates` packages are outdated"""
+    local = db_path / "local"
+    sync = db_path / "sync"
+    local.mkdir(parents=True, exist_ok=True)
+    sync.mkdir(parents=True, exist_ok=True)
+    (local / "ALPM_DB_VERSION").write_text("9\n")
+    with tarfile.open(sync / "core.db", "w:gz") as archive:
+        for i in range(packages):
+            name = f"bench-pkg-{i:05d}"
+            entry = local / f"{name}-1.0-1"
+            entry.mkdir(exist_ok=True)
+            (entry / "desc").write_bytes(_desc(name, "1.0-1"))
+            version = "1.1-1" if i < updates else "1.0-1"
+            data = _desc(name, version)
+            info = tarfile.TarInfo(f"{name}-{version}/desc")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    pacman_conf = db_path / "pacman.conf"
+    pacman_conf.write_text("[options]\nArchitecture = auto\n\n[core]\nServer = file:///dev/null\n")
+    return pacman_conf
+
+
+def write_config(path: Path, backend_mode: str, db_path: Path) -> Path:
+    """Minimal config checking pacman, yay and paru, with a TTL long enough for warm polls"""
+    config = {
+        "update_settings": {
+            "check_interval": 3600,
+            "check_timeout": 30,
+            "pacman_backend": backend_mode,
+            "sync_db_path": str(db_path),
+            "package_managers": ["pacman", "yay", "paru"],
+            "icons": {"no_updates": "0", "updates_available": "U", "updating": "R", "error": "E"},
+            "colors": {
+                "no_updates": "#588157",
+                "updates_available": "#f9c74f",
+                "updating": "#277da1",
+                "error": "#e63946",
+            },
+        }
+    }
+    path.write_text(json.dumps(config, indent=2))
+    return path
+
+
+def bench_environment(work_dir: Path, stub_dir: Path, db_path: Path, pacman_conf: Path) -> Dict[str, str]:
+    """Environment that isolates runs from the real system, daemon and caches"""
+    runtime_dir = work_dir / "runtime"
+    runtime_dir.mkdir(mode=0o700, exist_ok=True)
+    env = dict(os.environ)
+    env.update(
+        {
+            "PATH": os.pathsep.join([str(stub_dir), str(Path(sys.executable).parent), "/usr/bin", "/bin"]),
+            "XDG_RUNTIME_DIR": str(runtime_dir),
+            "CHECKUPDATES_DB": str(work_dir / "checkup-db"),
+            "WAYBAR_UPDATES_DBPATH": str(db_path),
+            "WAYBAR_UPDATES_PACMAN_CONF": str(pacman_conf),
+        }
+    )
+    return env
+
+
+def run_measured(cmd: List[str], env: Dict[str, str]) -> Tuple[float, int, int]:
+    """Run a command; return wall time in ms, peak RSS in KiB and the exit status"""
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # wait4 reports the resource usage of this child alone
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = (time.perf_counter() - started) * 1000
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return elapsed, usage.ru_maxrss, proc.returncode
+
+
+def summarize(samples: List[float], rss: List[int], failures: int) -> Dict:
+    """Reduce raw samples to the statistics stored in the results file"""
+    return {
+        "runs": len(samples),
+        "failures": failures,
+        "wall_ms": {
+            "min": round(min(samples), 3),
+            "median": round(statistics.median(samples), 3),
+            "mean": round(statistics.fmean(samples), 3),
+            "max": round(max(samples), 3),
+        },
+        "max_rss_kb": max(rss) if rss else None,
+    }
+
+
+def run_scenario(
+    scenario: str, script: Path, args: List[str], config: Path, env: Dict[str, str], cache_home: Path, repeat: int
+) -> Dict:
+    """Time one scenario of one entry point repeat times"""
+    base = [sys.executable, str(script), "--config", str(config), "--no-daemon"]
+    if scenario == "startup":
+        cmd = [sys.executable, str(script), "--help"]
+    elif scenario == "full_refresh":
+        cmd = base + args + ["--refresh"]
+    else:
+        cmd = base + args
+    env = dict(env, XDG_CACHE_HOME=str(cache_home))
+
+    if scenario == "warm_poll":
+        shutil.rmtree(cache_home, ignore_errors=True)
+        run_measured(cmd, env)
+
+    samples, rss, failures = [], [], 0
+    for _ in range(repeat):
+        if scenario == "cold_start":
+            shutil.rmtree(cache_home, ignore_errors=True)
+        elapsed, peak, returncode = run_measured(cmd, env)
+        samples.append(elapsed)
+        rss.append(peak)
+        failures += returncode != 0
+    return summarize(samples, rss, failures)
+
+
+def inprocess_main(entry: str, config: str, repeat: int):
+    """Time check_all_updates() and get_waybar_output() inside one interpreter and print JSON"""
+    module_name, class_name = IMPLEMENTATIONS[entry]
+    sys.path.insert(0, str(SRC_DIR))
+    started = time.perf_counter()
+    module = __import__(module_name)
+    import_ms = (time.perf_counter() - started) * 1000
+    checker_class = getattr(module, class_name)
+
+    started = time.perf_counter()
+    checker = checker_class(config_path=config)
+    init_ms = (time.perf_counter() - started) * 1000
+
+    timings = {"check_all_updates_forced": [], "check_all_updates_cached": [], "get_waybar_output": []}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        counts = checker.check_all_updates(force=True)
+        timings["check_all_updates_forced"].append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        counts = checker.check_all_updates()
+        timings["check_all_updates_cached"].append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        checker.get_waybar_output(counts)
+        timings["get_waybar_output"].append((time.perf_counter() - started) * 1000)
+        if hasattr(checker, "check_journal_errors"):
+            started = time.perf_counter()
+            checker.check_journal_errors()
+            timings.setdefault("check_journal_errors", []).append((time.perf_counter() - started) * 1000)
+    timings["import"] = [import_ms]
+    timings["init"] = [init_ms]
+    print(json.dumps(timings))
+
+
+def run_inprocess(entry: str, config: Path, env: Dict[str, str], cache_home: Path, repeat: int) -> Dict[str, Dict]:
+    """Run the in-process timings in a fresh interpreter so imports are not shared"""
+    shutil.rmtree(cache_home, ignore_errors=True)
+    result = subprocess.run(
+        [sys.executable, __file__, "--inprocess", entry, "--config", str(config), "--repeat", str(repeat)],
+        env=dict(env, XDG_CACHE_HOME=str(cache_home)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(f"Warning: in-process benchmark of {entry} failed: {result.stderr.strip()}", file=sys.stderr)
+        return {}
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return {f"inprocess/{name}": summarize(samples, [], 0) for name, samples in timings.items()}
+
+
+def git_revision() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(REPO_ROOT), "describe", "--always", "--dirty", "--tags"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (subprocess.SubprocessError, FileNotFoundError):
+        return "unknown"
+    return result.stdout.strip() or "unknown"
+
+
+def run_benchmarks(args) -> Dict:
+    """Run every selected entry point, backend mode and scenario"""
+    work_dir = Path(tempfile.mkdtemp(prefix="waybar-updates-bench-"))
+    try:
+        stub_dir = work_dir / "bin"
+        db_path = work_dir / "pacman"
+        write_stubs(stub_dir, args)
+        pacman_conf = write_fixture_dbs(db_path, args.packages, args.repo_updates)
+        env = bench_environment(work_dir, stub_dir, db_path, pacman_conf)
+
+        results = {}
+        for mode in args.modes:
+            config = write_config(work_dir / f"config-{mode}.json", mode, db_path)
+            for entry in args.entries:
+                script, entry_args = ENTRY_POINTS[entry]
+                cache_home = work_dir / f"cache-{entry}-{mode}"
+                for scenario in args.scenarios:
+                    print(f"Running {entry}/{mode}/{scenario}...", file=sys.stderr)
+                    results[f"{entry}/{mode}/{scenario}"] = run_scenario(
+                        scenario, script, entry_args, config, env, cache_home, args.repeat
+                    )
+                if args.inprocess_timings:
+                    for name, summary in run_inprocess(entry, config, env, cache_home, args.repeat).items():
+                        results[f"{entry}/{mode}/{name}"] = summary
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "schema": RESULTS_SCHEMA,
+        "generated": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "repeat": args.repeat,
+            "packages": args.packages,
+            "repo_updates": args.repo_updates,
+            "aur_updates": args.aur_updates,
+            "journal_lines": args.journal_lines,
+            "checkupdates_delay": args.checkupdates_delay,
+            "aur_delay": args.aur_delay,
+            "journal_delay": args.journal_delay,
+        },
+        "results": results,
+    }
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float) -> bool:
+    """Print median changes against a baseline; False if any scenario regressed past threshold"""
+    ok = True
+    print(f"{'benchmark':<50} {'baseline':>10} {'current':>10} {'ratio':>7}", file=sys.stderr)
+    for name, result in sorted(current["results"].items()):
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        old = before["wall_ms"]["median"]
+        new = result["wall_ms"]["median"]
+        ratio = new / old if old else 1.0
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<50} {old:>9.1f}ms {new:>9.1f}ms {ratio:>6.2f}x{flag}", file=sys.stderr)
+    return ok
+
+
+def _csv(value: str, allowed) -> List[str]:
+    items = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown choice(s): {', '.join(unknown)}")
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Waybar updates module")
+    parser.add_argument("--output", help="Write the results JSON to this file (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare medians against an earlier results file")
+    parser.add_argument(
+        "--threshold", type=float, default=1.25, help="Median ratio counted as a regression (default: 1.25)"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario (default: 5)")
+    parser.add_argument(
+        "--entries",
+        type=lambda v: _csv(v, ENTRY_POINTS),
+        default=list(ENTRY_POINTS),
+        help="Comma-separated entry points: simple,gui",
+    )
+    parser.add_argument(
+        "--modes",
+        type=lambda v: _csv(v, BACKEND_MODES),
+        default=list(BACKEND_MODES),
+        help="Comma-separated pacman backends: checkupdates,native",
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=lambda v: _csv(v, SCENARIOS),
+        default=list(SCENARIOS),
+        help="Comma-separated scenarios: startup,cold_start,warm_poll,full_refresh",
+    )
+    parser.add_argument(
+        "--no-inprocess", dest="inprocess_timings", action="store_false",
+        help="Skip the in-process check_all_updates()/get_waybar_output() timings",
+    )
+    parser.add_argument("--packages", type=int, default=1500, help="Installed packages in the fixture DB")
+    parser.add_argument("--repo-updates", type=int, default=40, help="Pending repo updates")
+    parser.add_argument("--aur-updates", type=int, default=5, help="Pending AUR updates")
+    parser.add_argument("--journal-lines", type=int, default=20, help="Lines printed by the journalctl stub")
+    parser.add_argument("--checkupdates-delay", type=float, default=0.5, help="Seconds checkupdates takes")
+    parser.add_argument("--aur-delay", type=float, default=0.8, help="Seconds yay and paru take")
+    parser.add_argument("--journal-delay", type=float, default=0.05, help="Seconds journalctl takes")
+    # Internal: child process for the in-process timings
+    parser.add_argument("--inprocess", choices=list(ENTRY_POINTS), help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.inprocess:
+        inprocess_main(args.inprocess, args.config, args.repeat)
+        return
+
+    report = run_benchmarks(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if not compare_results(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
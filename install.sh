@@ -150,8 +150,33 @@ install_files() {
     print_colored "$YELLOW" "📄 Installing core scripts..."
     cp src/arch_updates.py "$scripts_dir/" || return 1
     cp src/arch_updates_simple.py "$scripts_dir/" || return 1
+    cp src/update_manager.py "$scripts_dir/" || return 1
+    cp src/update_checker.py "$scripts_dir/" || return 1
     cp scripts/update_terminal.sh "$scripts_dir/" || return 1
 
+    # Copy shared modules imported by the core scripts
+    cp src/update_cache.py "$scripts_dir/" || return 1
+    cp src/check_engine.py "$scripts_dir/" || return 1
+    cp src/update_daemon.py "$scripts_dir/" || return 1
+    cp src/waybar_watch.py "$scripts_dir/" || return 1
+    cp src/pacman_watch.py "$scripts_dir/" || return 1
+    cp src/pacman_db.py "$scripts_dir/" || return 1
+    cp src/package_index.py "$scripts_dir/" || return 1
+    cp src/aur_rpc.py "$scripts_dir/" || return 1
+    cp src/backends.py "$scripts_dir/" || return 1
+    cp src/check_schedule.py "$scripts_dir/" || return 1
+    cp src/prefetch.py "$scripts_dir/" || return 1
+    cp src/fleet.py "$scripts_dir/" || return 1
+    cp src/lan_cache.py "$scripts_dir/" || return 1
+    cp src/metrics.py "$scripts_dir/" || return 1
+    cp src/poll_snapshot.py "$scripts_dir/" || return 1
+    cp src/journal_scan.py "$scripts_dir/" || return 1
+    cp src/update_executor.py "$scripts_dir/" || return 1
+    cp src/upgrade_plan.py "$scripts_dir/" || return 1
+    cp src/aur_build.py "$scripts_dir/" || return 1
+    cp src/pacman_log.py "$scripts_dir/" || return 1
+    cp src/update_history.py "$scripts_dir/" || return 1
+
     # Copy configuration
     if [ ! -f "$scripts_dir/update_config.json" ]; then
         cp scripts/update_config.json "$scripts_dir/" || return 1
@@ -21,6 +21,12 @@ WHITE='\033[1;37m'
 BOLD='\033[1m'
 NC='\033[0m' # No Color
 
+# Update checker installed next to this script
+CHECKER="$(dirname "$(readlink -f "${BASH_SOURCE[0]}")")/arch_updates_simple.py"
+
+# Packages downloaded ahead of time by the update checker's prefetch
+PREFETCH_CACHE="${XDG_CACHE_HOME:-$HOME/.cache}/waybar-updates/pkg"
+
 # Function to print with colors
 print_colored() {
     local color=$1
@@ -41,6 +47,21 @@ print_header() {
 check_updates() {
     print_colored "$BLUE" "🔍 Checking for available updates..."
     
+    # Prefer the per-package details cached by the update checker
+    UPDATE_DETAILS=""
+    if [ -x "$CHECKER" ] && UPDATE_DETAILS=$("$CHECKER" --list 2>/dev/null); then
+        AUR_UPDATES=$(grep -c '^aur/' <<< "$UPDATE_DETAILS")
+        TOTAL_UPDATES=$(grep -c . <<< "$UPDATE_DETAILS")
+        PACMAN_UPDATES=$((TOTAL_UPDATES - AUR_UPDATES))
+        print_update_summary
+        if [ -n "$UPDATE_DETAILS" ]; then
+            print_colored "$WHITE" "📦 Pending packages:"
+            sed 's/^/   /' <<< "$UPDATE_DETAILS"
+            echo
+        fi
+        return
+    fi
+    
     # Check pacman updates
     if command -v checkupdates >/dev/null 2>&1; then
         PACMAN_UPDATES=$(checkupdates 2>/dev/null | wc -l)
@@ -57,7 +78,11 @@ check_updates() {
     fi
     
     TOTAL_UPDATES=$((PACMAN_UPDATES + AUR_UPDATES))
-    
+    print_update_summary
+}
+
+# Function to print update counts
+print_update_summary() {
     echo
     print_colored "$WHITE" "📊 Update Summary:"
     print_colored "$GREEN" "   Official packages: $PACMAN_UPDATES"
@@ -66,6 +91,15 @@ check_updates() {
     echo
 }
 
+# Function to build pacman options that reuse prefetched packages
+pacman_cache_args() {
+    if [ -n "${WAYBAR_UPDATES_CACHEDIRS:-}" ]; then
+        echo "$WAYBAR_UPDATES_CACHEDIRS"
+    elif compgen -G "$PREFETCH_CACHE/*.pkg.tar*" >/dev/null; then
+        echo "--cachedir /var/cache/pacman/pkg --cachedir $(printf '%q' "$PREFETCH_CACHE")"
+    fi
+}
+
 # Function to show menu
 show_menu() {
     print_colored "$WHITE" "📋 Available Actions:"
@@ -151,16 +185,19 @@ run_interactive_mode() {
         
         case $choice in
             1)
-                if command -v yay >/dev/null 2>&1; then
-                    execute_with_progress "sudo pacman -Syu && yay -Syu" "Updating all packages"
+                if [ -x "$CHECKER" ]; then
+                    # One planned transaction: fresh sync DBs are not synced again, AUR builds only what is pending
+                    execute_with_progress "$(printf '%q' "$CHECKER") --upgrade" "Updating all packages"
+                elif command -v yay >/dev/null 2>&1; then
+                    execute_with_progress "sudo pacman -Syu $(pacman_cache_args) && yay -Syu" "Updating all packages"
                 elif command -v paru >/dev/null 2>&1; then
-                    execute_with_progress "sudo pacman -Syu && paru -Syu" "Updating all packages"
+                    execute_with_progress "sudo pacman -Syu $(pacman_cache_args) && paru -Syu" "Updating all packages"
                 else
-                    execute_with_progress "sudo pacman -Syu" "Updating official packages only"
+                    execute_with_progress "sudo pacman -Syu $(pacman_cache_args)" "Updating official packages only"
                 fi
                 ;;
             2)
-                execute_with_progress "sudo pacman -Syu" "Updating official packages"
+                execute_with_progress "sudo pacman -Syu $(pacman_cache_args)" "Updating official packages"
                 ;;
             3)
                 if command -v yay >/dev/null 2>&1; then
@@ -1,508 +1,29 @@
 #!/usr/bin/env python3
 """
 Arch Linux Update Manager for Waybar
-A comprehensive update checker and system maintenance tool for Hyprland/Waybar
+A comprehensive update checker and system maintenance tool for Hyprland/Waybar;
+the manager and its GUI live in update_manager
 """
 
-import json
-import subprocess
 import sys
-import os
-import time
-import threading
-from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-import argparse
 
-try:
-    import PySimpleGUI as sg
-
-    GUI_AVAILABLE = True
-except ImportError:
-    GUI_AVAILABLE = False
-
-    # Create a minimal sg-like interface for non-GUI operations
-    class sg:
-        @staticmethod
-        def popup(*args, **kwargs):
-            print(" ".join(str(arg) for arg in args))
-            return True
-
-        @staticmethod
-        def popup_scrolled(*args, **kwargs):
-            print(" ".join(str(arg) for arg in args))
-            return True
-
-
-class ArchUpdateManager:
-    def __init__(self, config_path: str = None):
-        self.script_dir = Path(__file__).parent.resolve()
-        self.config_path = self._determine_config_path(config_path)
-        self.cache_file = self.script_dir / ".update_cache.json"
-        self.config = self.load_config()
-        self.last_check = 0
-        self.update_count = {"pacman": 0, "yay": 0, "paru": 0, "total": 0}
-        self.current_status = "checking"
-
-    def _determine_config_path(self, config_path: str = None) -> Path:
-        """Determine config file path with fallback options"""
-        if config_path:
-            return Path(config_path).resolve()
-        
-        # Check environment variable first
-        env_config = os.getenv('WAYBAR_UPDATE_CONFIG')
-        if env_config:
-            env_path = Path(env_config).resolve()
-            if env_path.exists():
-                return env_path
-        
-        # Default to script directory
-        return self.script_dir / "update_config.json"
-
-    def load_config(self) -> Dict:
-        """Load configuration from JSON file with fallback to defaults"""
-        try:
-            if self.config_path.exists():
-                with open(self.config_path, "r") as f:
-                    return json.load(f)
-            else:
-                print(f"Config file not found at {self.config_path}, using defaults", file=sys.stderr)
-                return self._get_default_config()
-        except json.JSONDecodeError as e:
-            print(f"Invalid JSON in config file {self.config_path}: {e}", file=sys.stderr)
-            print("Using default configuration", file=sys.stderr)
-            return self._get_default_config()
-        except (OSError, IOError) as e:
-            print(f"Error reading config file {self.config_path}: {e}", file=sys.stderr)
-            print("Using default configuration", file=sys.stderr)
-            return self._get_default_config()
-
-    def _get_default_config(self) -> Dict:
-        """Return default configuration"""
-        return {
-            "update_settings": {
-                "check_interval": 600,
-                "package_managers": ["pacman", "yay", "paru"],
-                "icons": {
-                    "no_updates": "✅",
-                    "updates_available": "📦",
-                    "updating": "🔄",
-                    "error": "⚠️",
-                },
-                "colors": {
-                    "no_updates": "#588157",
-                    "updates_available": "#f9c74f",
-                    "updating": "#277da1",
-                    "error": "#e63946",
-                },
-            },
-            "gui_settings": {
-                "transparency": 0.9,
-                "popup_width": 300,
-                "popup_height": 400,
-                "button_padding": 10,
-            },
-            "terminal_settings": {
-                "default_terminal": "kitty",
-                "terminal_args": ["-e"],
-                "color_scheme": {
-                    "reset": "\\033[0m",
-                    "bold": "\\033[1m",
-                    "info": "\\033[34m",
-                    "success": "\\033[32m",
-                    "error": "\\033[31m",
-                },
-            },
-            "menu_buttons": [],
-        }
-
-    def get_package_manager_priority(self) -> str:
-        """Determine which package manager to use based on availability"""
-        managers = self.config["update_settings"]["package_managers"]
-        for manager in managers:
-            if subprocess.run(["which", manager], capture_output=True).returncode == 0:
-                return manager
-        return "pacman"  # fallback
-
-    def check_pacman_updates(self) -> Tuple[int, List[str]]:
-        """Check for pacman updates"""
-        try:
-            result = subprocess.run(
-                ["checkupdates"], capture_output=True, text=True, timeout=30
-            )
-            if result.returncode == 0:
-                updates = result.stdout.strip().split("\n")
-                return len([u for u in updates if u.strip()]), updates
-            return 0, []
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-            return 0, []
-
-    def check_aur_updates(self, manager: str = "yay") -> Tuple[int, List[str]]:
-        """Check for AUR updates using yay or paru"""
-        if manager not in ["yay", "paru"]:
-            return 0, []
-
-        try:
-            cmd = [manager, "-Qum"] if manager == "yay" else [manager, "-Qua"]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            if result.returncode == 0:
-                updates = result.stdout.strip().split("\n")
-                return len([u for u in updates if u.strip()]), updates
-            return 0, []
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-            return 0, []
-
-    def check_all_updates(self) -> Dict[str, int]:
-        """Check updates from all package managers"""
-        current_time = time.time()
-
-        # Use cache if within interval
-        if (
-            current_time - self.last_check
-            < self.config["update_settings"]["check_interval"]
-        ):
-            return self.load_cached_updates()
-
-        print("Checking for updates...", file=sys.stderr)
-
-        # Check pacman updates
-        pacman_count, pacman_list = self.check_pacman_updates()
-
-        # Check AUR updates
-        yay_count, yay_list = self.check_aur_updates("yay")
-        paru_count, paru_list = self.check_aur_updates("paru")
-
-        # Update counts
-        self.update_count = {
-            "pacman": pacman_count,
-            "yay": yay_count,
-            "paru": paru_count,
-            "total": pacman_count
-            + max(yay_count, paru_count),  # Avoid double counting AUR
-        }
-
-        # Cache results
-        self.cache_updates()
-        self.last_check = current_time
-
-        return self.update_count
-
-    def load_cached_updates(self) -> Dict[str, int]:
-        """Load cached update counts"""
-        try:
-            if self.cache_file.exists():
-                with open(self.cache_file, "r") as f:
-                    cached = json.load(f)
-                    self.update_count = cached.get("counts", self.update_count)
-                    self.last_check = cached.get("timestamp", 0)
-        except (json.JSONDecodeError, FileNotFoundError, OSError, IOError) as e:
-            print(f"Warning: Could not load cache file {self.cache_file}: {e}", file=sys.stderr)
-        return self.update_count
-
-    def cache_updates(self):
-        """Cache update counts with timestamp"""
-        cache_data = {"counts": self.update_count, "timestamp": time.time()}
-        try:
-            # Ensure parent directory exists
-            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.cache_file, "w") as f:
-                json.dump(cache_data, f)
-        except (OSError, IOError) as e:
-            print(f"Warning: Could not write cache file {self.cache_file}: {e}", file=sys.stderr)
-
-    def get_waybar_output(self) -> str:
-        """Generate JSON output for Waybar"""
-        counts = self.check_all_updates()
-        total = counts["total"]
-        icons = self.config["update_settings"]["icons"]
-        colors = self.config["update_settings"]["colors"]
-
-        if total == 0:
-            icon = icons["no_updates"]
-            css_class = "no-updates"
-            color = colors["no_updates"]
-            tooltip = "System is up to date"
-        else:
-            icon = icons["updates_available"]
-            css_class = "updates-available"
-            color = colors["updates_available"]
-            tooltip = f"Updates available:\nPacman: {counts['pacman']}\nAUR: {max(counts['yay'], counts['paru'])}\nTotal: {total}"
-
-        output = {
-            "text": f"{icon} {total}" if total > 0 else icon,
-            "tooltip": tooltip,
-            "class": css_class,
-            "percentage": min(100, total * 10) if total > 0 else 0,
-        }
-
-        return json.dumps(output)
-
-    def check_journal_errors(self) -> List[str]:
-        """Check journalctl for errors"""
-        try:
-            result = subprocess.run(
-                ["journalctl", "-p", "3", "-n", "20", "--no-pager"],
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                return result.stdout.strip().split("\n")
-            return []
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-            return []
-
-    def execute_command(
-        self, command: str, terminal: bool = True, requires_confirmation: bool = False
-    ) -> bool:
-        """Execute a system command"""
-        colors = self.config["terminal_settings"]["color_scheme"]
-
-        if requires_confirmation:
-            if GUI_AVAILABLE:
-                layout = [
-                    [sg.Text(f"Execute command:", font=("Arial", 12, "bold"))],
-                    [sg.Text(command, font=("Courier", 10), text_color="yellow")],
-                    [sg.Text("Are you sure you want to continue?")],
-                    [
-                        sg.Button("Yes", button_color=("white", "green")),
-                        sg.Button("No", button_color=("white", "red")),
-                    ],
-                ]
-
-                window = sg.Window(
-                    "Confirm Command",
-                    layout,
-                    modal=True,
-                    alpha_channel=0.9,
-                    no_titlebar=False,
-                    finalize=True,
-                )
-
-                event, values = window.read()
-                window.close()
-
-                if event != "Yes":
-                    return False
-            else:
-                # Fallback to terminal confirmation
-                print(f"\nExecute command: {command}")
-                response = input("Are you sure you want to continue? (y/N): ")
-                if response.lower() not in ["y", "yes"]:
-                    return False
-
-        if terminal:
-            terminal_cmd = self.config["terminal_settings"]["default_terminal"]
-            terminal_args = self.config["terminal_settings"]["terminal_args"]
-
-            # Create a script to run the command with colored output
-            script_content = f"""#!/bin/bash
-echo -e "{colors['bold']}{colors['info']}Executing: {command}{colors['reset']}"
-echo -e "{colors['info']}Press Enter to continue...{colors['reset']}"
-read
-echo -e "{colors['bold']}Starting command execution...{colors['reset']}"
-{command}
-exit_code=$?
-if [ $exit_code -eq 0 ]; then
-    echo -e "{colors['success']}{colors['bold']}Command completed successfully!{colors['reset']}"
-else
-    echo -e "{colors['error']}{colors['bold']}Command failed with exit code: $exit_code{colors['reset']}"
-fi
-echo -e "{colors['info']}Press Enter to close...{colors['reset']}"
-read
-"""
-
-            # Write temporary script
-            temp_script = self.script_dir / ".temp_command.sh"
-            try:
-                # Ensure parent directory exists
-                temp_script.parent.mkdir(parents=True, exist_ok=True)
-                with open(temp_script, "w") as f:
-                    f.write(script_content)
-                os.chmod(temp_script, 0o755)
-
-                # Execute in terminal
-                full_cmd = [terminal_cmd] + terminal_args + [str(temp_script)]
-                subprocess.run(full_cmd, check=False)
-                return True
-            except (OSError, IOError) as e:
-                print(f"Error creating temporary script: {e}", file=sys.stderr)
-                return False
-            except FileNotFoundError as e:
-                print(f"Terminal not found: {terminal_cmd}. Error: {e}", file=sys.stderr)
-                return False
-            finally:
-                # Clean up
-                try:
-                    if temp_script.exists():
-                        temp_script.unlink()
-                except OSError:
-                    pass  # Ignore cleanup errors
-        else:
-            # Execute directly
-            try:
-                result = subprocess.run(command, shell=True, check=True)
-                return result.returncode == 0
-            except subprocess.CalledProcessError:
-                return False
-
-    def show_popup_menu(self):
-        """Show the translucent popup menu with system maintenance options"""
-        if not GUI_AVAILABLE:
-            print("GUI not available. Use --update for terminal interface.")
-            return
-
-        sg.theme("DarkGrey9")
-
-        gui_settings = self.config["gui_settings"]
-        buttons = self.config["menu_buttons"]
-
-        # Create layout with buttons
-        layout = []
-        layout.append(
-            [
-                sg.Text(
-                    "System Maintenance",
-                    font=("Arial", 14, "bold"),
-                    justification="center",
-                    expand_x=True,
-                )
-            ]
-        )
-        layout.append([sg.HSeparator()])
-
-        # Add update info
-        counts = self.check_all_updates()
-        total = counts["total"]
-        if total > 0:
-            update_text = f"📦 {total} updates available"
-            layout.append(
-                [
-                    sg.Text(
-                        update_text,
-                        font=("Arial", 12),
-                        text_color="orange",
-                        justification="center",
-                    )
-                ]
-            )
-        else:
-            layout.append(
-                [
-                    sg.Text(
-                        "✅ System up to date",
-                        font=("Arial", 12),
-                        text_color="green",
-                        justification="center",
-                    )
-                ]
-            )
-
-        layout.append([sg.HSeparator()])
-
-        # Add menu buttons
-        for button in buttons:
-            button_layout = [
-                sg.Button(
-                    f"{button['icon']} {button['name']}",
-                    key=button["key"],
-                    size=(25, 1),
-                    font=("Arial", 10),
-                    tooltip=button["description"],
-                    button_color=("white", "#2d2d3a"),
-                    border_width=1,
-                )
-            ]
-            layout.append(button_layout)
-
-        layout.append([sg.HSeparator()])
-        layout.append([sg.Button("Close", key="close", button_color=("white", "red"))])
-
-        # Create window with transparency and no title bar for blur effect
-        window = sg.Window(
-            "System Updates",
-            layout,
-            no_titlebar=True,
-            alpha_channel=gui_settings["transparency"],
-            grab_anywhere=True,
-            keep_on_top=True,
-            size=(gui_settings["popup_width"], gui_settings["popup_height"]),
-            element_padding=(gui_settings["button_padding"], 5),
-            finalize=True,
-        )
-
-        # Event loop
-        while True:
-            event, values = window.read()
-
-            if event in (sg.WINDOW_CLOSED, "close"):
-                break
-
-            # Find the button configuration
-            button_config = None
-            for button in buttons:
-                if button["key"] == event:
-                    button_config = button
-                    break
-
-            if button_config:
-                window.hide()  # Hide menu during execution
-                success = self.execute_command(
-                    button_config["command"],
-                    button_config["terminal"],
-                    button_config["requires_confirmation"],
-                )
-
-                # Special handling for reboot
-                if button_config["key"] == "reboot" and success:
-                    break
-
-                window.un_hide()  # Show menu again
-
-        window.close()
-
-    def run_interactive_update(self):
-        """Run interactive system update process"""
-        journal_errors = self.check_journal_errors()
-
-        if journal_errors:
-            sg.popup_scrolled(
-                "System errors detected in journal:\n\n"
-                + "\n".join(journal_errors[-10:]),
-                title="Journal Errors",
-                size=(80, 20),
-            )
-
-        # Show interactive update menu
-        self.show_popup_menu()
+from poll_snapshot import cached_waybar_output
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Arch Linux Update Manager for Waybar")
-    parser.add_argument("--config", help="Path to config file (overrides environment variable and defaults)")
-    parser.add_argument(
-        "--check", action="store_true", help="Check for updates and output JSON"
-    )
-    parser.add_argument("--menu", action="store_true", help="Show interactive menu")
-    parser.add_argument("--update", action="store_true", help="Run interactive update")
-
-    args = parser.parse_args()
-
-    try:
-        manager = ArchUpdateManager(args.config)
-
-        if args.check:
-            print(manager.get_waybar_output())
-        elif args.menu:
-            manager.show_popup_menu()
-        elif args.update:
-            manager.run_interactive_update()
-        else:
-            # Default: output for Waybar
-            print(manager.get_waybar_output())
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+    # Plain Waybar polls are answered from the snapshot before anything heavy is imported
+    output = cached_waybar_output(sys.argv[1:])
+    if output is not None:
+        print(output)
+        return
+    from update_manager import main as manager_main
+    manager_main()
+
+
+def __getattr__(name):
+    # Keep `from arch_updates import ArchUpdateManager` working
+    import update_manager
+    return getattr(update_manager, name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Parallel AUR build stage for the Waybar updates module
+Builds the pending AUR packages in dependency order, independent ones
+concurrently, from persistent clones into a local repo so unchanged
+packages are not rebuilt
+"""
+
+import difflib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from aur_rpc import DEFAULT_AUR_RPC_URL, AurClient, AurRpcError
+from metrics import METRICS
+
+AUR_GIT_URL = "https://aur.archlinux.org"
+
+BUILD_DIR = "aur-build"
+
+# Directory of <pkgbase>/PKGBUILD fixtures used instead of cloning from the AUR
+SOURCES_ENV = "WAYBAR_UPDATES_AUR_SOURCES"
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    # Concurrent makepkg runs; 0 picks half the cores
+    "jobs": 0,
+    "build_dir": "",
+    "sources": "",
+    "repo_name": "waybar-aur",
+    "ccache": True,
+    "install": True,
+    # Show the diff of new or changed PKGBUILDs and ask before building them
+    "review": True,
+    "timeout": 3600,
+}
+
+DEPENDENCY_KEYS = ("depends", "makedepends", "checkdepends")
+
+MAKEPKG_CONF = "/etc/makepkg.conf"
+
+# Clone files above this size are not shown in review diffs
+REVIEW_MAX_FILE_SIZE = 256 * 1024
+
+
+def aur_build_settings(update_settings: Dict) -> Dict:
+    """The aur_build block of update_settings merged over the defaults"""
+    return {**DEFAULT_SETTINGS, **update_settings.get("aur_build", {})}
+
+
+def build_dir(cache_dir: Path, settings: Dict) -> Path:
+    """Root of the clones, source cache, ccache and local repo kept between builds"""
+    return Path(settings.get("build_dir") or Path(cache_dir) / BUILD_DIR).expanduser()
+
+
+def build_jobs(settings: Dict) -> int:
+    """Number of packages built at once"""
+    jobs = int(settings.get("jobs") or 0)
+    return jobs if jobs > 0 else max(1, (os.cpu_count() or 1) // 2)
+
+
+def strip_constraint(dependency: str) -> str:
+    """Package name of a dependency such as 'python>=3.11' or 'libfoo.so=1-64'"""
+    return re.split(r"[<>=:]", dependency, 1)[0].strip()
+
+
+def parse_srcinfo(text: str) -> Dict:
+    """pkgbase, version, package names, provides and dependencies from a .SRCINFO"""
+    info = {"pkgbase": "", "version": "", "pkgnames": [], "provides": set(), "depends": set()}
+    fields = {}
+    for line in text.splitlines():
+        key, sep, value = line.strip().partition(" = ")
+        if not sep:
+            continue
+        if key == "pkgbase":
+            info["pkgbase"] = value
+        elif key == "pkgname":
+            info["pkgnames"].append(value)
+        elif key in ("pkgver", "pkgrel", "epoch") and key not in fields:
+            fields[key] = value
+        elif key == "provides":
+            info["provides"].add(strip_constraint(value))
+        # Architecture-specific arrays are named e.g. depends_x86_64
+        elif key.split("_", 1)[0] in DEPENDENCY_KEYS:
+            info["depends"].add(strip_constraint(value))
+    epoch = f"{fields['epoch']}:" if fields.get("epoch") else ""
+    if "pkgver" in fields:
+        info["version"] = f"{epoch}{fields['pkgver']}-{fields.get('pkgrel', '1')}"
+    info["pkgbase"] = info["pkgbase"] or (info["pkgnames"] or [""])[0]
+    return info
+
+
+def dependency_graph(packages: Dict[str, Dict]) -> Dict[str, Set[str]]:
+    """For each pkgbase, the other pending pkgbases it has to be built after"""
+    providers = {}
+    for base, info in packages.items():
+        for name in list(info["pkgnames"]) + sorted(info["provides"]):
+            providers.setdefault(name, base)
+    return {
+        base: {providers[dep] for dep in info["depends"] if providers.get(dep, base) != base}
+        for base, info in packages.items()
+    }
+
+
+def build_order(graph: Dict[str, Set[str]]) -> Tuple[List[List[str]], List[str]]:
+    """Waves of pkgbases that can be built concurrently, and those caught in a dependency cycle"""
+    remaining = {base: set(deps) for base, deps in graph.items()}
+    waves = []
+    while remaining:
+        ready = sorted(base for base, deps in remaining.items() if not deps)
+        if not ready:
+            break
+        waves.append(ready)
+        for base in ready:
+            del remaining[base]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return waves, sorted(remaining)
+
+
+def resolve_bases(names: List[str], sources: Optional[Path], timeout: float = 30) -> Dict[str, str]:
+    """Map pending package names to the pkgbase that builds them"""
+    bases = {}
+    if sources:
+        for srcinfo in sorted(sources.glob("*/.SRCINFO")):
+            try:
+                info = parse_srcinfo(srcinfo.read_text())
+            except OSError:
+                continue
+            for name in info["pkgnames"]:
+                bases.setdefault(name, srcinfo.parent.name)
+    missing = [name for name in names if name not in bases]
+    if missing and not sources:
+        try:
+            with AurClient(DEFAULT_AUR_RPC_URL, timeout) as client:
+                for name, package in client.info(missing).items():
+                    bases[name] = package.get("PackageBase") or name
+        except AurRpcError as e:
+            print(f"Warning: Could not look up AUR package bases: {e}", file=sys.stderr)
+    return {name: bases.get(name, name) for name in names}
+
+
+class AurBuilder:
+    """Builds pending AUR packages from persistent clones into a local package repo"""
+
+    def __init__(self, build_root: Path, settings: Dict):
+        self.settings = settings
+        self.root = Path(build_root)
+        sources = os.getenv(SOURCES_ENV) or settings.get("sources")
+        self.sources = Path(sources).expanduser() if sources else None
+        self.clones = self.root / "clones"
+        self.repo = self.root / "repo"
+        self.logs = self.root / "logs"
+        # Copies of the clones as they were last approved
+        self.reviewed = self.root / "reviewed"
+        self.jobs = build_jobs(settings)
+        self._repo_lock = threading.Lock()
+        self._install_lock = threading.Lock()
+
+    @property
+    def repo_db(self) -> Path:
+        return self.repo / f"{self.settings['repo_name']}.db.tar.gz"
+
+    def environment(self) -> Dict[str, str]:
+        """makepkg environment: shared source cache, built packages into the local repo, cores split between jobs"""
+        env = dict(os.environ)
+        env.update(
+            PKGDEST=str(self.repo),
+            SRCDEST=str(self.root / "sources"),
+            BUILDDIR=str(self.root / "build"),
+            MAKEFLAGS=f"-j{max(1, (os.cpu_count() or 1) // self.jobs)}",
+        )
+        if self.settings.get("ccache") and shutil.which("ccache"):
+            env["CCACHE_DIR"] = str(self.root / "ccache")
+        return env
+
+    def makepkg_config(self) -> Optional[Path]:
+        """makepkg.conf that extends the system one with ccache enabled"""
+        if not (self.settings.get("ccache") and shutil.which("ccache") and Path(MAKEPKG_CONF).exists()):
+            return None
+        path = self.root / "makepkg.conf"
+        # makepkg reads BUILDENV back to front, so an appended ccache overrides !ccache
+        content = f"source {MAKEPKG_CONF}\nBUILDENV+=(ccache)\n"
+        try:
+            if not path.exists() or path.read_text() != content:
+                path.write_text(content)
+        except OSError as e:
+            print(f"Warning: Could not write {path}: {e}", file=sys.stderr)
+            return None
+        return path
+
+    def _run(self, command: List[str], log: Path, cwd: Path = None, env: Dict[str, str] = None) -> bool:
+        """Run a build command with its output appended to the package log"""
+        try:
+            with open(log, "a") as f:
+                f.write(f"$ {' '.join(command)}\n")
+                f.flush()
+                result = subprocess.run(
+                    command,
+                    cwd=cwd,
+                    env=env,
+                    stdin=subprocess.DEVNULL,
+                    stdout=f,
+                    stderr=subprocess.STDOUT,
+                    timeout=self.settings["timeout"],
+                )
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError) as e:
+            print(f"Warning: {command[0]} failed: {e}", file=sys.stderr)
+            return False
+        return result.returncode == 0
+
+    def sync_clone(self, base: str) -> bool:
+        """Update the persistent clone of a pkgbase, or copy its fixture"""
+        clone = self.clones / base
+        log = self.logs / f"{base}.log"
+        if self.sources:
+            source = self.sources / base
+            if not (source / "PKGBUILD").exists():
+                print(f"Warning: No PKGBUILD for {base} in {self.sources}", file=sys.stderr)
+                return False
+            try:
+                # A fresh copy, so files removed from the fixture do not linger
+                shutil.rmtree(clone, ignore_errors=True)
+                shutil.copytree(source, clone)
+            except (OSError, shutil.Error) as e:
+                print(f"Warning: Could not copy {source}: {e}", file=sys.stderr)
+                return False
+            return True
+        if (clone / ".git").exists():
+            return self._run(["git", "-C", str(clone), "pull", "--ff-only", "--quiet"], log)
+        return self._run(["git", "clone", "--quiet", f"{AUR_GIT_URL}/{base}.git", str(clone)], log)
+
+    def read_srcinfo(self, base: str) -> Optional[Dict]:
+        """Package metadata of a clone, generating .SRCINFO when the clone has none"""
+        clone = self.clones / base
+        try:
+            text = (clone / ".SRCINFO").read_text()
+        except OSError:
+            try:
+                result = subprocess.run(
+                    ["makepkg", "--printsrcinfo"], cwd=clone, capture_output=True, text=True, timeout=60
+                )
+            except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError) as e:
+                print(f"Warning: Could not read {base} metadata: {e}", file=sys.stderr)
+                return None
+            if result.returncode != 0:
+                print(f"Warning: makepkg --printsrcinfo failed for {base}", file=sys.stderr)
+                return None
+            text = result.stdout
+        return parse_srcinfo(text)
+
+    def package_files(self, base: str, env: Dict[str, str]) -> List[Path]:
+        """Package files the current PKGBUILD produces, as makepkg names them"""
+        try:
+            result = subprocess.run(
+                ["makepkg", "--packagelist"],
+                cwd=self.clones / base,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError):
+            return []
+        if result.returncode != 0:
+            return []
+        return [Path(line) for line in result.stdout.splitlines() if line.strip()]
+
+    def add_to_repo(self, files: List[Path], log: Path) -> bool:
+        """Register built packages in the local repo, dropping superseded files"""
+        if not shutil.which("repo-add"):
+            return True
+        with self._repo_lock:
+            return self._run(["repo-add", "--quiet", "--remove", str(self.repo_db)] + [str(f) for f in files], log)
+
+    def install(self, files: List[Path], log: Path) -> bool:
+        """Install built packages; pacman takes one transaction at a time"""
+        if not files:
+            return True
+        with self._install_lock:
+            return self._run(
+                ["sudo", "pacman", "-U", "--needed", "--noconfirm"] + [str(f) for f in files], log
+            )
+
+    @staticmethod
+    def _tree(directory: Path) -> Dict[str, str]:
+        """Text of the files in a clone, by relative path, without git metadata"""
+        files = {}
+        if not directory.is_dir():
+            return files
+        for path in sorted(directory.rglob("*")):
+            relative = path.relative_to(directory)
+            if relative.parts[0] == ".git" or not path.is_file():
+                continue
+            try:
+                if path.stat().st_size > REVIEW_MAX_FILE_SIZE:
+                    files[str(relative)] = "(file too large to show)\n"
+                else:
+                    files[str(relative)] = path.read_text(errors="replace")
+            except OSError:
+                continue
+        return files
+
+    def review_diff(self, base: str) -> List[str]:
+        """Unified diff of a clone against its last approved copy; empty when unchanged"""
+        old, new = self._tree(self.reviewed / base), self._tree(self.clones / base)
+        lines = []
+        for name in sorted(set(old) | set(new)):
+            lines += difflib.unified_diff(
+                old.get(name, "").splitlines(keepends=True),
+                new.get(name, "").splitlines(keepends=True),
+                f"a/{base}/{name}" if name in old else "/dev/null",
+                f"b/{base}/{name}" if name in new else "/dev/null",
+            )
+        return lines
+
+    def confirm(self, base: str, diff: List[str]) -> bool:
+        """Show a review diff on the terminal and ask whether to build the package"""
+        if not sys.stdin.isatty():
+            print(f"Warning: {base} has a new or changed PKGBUILD and no terminal to review it", file=sys.stderr)
+            return False
+        sys.stderr.writelines(diff)
+        print(f"\n:: Build and install {base} with the changes above? [y/N] ", end="", file=sys.stderr, flush=True)
+        return sys.stdin.readline().strip().lower() in ("y", "yes")
+
+    def approve(self, base: str) -> bool:
+        """Ask about a new or changed clone and remember it once approved"""
+        if not self.settings.get("review", True):
+            return True
+        diff = self.review_diff(base)
+        if not diff:
+            return True
+        if not self.confirm(base, diff):
+            return False
+        try:
+            shutil.rmtree(self.reviewed / base, ignore_errors=True)
+            shutil.copytree(self.clones / base, self.reviewed / base, ignore=shutil.ignore_patterns(".git"))
+        except (OSError, shutil.Error) as e:
+            print(f"Warning: Could not save the reviewed {base}: {e}", file=sys.stderr)
+        return True
+
+    def install_dependencies(self, packages: Dict[str, Dict]) -> bool:
+        """Install the repo dependencies of all packages in one transaction before the builds start"""
+        # Concurrent makepkg --syncdeps runs would otherwise compete for the pacman lock
+        provided = {name for info in packages.values() for name in list(info["pkgnames"]) + sorted(info["provides"])}
+        depends = sorted({dep for info in packages.values() for dep in info["depends"]} - provided)
+        if not depends:
+            return True
+        try:
+            # pacman -T prints the dependencies that are not satisfied
+            missing = subprocess.run(["pacman", "-T"] + depends, capture_output=True, text=True, timeout=60)
+            missing = missing.stdout.split()
+            if not missing:
+                return True
+            result = subprocess.run(
+                ["sudo", "pacman", "-S", "--needed", "--asdeps", "--noconfirm"] + missing,
+                timeout=self.settings["timeout"],
+            )
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError) as e:
+            print(f"Warning: Could not install build dependencies: {e}", file=sys.stderr)
+            return False
+        return result.returncode == 0
+
+    def build_one(self, base: str, env: Dict[str, str], config: Optional[Path]) -> Dict:
+        """Build a pkgbase unless the local repo already holds its current packages"""
+        log = self.logs / f"{base}.log"
+        files = self.package_files(base, env)
+        if files and all(path.exists() for path in files):
+            return {"status": "cached", "files": [str(f) for f in files]}
+
+        command = ["makepkg", "--syncdeps", "--noconfirm", "--noprogressbar", "--cleanbuild", "--clean", "--force"]
+        if config:
+            command += ["--config", str(config)]
+        started = time.monotonic()
+        with METRICS.span("aur_build", package=base):
+            built = self._run(command, log, cwd=self.clones / base, env=env)
+        if not built:
+            return {"status": "failed", "reason": f"makepkg failed, see {log}"}
+        files = [path for path in self.package_files(base, env) if path.exists()]
+        self.add_to_repo(files, log)
+        return {"status": "built", "files": [str(f) for f in files], "seconds": round(time.monotonic() - started, 1)}
+
+    def build(self, names: Iterable[str]) -> Dict:
+        """Build every pending AUR package, independent pkgbases concurrently"""
+        names = sorted(set(names))
+        result = {"jobs": self.jobs, "order": [], "built": [], "cached": [], "failed": {}, "skipped": {}}
+        if not names:
+            return result
+        for directory in (self.clones, self.repo, self.logs, self.reviewed, self.root / "sources", self.root / "build"):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        bases = resolve_bases(names, self.sources)
+        wanted = {}
+        for name, base in bases.items():
+            wanted.setdefault(base, set()).add(name)
+
+        # Fetching is I/O bound, so all clones are updated at once
+        packages = {}
+        with ThreadPoolExecutor(max_workers=min(8, len(wanted)), thread_name_prefix="aur-fetch") as executor:
+            synced = dict(zip(wanted, executor.map(self.sync_clone, wanted)))
+        for base in sorted(wanted):
+            info = self.read_srcinfo(base) if synced[base] else None
+            if info is None:
+                result["failed"][base] = "could not fetch the PKGBUILD"
+            elif not self.approve(base):
+                result["failed"][base] = "PKGBUILD changes not approved"
+            else:
+                packages[base] = info
+
+        graph = dependency_graph(packages)
+        waves, cyclic = build_order(graph)
+        result["order"] = waves
+        for base in cyclic:
+            result["failed"][base] = "dependency cycle"
+
+        if packages and not self.install_dependencies(packages):
+            # makepkg --syncdeps still tries per package; those whose dependencies are missing fail there
+            print("Warning: Some build dependencies could not be installed", file=sys.stderr)
+        env = self.environment()
+        config = self.makepkg_config()
+        done = set()
+        blocked = set(result["failed"])
+        pending = {base for wave in waves for base in wave}
+        running = {}
+        total = len(pending)
+        finished_count = 0
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="aur-build") as executor:
+            while pending or running:
+                for base in sorted(pending):
+                    failed_deps = graph[base] & blocked
+                    if failed_deps:
+                        pending.discard(base)
+                        blocked.add(base)
+                        result["skipped"][base] = f"dependency {', '.join(sorted(failed_deps))} failed"
+                    elif graph[base] <= done:
+                        pending.discard(base)
+                        running[executor.submit(self.build_one, base, env, config)] = base
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    base = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        outcome = {"status": "failed", "reason": str(e) or type(e).__name__}
+                    finished_count += 1
+                    if outcome["status"] == "failed":
+                        blocked.add(base)
+                        result["failed"][base] = outcome["reason"]
+                        print(f":: [{finished_count}/{total}] {base} failed: {outcome['reason']}", file=sys.stderr, flush=True)
+                        continue
+                    result[outcome["status"]].append(base)
+                    packages[base]["files"] = outcome["files"]
+                    print(f":: [{finished_count}/{total}] {base} {outcome['status']}", file=sys.stderr, flush=True)
+                    # Dependents are built against the new version, so it is installed first
+                    if self.settings.get("install") and any(base in graph[other] for other in pending):
+                        self.install(self._wanted_files(outcome["files"], wanted[base]), self.logs / f"{base}.log")
+                    done.add(base)
+
+        if self.settings.get("install"):
+            files = [
+                path
+                for base in result["built"] + result["cached"]
+                for path in self._wanted_files(packages[base]["files"], wanted[base])
+            ]
+            result["installed"] = self.install(files, self.logs / "install.log")
+        return result
+
+    @staticmethod
+    def _wanted_files(files: List[str], wanted: Set[str]) -> List[Path]:
+        """Only the split packages that are installed, not every package of the pkgbase"""
+        return [
+            Path(path)
+            for path in files
+            if any(re.match(rf"{re.escape(name)}-[^-]+-[^-]+-[^-]+\.pkg\.tar", Path(path).name) for name in wanted)
+        ]
+
+
+def format_build_result(result: Dict) -> List[str]:
+    """Summary lines of a build run"""
+    lines = [
+        f"Built {len(result['built'])}, reused {len(result['cached'])} from the local repo "
+        f"({result['jobs']} parallel jobs)"
+    ]
+    for base, reason in sorted(result["failed"].items()):
+        lines.append(f"Failed: {base}: {reason}")
+    for base, reason in sorted(result["skipped"].items()):
+        lines.append(f"Skipped: {base}: {reason}")
+    return lines
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Built-in AUR update checker for the Waybar updates module
+Queries the AUR RPC v5 info endpoint in batches over one keep-alive connection
+"""
+
+import http.client
+import json
+import subprocess
+from typing import Dict, List, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from pacman_db import format_update_line, vercmp
+
+DEFAULT_AUR_RPC_URL = "https://aur.archlinux.org/rpc"
+
+# The AUR accepts at most this many names per info request
+MAX_BATCH_SIZE = 200
+
+
+class AurRpcError(Exception):
+    """Raised when the AUR RPC cannot be reached or returns an error"""
+
+
+def foreign_packages(timeout: float = 30) -> Dict[str, str]:
+    """Return installed packages not found in any sync DB; raises AurRpcError if pacman -Qm fails"""
+    try:
+        result = subprocess.run(
+            ["pacman", "-Qm"], capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        raise AurRpcError(f"pacman -Qm timed out after {timeout}s")
+    except (subprocess.SubprocessError, OSError) as e:
+        raise AurRpcError(f"Could not list foreign packages: {e}")
+    # pacman -Qm exits 1 without any output when every package is in a sync DB
+    if result.returncode == 1 and not result.stdout.strip() and not result.stderr.strip():
+        return {}
+    if result.returncode != 0:
+        raise AurRpcError(
+            f"pacman -Qm failed: {result.stderr.strip() or f'exit status {result.returncode}'}"
+        )
+    packages = {}
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) >= 2:
+            packages[fields[0]] = fields[1]
+    return packages
+
+
+class AurClient:
+    def __init__(
+        self,
+        base_url: str = DEFAULT_AUR_RPC_URL,
+        timeout: float = 30,
+        batch_size: int = MAX_BATCH_SIZE,
+    ):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported AUR RPC URL: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self._conn = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """Return the pooled connection, opening it on first use"""
+        if self._conn is None:
+            conn_class = (
+                http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            )
+            self._conn = conn_class(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        """Close the pooled connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _post(self, endpoint: str, body: str) -> Dict:
+        """POST a form to the RPC, reconnecting once if the kept-alive socket went stale"""
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Accept": "application/json",
+            "Connection": "keep-alive",
+        }
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", f"{self.path}/{endpoint}", body=body, headers=headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt:
+                    raise AurRpcError("AUR RPC connection closed")
+                continue
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                raise AurRpcError(f"AUR RPC request failed: {e}")
+
+            if response.status != 200:
+                raise AurRpcError(f"AUR RPC returned HTTP {response.status}")
+            try:
+                data = json.loads(payload)
+            except json.JSONDecodeError as e:
+                raise AurRpcError(f"Invalid AUR RPC response: {e}")
+            if data.get("type") == "error":
+                raise AurRpcError(f"AUR RPC error: {data.get('error')}")
+            return data
+        raise AurRpcError("AUR RPC request failed")
+
+    def info(self, names: List[str]) -> Dict[str, Dict]:
+        """Look up package info for many names, batch_size names per request"""
+        results = {}
+        for start in range(0, len(names), self.batch_size):
+            batch = names[start:start + self.batch_size]
+            body = urlencode([("arg[]", name) for name in batch])
+            data = self._post("v5/info", body)
+            for package in data.get("results", []):
+                results[package["Name"]] = package
+        return results
+
+    def find_updates(self, installed: Dict[str, str]) -> List[Dict]:
+        """Compare installed foreign package versions against the AUR"""
+        remote = self.info(sorted(installed))
+        updates = []
+        for name in sorted(installed):
+            package = remote.get(name)
+            if package and vercmp(package["Version"], installed[name]) > 0:
+                updates.append(
+                    {
+                        "name": name,
+                        "old_version": installed[name],
+                        "new_version": package["Version"],
+                        "repo": "aur",
+                    }
+                )
+        return updates
+
+
+def check_aur_rpc_updates(
+    base_url: str = DEFAULT_AUR_RPC_URL, timeout: float = 30
+) -> Tuple[int, List[str]]:
+    """Check AUR updates without a helper; raises AurRpcError if pacman -Qm or the RPC fails"""
+    installed = foreign_packages(timeout)
+    if not installed:
+        return 0, []
+    with AurClient(base_url, timeout) as client:
+        updates = client.find_updates(installed)
+    lines = [format_update_line(u) for u in updates]
+    return len(lines), lines
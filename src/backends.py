@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Pluggable update backends for the Waybar updates module
+Each backend declares its check cost, timeout, TTL and concurrency class in one
+registry shared by ArchUpdateChecker and ArchUpdateManager
+"""
+
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type
+
+from check_engine import CheckResult
+from metrics import METRICS
+from pacman_db import (
+    configured_repos,
+    default_private_db_path,
+    find_repo_updates,
+    format_update_line,
+    resolve_sync_dir,
+)
+
+# The AUR RPC client, LAN cache client and SQLite index are imported by the
+# backends that use them, so loading the registry stays cheap
+
+BACKENDS: Dict[str, Type["UpdateBackend"]] = {}
+
+
+class BackendError(Exception):
+    """Raised when a backend check fails, so a failure never reads as zero updates"""
+
+
+def register_backend(cls: Type["UpdateBackend"]) -> Type["UpdateBackend"]:
+    """Class decorator adding a backend to the registry under its name"""
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def run_command(
+    cmd: List[str], timeout: float, ok_codes: Tuple[int, ...] = (0,)
+) -> subprocess.CompletedProcess:
+    """Run a command, raising BackendError if it cannot start, times out or fails"""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        METRICS.count("subprocess_timeouts", command=cmd[0])
+        raise BackendError(f"{cmd[0]} timed out after {timeout}s")
+    except FileNotFoundError:
+        raise BackendError(f"{cmd[0]} not found")
+    except subprocess.SubprocessError as e:
+        METRICS.count("subprocess_failures", command=cmd[0])
+        raise BackendError(f"{cmd[0]} failed: {e}")
+    if result.returncode not in ok_codes:
+        METRICS.count("subprocess_failures", command=cmd[0])
+        raise BackendError(command_failure(cmd, result))
+    return result
+
+
+def command_failure(cmd: List[str], result: subprocess.CompletedProcess) -> str:
+    """Describe a failed command by its exit status and last line of stderr"""
+    message = f"{cmd[0]} exited with status {result.returncode}"
+    stderr = result.stderr.strip().splitlines()
+    return f"{message}: {stderr[-1]}" if stderr else message
+
+
+def count_lines(output: str) -> CheckResult:
+    """Count non-empty lines of a command's output"""
+    updates = [line for line in output.strip().split("\n") if line.strip()]
+    return len(updates), updates
+
+
+class UpdateBackend:
+    """Base class for a source of pending updates"""
+
+    name = ""
+    label = ""
+    # "expensive" backends are slow and run after the cheap ones are published
+    cost = "cheap"
+    # Backends in the same concurrency class share a limit in the check engine
+    concurrency = "local"
+    # Packages tracked in the pacman local DB can be recounted offline after upgrades
+    pacman_managed = False
+    default_timeout = None
+    default_ttl = None
+
+    def __init__(self, settings: Dict, cache_dir: Path):
+        self.settings = settings
+        self.cache_dir = Path(cache_dir)
+        overrides = settings.get("backends", {}).get(self.name, {})
+        self.timeout = overrides.get(
+            "timeout", self.default_timeout or settings.get("check_timeout", 30)
+        )
+        self.ttl = overrides.get("ttl", self.default_ttl or settings.get("check_interval", 600))
+
+    def is_available(self) -> bool:
+        """Whether the tool behind this backend is installed"""
+        return True
+
+    def check(self, timeout: float = None) -> CheckResult:
+        """Return the number of pending updates and 'name old -> new' lines"""
+        raise NotImplementedError
+
+
+@register_backend
+class PacmanBackend(UpdateBackend):
+    name = "pacman"
+    label = "Pacman"
+    concurrency = "network"
+    pacman_managed = True
+
+    def is_available(self) -> bool:
+        return (
+            self.settings.get("pacman_backend") == "native"
+            or bool(self.lan_cache_url())
+            or bool(shutil.which("checkupdates"))
+        )
+
+    def lan_cache_url(self) -> Optional[str]:
+        """Shared cache server to take sync DBs from, if one is configured"""
+        return self.settings.get("lan_cache", {}).get("url") or None
+
+    def check(self, timeout: float = None) -> CheckResult:
+        if self.lan_cache_url():
+            return self.check_lan(timeout or self.timeout)
+        if self.settings.get("pacman_backend") == "native":
+            return self.check_native()
+        # checkupdates exits with 2 when there is nothing to update
+        result = run_command(["checkupdates"], timeout or self.timeout, ok_codes=(0, 2))
+        return count_lines(result.stdout)
+
+    def check_native(self) -> CheckResult:
+        """Read the local and sync databases directly instead of forking checkupdates"""
+        from package_index import query_repo_updates
+
+        private_db = self.settings.get("sync_db_path")
+        index_file = self.cache_dir / "package_index.sqlite"
+        found = query_repo_updates(index_file, resolve_sync_dir(private_db))
+        if found is None:
+            # No usable index: parse the databases in full
+            found = find_repo_updates(private_db)
+        updates = [format_update_line(u) for u in found]
+        return len(updates), updates
+
+    def check_lan(self, timeout: float) -> CheckResult:
+        """Pull changed sync DBs from the cache server, then compare them locally"""
+        from lan_cache import LanCacheError, fetch_sync_dbs
+
+        private_db = Path(self.settings.get("sync_db_path") or default_private_db_path())
+        try:
+            fetch_sync_dbs(self.lan_cache_url(), private_db / "sync", configured_repos(), timeout)
+        except LanCacheError as e:
+            raise BackendError(str(e))
+        return self.check_native()
+
+
+class HelperAurBackend(UpdateBackend):
+    label = "AUR"
+    concurrency = "network"
+    pacman_managed = True
+    command = []
+
+    def is_available(self) -> bool:
+        return bool(shutil.which(self.command[0]))
+
+    def check(self, timeout: float = None) -> CheckResult:
+        # Like pacman -Qu, the helpers exit with 1 and print nothing when up to date
+        result = run_command(self.command, timeout or self.timeout, ok_codes=(0, 1))
+        if result.returncode == 1 and result.stderr.strip():
+            raise BackendError(command_failure(self.command, result))
+        return count_lines(result.stdout)
+
+
+@register_backend
+class YayBackend(HelperAurBackend):
+    name = "yay"
+    command = ["yay", "-Qum"]
+
+
+@register_backend
+class ParuBackend(HelperAurBackend):
+    name = "paru"
+    command = ["paru", "-Qua"]
+
+
+@register_backend
+class AurRpcBackend(UpdateBackend):
+    name = "aur"
+    label = "AUR"
+    concurrency = "network"
+    pacman_managed = True
+
+    def is_available(self) -> bool:
+        return bool(shutil.which("pacman"))
+
+    def check(self, timeout: float = None) -> CheckResult:
+        from aur_rpc import DEFAULT_AUR_RPC_URL, AurRpcError, check_aur_rpc_updates
+
+        lan_url = self.settings.get("lan_cache", {}).get("url")
+        if lan_url:
+            from lan_cache import lan_aur_rpc_url
+
+            # The cache server answers AUR info queries from its shared cache
+            base_url = lan_aur_rpc_url(lan_url)
+        else:
+            base_url = self.settings.get("aur_rpc_url", DEFAULT_AUR_RPC_URL)
+        try:
+            return check_aur_rpc_updates(base_url, timeout or self.timeout)
+        except (AurRpcError, ValueError) as e:
+            raise BackendError(str(e))
+
+
+@register_backend
+class FlatpakBackend(UpdateBackend):
+    name = "flatpak"
+    label = "Flatpak"
+    cost = "expensive"
+    concurrency = "network"
+    default_timeout = 60
+    default_ttl = 6 * 3600
+
+    def is_available(self) -> bool:
+        return bool(shutil.which("flatpak"))
+
+    def check(self, timeout: float = None) -> CheckResult:
+        timeout = timeout or self.timeout
+        result = run_command(
+            ["flatpak", "remote-ls", "--updates", "--columns=application,version"], timeout
+        )
+        installed = {}
+        try:
+            listed = run_command(["flatpak", "list", "--columns=application,version"], timeout)
+        except BackendError:
+            # Installed versions are only cosmetic; show '-' instead
+            listed = None
+        if listed is not None:
+            for line in listed.stdout.splitlines():
+                fields = line.split("\t")
+                if fields and fields[0]:
+                    installed[fields[0]] = fields[1] if len(fields) > 1 and fields[1] else "-"
+
+        updates = []
+        for line in result.stdout.splitlines():
+            fields = line.split("\t")
+            if not fields or not fields[0].strip():
+                continue
+            app = fields[0].strip()
+            new_version = fields[1].strip() if len(fields) > 1 and fields[1].strip() else "-"
+            updates.append(f"{app} {installed.get(app, '-')} -> {new_version}")
+        return len(updates), updates
+
+
+@register_backend
+class FwupdBackend(UpdateBackend):
+    name = "fwupd"
+    label = "Firmware"
+    cost = "expensive"
+    concurrency = "dbus"
+    default_timeout = 60
+    default_ttl = 24 * 3600
+
+    def is_available(self) -> bool:
+        return bool(shutil.which("fwupdmgr"))
+
+    def check(self, timeout: float = None) -> CheckResult:
+        # fwupdmgr exits with 2 when there is nothing to update
+        cmd = ["fwupdmgr", "get-updates", "--json"]
+        result = run_command(cmd, timeout or self.timeout, ok_codes=(0, 2))
+        if result.returncode == 2 or not result.stdout.strip():
+            return 0, []
+        try:
+            devices = json.loads(result.stdout).get("Devices", [])
+        except (json.JSONDecodeError, AttributeError) as e:
+            raise BackendError(f"fwupdmgr returned invalid JSON: {e}")
+
+        updates = []
+        for device in devices:
+            releases = device.get("Releases") or []
+            if not releases:
+                continue
+            name = "-".join(str(device.get("Name", "device")).split())
+            updates.append(
+                f"{name} {device.get('Version', '-')} -> {releases[0].get('Version', '-')}"
+            )
+        return len(updates), updates
+
+
+def create_backend(name: str, settings: Dict, cache_dir: Path) -> Optional[UpdateBackend]:
+    """Instantiate a registered backend by name"""
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        return None
+    return backend_class(settings, cache_dir)
+
+
+def create_backends(settings: Dict, cache_dir: Path, names: List[str]) -> Dict[str, UpdateBackend]:
+    """Instantiate the enabled backends in configuration order, skipping unknown names"""
+    backends = {}
+    for name in names:
+        backend = create_backend(name, settings, cache_dir)
+        if backend is None:
+            print(f"Warning: Unknown package manager '{name}' in configuration", file=sys.stderr)
+            continue
+        backends[name] = backend
+    return backends
+
+
+def is_pacman_managed(source: str) -> bool:
+    """Whether a source's packages live in the pacman local DB"""
+    backend_class = BACKENDS.get(source)
+    return backend_class is not None and backend_class.pacman_managed
+
+
+def source_label(source: str) -> str:
+    """Human readable name of a source for tooltips"""
+    backend_class = BACKENDS.get(source)
+    return backend_class.label if backend_class else source
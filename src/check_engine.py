@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Concurrent check engine for the Waybar updates module
+Runs every enabled package manager check at once under a single deadline
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from typing import Callable, Dict, List, Tuple
+
+from metrics import METRICS
+
+CheckResult = Tuple[int, List[str]]
+
+# Sources that all report AUR updates; only the largest one counts towards the total
+AUR_SOURCES = ("yay", "paru", "aur")
+
+# How many checks of one concurrency class may run at the same time
+CONCURRENCY_LIMITS = {"network": 4, "local": 2, "dbus": 1}
+
+
+def aur_count(counts: Dict[str, int]) -> int:
+    """Return the AUR update count without double counting helpers"""
+    return max(counts.get(source, 0) for source in AUR_SOURCES)
+
+
+def build_counts(counts: Dict[str, int]) -> Dict[str, int]:
+    """Build the full per-source count dict including the total"""
+    result = {source: counts.get(source, 0) for source in ("pacman",) + AUR_SOURCES}
+    # Extra backends such as flatpak or fwupd each add their own key
+    result.update(
+        {source: count for source, count in counts.items() if source not in result and source != "total"}
+    )
+    result["total"] = sum(
+        count for source, count in result.items() if source not in AUR_SOURCES + ("total",)
+    ) + aur_count(result)
+    return result
+
+
+def _limited(check: Callable[[], CheckResult], semaphore: threading.Semaphore) -> Callable[[], CheckResult]:
+    """Wrap a check so it only runs while holding its concurrency class slot"""
+    def run() -> CheckResult:
+        with semaphore:
+            return check()
+    return run
+
+
+def _timed(
+    name: str, check: Callable[[], CheckResult], durations: Dict[str, float] = None
+) -> Callable[[], CheckResult]:
+    """Wrap a check so its run time is recorded as a backend span"""
+    def run() -> CheckResult:
+        started = time.perf_counter()
+        try:
+            with METRICS.span("backend", backend=name):
+                return check()
+        finally:
+            if durations is not None:
+                durations[name] = time.perf_counter() - started
+    return run
+
+
+def run_checks(
+    checks: Dict[str, Callable[[], CheckResult]],
+    deadline: float,
+    classes: Dict[str, str] = None,
+    durations: Dict[str, float] = None,
+) -> Tuple[Dict[str, CheckResult], Dict[str, str]]:
+    """Run all checks concurrently; return results finished before the deadline and errors"""
+    results = {}
+    errors = {}
+    if not checks:
+        return results, errors
+
+    # Checks sharing a concurrency class are throttled to that class's limit
+    semaphores = {
+        name: threading.Semaphore(limit) for name, limit in CONCURRENCY_LIMITS.items()
+    }
+    # Stragglers past the deadline keep running, so they time into a dict of
+    # this call's own and only finished checks are copied into durations
+    timings = {}
+    checks = {name: _timed(name, check, timings) for name, check in checks.items()}
+    for name, concurrency in (classes or {}).items():
+        if name in checks and concurrency in semaphores:
+            checks[name] = _limited(checks[name], semaphores[concurrency])
+
+    executor = ThreadPoolExecutor(
+        max_workers=len(checks), thread_name_prefix="update-check"
+    )
+    futures = {executor.submit(check): name for name, check in checks.items()}
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e) or type(e).__name__
+                METRICS.count("check_failures", backend=name)
+                print(f"Warning: {name} update check failed: {e}", file=sys.stderr)
+    except TimeoutError:
+        pending = sorted(name for future, name in futures.items() if not future.done())
+        for name in pending:
+            errors[name] = f"timed out after {deadline}s"
+            METRICS.count("check_timeouts", backend=name)
+        print(
+            f"Warning: update check deadline of {deadline}s exceeded, "
+            f"returning partial results without: {', '.join(pending)}",
+            file=sys.stderr,
+        )
+    finally:
+        # Do not wait for stragglers; their own subprocess timeouts end them
+        executor.shutdown(wait=False)
+
+    if durations is not None:
+        durations.update(
+            {name: timings[name] for future, name in futures.items() if future.done() and name in timings}
+        )
+    return results, errors
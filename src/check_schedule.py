@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Per-backend check scheduling for the Waybar updates module
+Each backend keeps its own adaptive TTL, exponential backoff after failures and
+last error, stored with the update cache
+"""
+
+from typing import Dict
+
+# First retry delay after a failed check, doubled on every further failure
+RETRY_INTERVAL = 60
+MAX_BACKOFF = 3600
+
+# Unchanged results stretch a backend's TTL up to this multiple
+MAX_TTL_FACTOR = 4
+
+
+def load_state(entry) -> Dict:
+    """Normalise a cached per-source entry; anything unrecognised is due immediately"""
+    return dict(entry) if isinstance(entry, dict) else {}
+
+
+def is_due(state: Dict, now: float) -> bool:
+    """Whether a backend's next scheduled check has come"""
+    return now >= state.get("next", 0)
+
+
+def record_success(state: Dict, ttl: float, now: float, changed: bool) -> Dict:
+    """Schedule the next check, backing off further while results stay the same"""
+    streak = 0 if changed else state.get("streak", 0) + 1
+    factor = min(2 ** streak, MAX_TTL_FACTOR)
+    return {
+        "checked": now,
+        "next": now + ttl * factor,
+        "streak": streak,
+        "failures": 0,
+        "error": None,
+    }
+
+
+def record_failure(state: Dict, ttl: float, now: float, error: str) -> Dict:
+    """Keep the last good check time and retry with exponential backoff"""
+    failures = state.get("failures", 0) + 1
+    delay = min(RETRY_INTERVAL * 2 ** (failures - 1), MAX_BACKOFF, ttl)
+    return dict(state, next=now + delay, failures=failures, error=error)
+
+
+def record_unavailable(ttl: float, now: float) -> Dict:
+    """Mark a backend whose tool is not installed; it is probed again after its TTL"""
+    return {"next": now + ttl, "unavailable": True}
+
+
+def next_check(sources: Dict[str, Dict]) -> float:
+    """Earliest time any backend is due, 0 when nothing is scheduled"""
+    return min((load_state(state).get("next", 0) for state in sources.values()), default=0)
+
+
+def source_errors(sources: Dict[str, Dict]) -> Dict[str, str]:
+    """Return the last error of every backend whose latest check failed"""
+    return {
+        name: state["error"]
+        for name, state in sources.items()
+        if isinstance(state, dict) and state.get("error")
+    }
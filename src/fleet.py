@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Fleet check mode for the Waybar updates module
+Runs the update check on many hosts over multiplexed SSH connections and
+aggregates the results into one JSON or CSV report
+"""
+
+import csv
+import io
+import json
+import os
+import socket
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from check_schedule import source_errors
+
+DEFAULT_REMOTE_COMMAND = "~/.config/waybar/scripts/arch_updates_simple.py --status"
+DEFAULT_WORKERS = 8
+DEFAULT_HOST_TIMEOUT = 60
+CONTROL_PERSIST = 300
+
+CommandResult = Tuple[int, str, str]
+
+
+def read_hosts(hosts_file: Path) -> List[str]:
+    """Read SSH destinations, one per line; blank lines and # comments are ignored"""
+    hosts = []
+    with open(hosts_file, "r") as f:
+        for line in f:
+            host = line.split("#", 1)[0].strip()
+            if host and host not in hosts:
+                hosts.append(host)
+    return hosts
+
+
+def default_control_dir() -> Path:
+    """Directory for SSH control sockets, private to the user"""
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir and Path(runtime_dir).is_dir():
+        return Path(runtime_dir) / "waybar-updates-ssh"
+    return Path(f"/tmp/waybar-updates-ssh-{os.getuid()}")
+
+
+class SshTransport:
+    """Run commands over ssh, sharing one master connection per host"""
+
+    def __init__(
+        self,
+        ssh_command: List[str] = None,
+        control_dir: Path = None,
+        connect_timeout: int = 10,
+    ):
+        self.ssh_command = list(ssh_command or ["ssh"])
+        self.control_dir = Path(control_dir or default_control_dir())
+        self.connect_timeout = connect_timeout
+
+    def _options(self) -> List[str]:
+        """Never prompt, and reuse one master connection per host across runs"""
+        options = [
+            "BatchMode=yes",
+            f"ConnectTimeout={self.connect_timeout}",
+            "ControlMaster=auto",
+            f"ControlPath={self.control_dir}/%C",
+            f"ControlPersist={CONTROL_PERSIST}",
+        ]
+        return [arg for option in options for arg in ("-o", option)]
+
+    def run(self, host: str, command: str, timeout: float) -> CommandResult:
+        """Run a command on a host; raises subprocess.TimeoutExpired past the deadline"""
+        self.control_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        result = subprocess.run(
+            self.ssh_command + self._options() + ["-T", host, command],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            stdin=subprocess.DEVNULL,
+        )
+        return result.returncode, result.stdout, result.stderr
+
+
+def check_host(transport, host: str, command: str, timeout: float) -> Dict:
+    """Run the remote status command on one host and parse its JSON reply"""
+    started = time.monotonic()
+    result = {"host": host, "status": "ok", "error": None, "counts": {}, "details": [], "sources": {}}
+    try:
+        returncode, stdout, stderr = transport.run(host, command, timeout)
+        if returncode != 0:
+            lines = stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"exit status {returncode}")
+        status = json.loads(stdout)
+        result["counts"] = status.get("counts", {})
+        result["details"] = status.get("details", [])
+        result["sources"] = status.get("sources", {})
+        result["last_check"] = status.get("last_check")
+        failed = sorted(source_errors(result["sources"]))
+        if failed:
+            result["status"] = "partial"
+            result["error"] = "failed sources: " + ", ".join(failed)
+    except subprocess.TimeoutExpired:
+        result.update(status="timeout", error=f"no reply within {timeout}s")
+    except (json.JSONDecodeError, AttributeError) as e:
+        result.update(status="error", error=f"invalid status reply: {e}")
+    except (RuntimeError, OSError, subprocess.SubprocessError) as e:
+        result.update(status="error", error=str(e))
+    result["duration"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def check_fleet(
+    hosts: List[str],
+    transport,
+    command: str = DEFAULT_REMOTE_COMMAND,
+    workers: int = DEFAULT_WORKERS,
+    host_timeout: float = DEFAULT_HOST_TIMEOUT,
+) -> List[Dict]:
+    """Check all hosts with a bounded worker pool, each under its own deadline"""
+    if not hosts:
+        return []
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(hosts))), thread_name_prefix="fleet-check"
+    ) as executor:
+        return list(
+            executor.map(lambda host: check_host(transport, host, command, host_timeout), hosts)
+        )
+
+
+def aggregate(results: List[Dict]) -> Dict:
+    """Roll per-host results up into host and package summaries"""
+    packages = {}
+    for result in results:
+        seen = set()
+        for record in result["details"]:
+            if record["name"] in seen:
+                continue
+            seen.add(record["name"])
+            entry = packages.setdefault(
+                record["name"],
+                {
+                    "name": record["name"],
+                    "repo": record.get("repo") or record.get("source"),
+                    "versions": set(),
+                    "hosts": [],
+                },
+            )
+            entry["versions"].add(record["new_version"])
+            entry["hosts"].append(result["host"])
+
+    package_rollup = sorted(
+        (
+            dict(entry, versions=sorted(entry["versions"]), host_count=len(entry["hosts"]))
+            for entry in packages.values()
+        ),
+        key=lambda entry: (-entry["host_count"], entry["name"]),
+    )
+    host_rollup = [
+        {
+            "host": result["host"],
+            "status": result["status"],
+            "error": result["error"],
+            "total": result["counts"].get("total", 0),
+            "counts": result["counts"],
+            "packages": sorted({record["name"] for record in result["details"]}),
+            "last_check": result.get("last_check"),
+            "duration": result["duration"],
+        }
+        for result in results
+    ]
+    return {
+        "generated": time.time(),
+        "generated_by": socket.gethostname(),
+        "summary": {
+            "hosts": len(results),
+            "ok": sum(1 for r in results if r["status"] == "ok"),
+            "failed": sum(1 for r in results if r["status"] in ("error", "timeout")),
+            "hosts_with_updates": sum(1 for h in host_rollup if h["total"] > 0),
+            "total_updates": sum(h["total"] for h in host_rollup),
+            "distinct_packages": len(package_rollup),
+        },
+        "hosts": host_rollup,
+        "packages": package_rollup,
+    }
+
+
+def format_report(report: Dict, output_format: str = "json") -> str:
+    """Render the aggregated report as JSON or as CSV with host and package rows"""
+    if output_format == "json":
+        return json.dumps(report, indent=2)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["scope", "name", "status", "repo", "updates", "hosts", "versions", "error"])
+    for host in report["hosts"]:
+        writer.writerow(
+            ["host", host["host"], host["status"], "", host["total"], "", "", host["error"] or ""]
+        )
+    for package in report["packages"]:
+        writer.writerow(
+            [
+                "package",
+                package["name"],
+                "",
+                package["repo"] or "",
+                package["host_count"],
+                ";".join(package["hosts"]),
+                ";".join(package["versions"]),
+                "",
+            ]
+        )
+    return buffer.getvalue().rstrip("\n")
+
+
+def run_fleet(
+    hosts_file: Path,
+    settings: Dict,
+    output_format: str = "json",
+    workers: Optional[int] = None,
+    transport=None,
+) -> str:
+    """Check every host listed in hosts_file and return the formatted report"""
+    fleet = settings.get("fleet", {})
+    if transport is None:
+        transport = SshTransport(fleet.get("ssh_command"), fleet.get("control_dir"))
+    results = check_fleet(
+        read_hosts(hosts_file),
+        transport,
+        fleet.get("remote_command", DEFAULT_REMOTE_COMMAND),
+        workers or fleet.get("workers", DEFAULT_WORKERS),
+        fleet.get("host_timeout", DEFAULT_HOST_TIMEOUT),
+    )
+    return format_report(aggregate(results), output_format)
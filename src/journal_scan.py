@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Incremental journald error scanner for the Waybar updates module
+Reads only entries logged after the saved journald cursor, groups repeated
+errors by unit and message ID and keeps them until they have been shown
+"""
+
+import fcntl
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from update_cache import atomic_write
+
+STATE_FILE = "journal_state.json"
+
+CURSOR_PREFIX = "-- cursor: "
+
+# A recorded `journalctl -o json --show-cursor` export replayed instead of the live journal
+RECORDING_ENV = "WAYBAR_UPDATES_JOURNAL_EXPORT"
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "priority": 3,
+    # Entries read on the first scan, before any cursor has been saved
+    "initial_entries": 200,
+    "max_groups": 50,
+    "timeout": 10,
+}
+
+
+def journal_settings(update_settings: Dict) -> Dict:
+    """The journal block of update_settings merged over the defaults"""
+    return {**DEFAULT_SETTINGS, **update_settings.get("journal", {})}
+
+
+def journal_command(settings: Dict, cursor: Optional[str]) -> List[str]:
+    """journalctl invocation reading error entries after the cursor as JSON"""
+    command = [
+        "journalctl",
+        "-p",
+        str(settings["priority"]),
+        "-o",
+        "json",
+        "--no-pager",
+        "--show-cursor",
+    ]
+    if cursor:
+        command += ["--after-cursor", cursor]
+    else:
+        command += ["-n", str(settings["initial_entries"])]
+    return command
+
+
+def parse_journal_output(lines: Iterable[str]) -> Tuple[List[Dict], Optional[str]]:
+    """Entries and the final cursor from `journalctl -o json --show-cursor` output"""
+    entries = []
+    cursor = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith(CURSOR_PREFIX):
+            cursor = line[len(CURSOR_PREFIX):]
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            # Blank lines and "-- No entries --"
+            continue
+        if isinstance(entry, dict):
+            entries.append(entry)
+    if cursor is None and entries:
+        cursor = entries[-1].get("__CURSOR")
+    return entries, cursor
+
+
+def entries_after(entries: List[Dict], cursor: Optional[str]) -> List[Dict]:
+    """Emulate --after-cursor on a recorded export"""
+    if cursor:
+        for index, entry in enumerate(entries):
+            if entry.get("__CURSOR") == cursor:
+                return entries[index + 1:]
+    return entries
+
+
+def _field(entry: Dict, name: str) -> str:
+    value = entry.get(name)
+    if isinstance(value, list):
+        # journalctl encodes non-UTF-8 fields as byte arrays
+        try:
+            return bytes(value).decode("utf-8", "replace")
+        except (TypeError, ValueError):
+            return ""
+    return str(value) if value is not None else ""
+
+
+def entry_unit(entry: Dict) -> str:
+    """Unit, or the closest identifier journald has for the sender"""
+    for name in ("_SYSTEMD_UNIT", "_SYSTEMD_USER_UNIT", "SYSLOG_IDENTIFIER", "_COMM"):
+        value = _field(entry, name)
+        if value:
+            return value
+    return "kernel" if _field(entry, "_TRANSPORT") == "kernel" else "unknown"
+
+
+def group_key(group: Dict) -> str:
+    """Errors with a message ID group by it; others by their message text"""
+    return f"{group['unit']}\x1f{group['message_id'] or group['message']}"
+
+
+def merge_entries(groups: List[Dict], entries: List[Dict], max_groups: int) -> List[Dict]:
+    """Fold new entries into the groups, most recently seen first"""
+    by_key = {group_key(group): dict(group) for group in groups}
+    for entry in entries:
+        try:
+            seen = int(_field(entry, "__REALTIME_TIMESTAMP")) / 1000000
+        except ValueError:
+            seen = 0
+        group = {
+            "unit": entry_unit(entry),
+            "message_id": _field(entry, "MESSAGE_ID"),
+            "message": _field(entry, "MESSAGE"),
+        }
+        existing = by_key.get(group_key(group))
+        if existing is None:
+            by_key[group_key(group)] = {
+                **group,
+                "priority": _field(entry, "PRIORITY"),
+                "count": 1,
+                "first_seen": seen,
+                "last_seen": seen,
+            }
+        else:
+            existing["count"] += 1
+            existing["message"] = group["message"]
+            existing["last_seen"] = max(existing["last_seen"], seen)
+    merged = sorted(by_key.values(), key=lambda group: group["last_seen"], reverse=True)
+    return merged[:max_groups]
+
+
+def format_group(group: Dict) -> str:
+    """One line per group, e.g. '3x sshd.service: error: kex_exchange_identification'"""
+    count = f"{group['count']}x " if group["count"] > 1 else ""
+    return f"{count}{group['unit']}: {group['message']}"
+
+
+class JournalScanner:
+    """Scans the journal incrementally and keeps the errors not yet shown to the user"""
+
+    def __init__(self, state_dir: Path, settings: Dict, recording: Optional[str] = None):
+        self.settings = settings
+        self.state_file = Path(state_dir) / STATE_FILE
+        self.recording = recording if recording is not None else os.getenv(RECORDING_ENV)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings.get("enabled", True))
+
+    def load(self) -> Dict:
+        """Saved cursor and pending groups"""
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+            if isinstance(state, dict):
+                return state
+        except (OSError, json.JSONDecodeError):
+            pass
+        return {}
+
+    def pending(self) -> List[Dict]:
+        """Error groups logged since they were last shown"""
+        return self.load().get("groups", [])
+
+    def new_error_count(self) -> int:
+        """Number of error entries not yet shown, cheap enough for every render"""
+        return sum(group.get("count", 0) for group in self.pending())
+
+    def read_entries(self, cursor: Optional[str]) -> Optional[Tuple[List[Dict], Optional[str]]]:
+        """New entries and the cursor to resume from, or None if the journal cannot be read"""
+        if self.recording:
+            try:
+                with open(self.recording, "r") as f:
+                    entries, last_cursor = parse_journal_output(f)
+            except OSError as e:
+                print(f"Warning: Could not read journal export {self.recording}: {e}", file=sys.stderr)
+                return None
+            if not cursor:
+                entries = entries[-self.settings["initial_entries"]:]
+            return entries_after(entries, cursor), last_cursor or cursor
+        try:
+            result = subprocess.run(
+                journal_command(self.settings, cursor),
+                capture_output=True,
+                text=True,
+                timeout=self.settings["timeout"],
+            )
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError) as e:
+            print(f"Warning: Could not read the journal: {e}", file=sys.stderr)
+            return None
+        if result.returncode != 0:
+            if cursor:
+                # The cursor points into a rotated or vacuumed journal file
+                print("Warning: Saved journal cursor is no longer valid, rescanning", file=sys.stderr)
+                return self.read_entries(None)
+            return None
+        entries, last_cursor = parse_journal_output(result.stdout.splitlines())
+        return entries, last_cursor or cursor
+
+    def _update(self, change) -> Optional[Dict]:
+        """Apply change to the saved state under a lock and write it back atomically"""
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.state_file.with_name(STATE_FILE + ".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                before = self.load()
+                state = change(dict(before))
+                if state is None or state == before:
+                    return before
+                atomic_write(self.state_file, json.dumps(state))
+                return state
+        except OSError as e:
+            print(f"Warning: Could not save journal state: {e}", file=sys.stderr)
+            return None
+
+    def scan(self) -> List[Dict]:
+        """Read entries logged since the last scan and return all pending groups"""
+        if not self.enabled:
+            return []
+
+        def change(state):
+            read = self.read_entries(state.get("cursor"))
+            if read is None:
+                return None
+            entries, cursor = read
+            state["cursor"] = cursor
+            if entries:
+                state["groups"] = merge_entries(
+                    state.get("groups", []), entries, self.settings["max_groups"]
+                )
+            return state
+
+        state = self._update(change)
+        return (state or {}).get("groups", [])
+
+    def acknowledge(self, shown: List[Dict]):
+        """Drop groups that have been shown, keeping any that recurred since"""
+        shown_at = {group_key(group): group["last_seen"] for group in shown}
+
+        def change(state):
+            state["groups"] = [
+                group
+                for group in state.get("groups", [])
+                if group["last_seen"] > shown_at.get(group_key(group), float("-inf"))
+            ]
+            return state
+
+        self._update(change)
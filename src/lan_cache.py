@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Shared LAN cache for the Waybar updates module
+One node syncs the package databases and looks up AUR versions, then serves both
+over HTTP with ETag/If-Modified-Since; clients fetch only what changed and compare
+it against their own local package database
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from aur_rpc import DEFAULT_AUR_RPC_URL, AurClient, AurRpcError
+from pacman_db import default_private_db_path, sync_databases
+from update_cache import atomic_write
+
+# Loopback only; serving other machines takes an explicit LAN address in lan_cache.listen
+DEFAULT_LISTEN = "127.0.0.1:8787"
+DEFAULT_SERVER_INTERVAL = 1800
+DEFAULT_AUR_TTL = 3600
+
+# Path on the cache server that speaks the AUR RPC v5 info protocol
+AUR_RPC_PATH = "/aur/rpc"
+
+ETAG_FILE = ".lan-etags.json"
+SYNC_DB_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._+-]*\.db$")
+
+
+class LanCacheError(Exception):
+    """Raised when the shared cache server cannot be reached or returns an error"""
+
+
+def parse_listen(listen: str) -> Tuple[str, int]:
+    """Split a HOST:PORT listen address"""
+    host, _, port = listen.rpartition(":")
+    if not port.isdigit():
+        raise ValueError(f"Invalid listen address: {listen}")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong validator for a served file, derived from its mtime and size"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def not_modified(headers, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match, then If-Modified-Since, as RFC 9110 orders them"""
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+class CacheServer:
+    """State of the cache server: the synced DB dir and a per-package AUR cache"""
+
+    def __init__(
+        self,
+        private_db: Path = None,
+        pacman_conf: Path = None,
+        aur_rpc_url: str = DEFAULT_AUR_RPC_URL,
+        interval: float = DEFAULT_SERVER_INTERVAL,
+        aur_ttl: float = DEFAULT_AUR_TTL,
+    ):
+        self.private_db = Path(private_db or default_private_db_path())
+        self.sync_dir = self.private_db / "sync"
+        self.pacman_conf = pacman_conf
+        self.interval = interval
+        self.aur_ttl = aur_ttl
+        self._aur_client = AurClient(aur_rpc_url)
+        # Package name -> (fetch time, RPC record or None when the AUR has no such package)
+        self._aur_cache: Dict[str, Tuple[float, Optional[Dict]]] = {}
+        self._aur_lock = threading.Lock()
+        # The pooled AUR connection is not thread safe; lookups take turns on it
+        self._upstream_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def sync_files(self) -> Dict[str, Path]:
+        """Sync DB files currently available for clients, by file name"""
+        try:
+            return {path.name: path for path in self.sync_dir.glob("*.db") if path.is_file()}
+        except OSError:
+            return {}
+
+    def index(self) -> Dict[str, Dict]:
+        """Validators of every served DB so clients can see what changed in one request"""
+        index = {}
+        for name, path in sorted(self.sync_files().items()):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            index[name[:-3]] = {"etag": file_etag(stat), "size": stat.st_size, "mtime": stat.st_mtime}
+        return index
+
+    def _fetch_aur(self, names: List[str]):
+        """Look names up upstream in batches and cache the answers, misses included"""
+        with self._upstream_lock:
+            found = self._aur_client.info(names)
+        now = time.time()
+        with self._aur_lock:
+            for name in names:
+                self._aur_cache[name] = (now, found.get(name))
+
+    def aur_info(self, names: List[str]) -> List[Dict]:
+        """Answer an info query from the cache, asking the AUR only for unknown or expired names"""
+        now = time.time()
+        with self._aur_lock:
+            missing = [
+                name
+                for name in dict.fromkeys(names)
+                if name not in self._aur_cache or now - self._aur_cache[name][0] > self.aur_ttl
+            ]
+        if missing:
+            self._fetch_aur(missing)
+        with self._aur_lock:
+            records = [self._aur_cache.get(name, (0, None))[1] for name in dict.fromkeys(names)]
+        return [record for record in records if record is not None]
+
+    def refresh(self):
+        """Sync the databases and re-query every AUR package a client has asked about"""
+        sync_databases(self.private_db, pacman_conf=self.pacman_conf)
+        with self._aur_lock:
+            known = sorted(self._aur_cache)
+        if known:
+            try:
+                self._fetch_aur(known)
+            except AurRpcError as e:
+                print(f"Warning: Could not refresh AUR cache: {e}", file=sys.stderr)
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def http_server(self, listen: str = DEFAULT_LISTEN) -> ThreadingHTTPServer:
+        """Bind the HTTP server that answers clients from this cache"""
+        server = ThreadingHTTPServer(parse_listen(listen), _CacheRequestHandler)
+        server.daemon_threads = True
+        server.cache_server = self
+        return server
+
+    def serve_forever(self, listen: str = DEFAULT_LISTEN):
+        """Keep the data fresh in the background and serve it until interrupted"""
+        server = self.http_server(listen)
+        threading.Thread(target=self._refresh_loop, name="lan-cache-refresh", daemon=True).start()
+        print(f"Serving update cache on {listen}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            server.server_close()
+
+
+class _CacheRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive lets the AUR client reuse one connection for all its batches
+    protocol_version = "HTTP/1.1"
+    server_version = "waybar-updates-cache"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status: int = 200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path: Path):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self._send_json({"error": "not found"}, 404)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = file_etag(stat)
+            if not_modified(self.headers, etag, stat.st_mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(stat.st_size))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(stat.st_mtime, usegmt=True))
+            self.end_headers()
+            remaining = stat.st_size
+            while remaining > 0:
+                chunk = f.read(min(remaining, 65536))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _aur_info(self, query: Dict[str, List[str]]):
+        names = query.get("arg[]", []) + query.get("arg", [])
+        try:
+            results = self.server.cache_server.aur_info(names)
+        except AurRpcError as e:
+            self._send_json({"type": "error", "error": str(e), "version": 5}, 502)
+            return
+        self._send_json(
+            {"type": "multiinfo", "resultcount": len(results), "results": results, "version": 5}
+        )
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        cache_server = self.server.cache_server
+        if parts.path == "/sync/":
+            self._send_json(cache_server.index())
+        elif parts.path.startswith("/sync/"):
+            name = parts.path[len("/sync/"):]
+            files = cache_server.sync_files()
+            # Only ever serve files that are listed, never a client-supplied path
+            if SYNC_DB_NAME.match(name) and name in files:
+                self._send_file(files[name])
+            else:
+                self._send_json({"error": "not found"}, 404)
+        elif parts.path == f"{AUR_RPC_PATH}/v5/info":
+            self._aur_info(parse_qs(parts.query))
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode(errors="replace")
+        if urlsplit(self.path).path == f"{AUR_RPC_PATH}/v5/info":
+            self._aur_info(parse_qs(body))
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+
+def lan_aur_rpc_url(base_url: str) -> str:
+    """AUR RPC URL served by a cache server, for AurClient"""
+    return base_url.rstrip("/") + AUR_RPC_PATH
+
+
+def _load_etags(sync_dir: Path) -> Dict[str, str]:
+    try:
+        with open(sync_dir / ETAG_FILE, "r") as f:
+            etags = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return etags if isinstance(etags, dict) else {}
+
+
+def _save_etags(sync_dir: Path, etags: Dict[str, str]):
+    try:
+        with open(sync_dir / ETAG_FILE, "w") as f:
+            json.dump(etags, f)
+    except OSError as e:
+        print(f"Warning: Could not store cache validators: {e}", file=sys.stderr)
+
+
+def _write_db(sync_dir: Path, name: str, response, last_modified: Optional[str]):
+    """Replace a sync DB atomically so a concurrent reader never sees half a file"""
+    mtime = None
+    if last_modified:
+        # Mirror the server's mtime so the package index notices exactly this change
+        try:
+            mtime = parsedate_to_datetime(last_modified).timestamp()
+        except (TypeError, ValueError):
+            pass
+    atomic_write(sync_dir / name, response.read(), mtime=mtime)
+
+
+def fetch_sync_dbs(base_url: str, sync_dir: Path, repos: List[str], timeout: float = 30) -> int:
+    """Bring the client's sync DBs up to date with conditional GETs; returns how many changed"""
+    base_url = base_url.rstrip("/")
+    try:
+        sync_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        raise LanCacheError(f"Could not create {sync_dir}: {e}")
+    etags = _load_etags(sync_dir)
+    changed = 0
+    for repo in repos:
+        name = f"{repo}.db"
+        request = urllib.request.Request(f"{base_url}/sync/{name}")
+        local_file = sync_dir / name
+        if local_file.exists():
+            if etags.get(name):
+                request.add_header("If-None-Match", etags[name])
+            request.add_header(
+                "If-Modified-Since", formatdate(local_file.stat().st_mtime, usegmt=True)
+            )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                _write_db(sync_dir, name, response, response.headers.get("Last-Modified"))
+                etags[name] = response.headers.get("ETag")
+                changed += 1
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                continue
+            if e.code == 404:
+                print(f"Warning: Cache server does not carry repository {repo}", file=sys.stderr)
+                continue
+            raise LanCacheError(f"Cache server returned HTTP {e.code} for {name}")
+        except (urllib.error.URLError, OSError) as e:
+            raise LanCacheError(f"Cache server request failed: {e}")
+    if changed:
+        _save_etags(sync_dir, etags)
+    return changed
+
+
+def run_cache_server(settings: Dict, listen: str = None):
+    """Start the cache server described by the lan_cache settings"""
+    lan_cache = settings.get("lan_cache", {})
+    CacheServer(
+        settings.get("sync_db_path"),
+        lan_cache.get("pacman_conf"),
+        settings.get("aur_rpc_url", DEFAULT_AUR_RPC_URL),
+        lan_cache.get("interval", DEFAULT_SERVER_INTERVAL),
+        lan_cache.get("aur_ttl", DEFAULT_AUR_TTL),
+    ).serve_forever(listen or lan_cache.get("listen", DEFAULT_LISTEN))
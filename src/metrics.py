@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Timing and counter instrumentation for the Waybar updates module
+Records per-phase spans and event counters in-process, prints a --profile
+breakdown and exports a Prometheus textfile for node_exporter
+"""
+
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PREFIX = "waybar_updates"
+
+COUNTER_HELP = {
+    "cache_hits": "Checks answered from a fresh cache",
+    "cache_misses": "Checks that found no fresh cache",
+    "check_failures": "Backend checks that failed",
+    "check_timeouts": "Backend checks cut off by the overall deadline",
+    "subprocess_failures": "Package manager commands that exited with an error",
+    "subprocess_timeouts": "Package manager commands that timed out",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def format_labels(labels: Labels) -> str:
+    """Render labels in exposition format, e.g. {backend="pacman"}"""
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of timing spans and counters for one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (phase, labels) -> durations in seconds, in first-seen order
+        self.spans: Dict[Tuple[str, Labels], List[float]] = {}
+        # (counter, labels) -> count
+        self.counters: Dict[Tuple[str, Labels], int] = {}
+
+    def observe(self, phase: str, seconds: float, **labels):
+        """Record one duration for a phase"""
+        with self._lock:
+            self.spans.setdefault((phase, _labels(labels)), []).append(seconds)
+
+    @contextmanager
+    def span(self, phase: str, **labels) -> Iterator[None]:
+        """Time the enclosed block, also when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started, **labels)
+
+    def count(self, name: str, amount: int = 1, **labels):
+        """Increment an event counter"""
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def drain(self) -> Tuple[Dict, Dict]:
+        """Return and clear everything recorded so far"""
+        with self._lock:
+            spans, counters = self.spans, self.counters
+            self.spans, self.counters = {}, {}
+        return spans, counters
+
+
+METRICS = Metrics()
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started, covering interpreter start-up and imports"""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Fields after the command name; starttime is field 22 of the whole line
+            fields = f.read().rpartition(")")[2].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def record_startup(metrics: Metrics = METRICS):
+    """Record interpreter start-up and module imports as the startup phase"""
+    age = process_age()
+    if age is not None:
+        metrics.observe("startup", age)
+
+
+def format_profile(metrics: Metrics = METRICS) -> str:
+    """Human readable per-phase breakdown for --profile"""
+    with metrics._lock:
+        spans = dict(metrics.spans)
+        counters = dict(metrics.counters)
+    lines = [f"{'phase':<40} {'calls':>5} {'total ms':>10}"]
+    for (phase, labels), samples in spans.items():
+        name = phase + format_labels(labels)
+        lines.append(f"{name:<40} {len(samples):>5} {sum(samples) * 1000:>10.1f}")
+    if counters:
+        lines.append("")
+        lines.append(f"{'counter':<40} {'count':>5}")
+        for (counter, labels), value in sorted(counters.items()):
+            lines.append(f"{counter + format_labels(labels):<40} {value:>5}")
+    return "\n".join(lines)
+
+
+def _load_state(state_file: Path) -> Dict:
+    try:
+        with open(state_file, "r") as f:
+            state = json.load(f)
+        if isinstance(state, dict):
+            return state
+    except (OSError, json.JSONDecodeError):
+        pass
+    return {}
+
+
+def _merge(state: Dict, spans: Dict, counters: Dict) -> Dict:
+    """Fold drained spans and counters into the cumulative state"""
+    summaries = state.setdefault("summaries", {})
+    # Only phases seen since the previous export describe the latest run
+    last = state["last"] = {}
+    totals = state.setdefault("counters", {})
+    for (phase, labels), samples in spans.items():
+        key = format_labels((("phase", phase),) + labels)
+        total, count = summaries.get(key, (0.0, 0))
+        summaries[key] = (total + sum(samples), count + len(samples))
+        last[key] = samples[-1]
+    for (counter, labels), value in counters.items():
+        family = totals.setdefault(counter, {})
+        key = format_labels(labels)
+        family[key] = family.get(key, 0) + value
+    state["updated"] = time.time()
+    return state
+
+
+def format_textfile(state: Dict) -> str:
+    """Render cumulative state in the Prometheus text format read by node_exporter"""
+    lines = [
+        f"# HELP {PREFIX}_phase_seconds Time spent in each phase of the update check",
+        f"# TYPE {PREFIX}_phase_seconds summary",
+    ]
+    for key, (total, count) in sorted(state.get("summaries", {}).items()):
+        lines.append(f"{PREFIX}_phase_seconds_sum{key} {total:.6f}")
+        lines.append(f"{PREFIX}_phase_seconds_count{key} {count}")
+    lines += [
+        f"# HELP {PREFIX}_last_phase_seconds Duration of each phase in the latest run",
+        f"# TYPE {PREFIX}_last_phase_seconds gauge",
+    ]
+    for key, seconds in sorted(state.get("last", {}).items()):
+        lines.append(f"{PREFIX}_last_phase_seconds{key} {seconds:.6f}")
+    for counter, family in sorted(state.get("counters", {}).items()):
+        name = f"{PREFIX}_{counter}_total"
+        lines.append(f"# HELP {name} {COUNTER_HELP.get(counter, counter.replace('_', ' '))}")
+        lines.append(f"# TYPE {name} counter")
+        for key, value in sorted(family.items()):
+            lines.append(f"{name}{key} {value}")
+    lines += [
+        f"# HELP {PREFIX}_last_run_timestamp_seconds Time the metrics were last written",
+        f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge",
+        f"{PREFIX}_last_run_timestamp_seconds {state.get('updated', 0):.3f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def export_textfile(path: Path, metrics: Metrics = METRICS) -> bool:
+    """Add this process's metrics to the running totals and rewrite the textfile atomically"""
+    path = Path(path).expanduser()
+    # Totals survive between short-lived runs in a hidden file node_exporter ignores
+    state_file = path.with_name(f".{path.name}.state.json")
+    spans, counters = metrics.drain()
+    # update_cache imports this module, so its helper can only be loaded here
+    from update_cache import atomic_write
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(state_file.with_name(state_file.name + ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = _merge(_load_state(state_file), spans, counters)
+            with open(state_file, "w") as f:
+                json.dump(state, f)
+            atomic_write(path, format_textfile(state), mode=0o644)
+    except OSError as e:
+        print(f"Warning: Could not write metrics file {path}: {e}", file=sys.stderr)
+        return False
+    return True
+
+
+def report_metrics(textfile: Optional[str] = None, profile: bool = False):
+    """Exit hook for --profile and --metrics"""
+    if profile:
+        print(format_profile(), file=sys.stderr)
+    if textfile:
+        export_textfile(Path(textfile))
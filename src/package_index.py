@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Incrementally updated package version index for the Waybar updates module
+Keeps name -> (local version, repo version, repo) in SQLite and only reparses changed DB files
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pacman_db import (
+    PACMAN_CONF,
+    PACMAN_DB_PATH,
+    configured_repos,
+    read_local_entry,
+    read_sync_db,
+    sync_db_files,
+    vercmp,
+)
+
+try:
+    import sqlite3
+
+    SQLITE_AVAILABLE = True
+except ImportError:
+    SQLITE_AVAILABLE = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    repo TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    priority INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_packages (
+    name TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    version TEXT NOT NULL,
+    csize INTEGER NOT NULL,
+    isize INTEGER NOT NULL,
+    PRIMARY KEY (name, repo)
+);
+CREATE TABLE IF NOT EXISTS local_packages (
+    entry TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    isize INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS local_packages_name ON local_packages (name);
+"""
+
+# Best candidate per package: the repository listed first in pacman.conf wins
+CANDIDATES = """
+WITH ranked AS (
+    SELECT s.name, s.version, s.repo, s.csize, s.isize,
+           ROW_NUMBER() OVER (PARTITION BY s.name ORDER BY r.priority) AS rank
+    FROM sync_packages s JOIN repos r ON r.repo = s.repo
+)
+SELECT l.name, l.version, c.version, c.repo, c.csize, c.isize - l.isize
+FROM local_packages l
+LEFT JOIN ranked c ON c.name = l.name AND c.rank = 1
+"""
+
+
+class PackageIndex:
+    def __init__(
+        self,
+        index_path: Path,
+        sync_dir: Path = PACMAN_DB_PATH / "sync",
+        local_db: Path = PACMAN_DB_PATH / "local",
+        pacman_conf: Path = PACMAN_CONF,
+    ):
+        if not SQLITE_AVAILABLE:
+            raise RuntimeError("sqlite3 module is not available")
+        self.index_path = Path(index_path)
+        self.sync_dir = Path(sync_dir)
+        self.local_db = Path(local_db)
+        self.pacman_conf = Path(pacman_conf)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.index_path), timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.create_function("vercmp", 2, vercmp)
+
+    def close(self):
+        """Close the SQLite connection"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _update_sync(self) -> int:
+        """Reparse only sync DBs whose mtime or size changed; return the number reparsed"""
+        repos = configured_repos(self.pacman_conf)
+        stored = {
+            row[0]: (row[1], row[2], row[3])
+            for row in self.conn.execute("SELECT repo, path, mtime, size FROM repos")
+        }
+        reparsed = 0
+        seen = set()
+        for priority, db_file in enumerate(sync_db_files(self.sync_dir, repos)):
+            repo = db_file.stem
+            seen.add(repo)
+            try:
+                stat = db_file.stat()
+            except OSError:
+                continue
+            state = (str(db_file), stat.st_mtime, stat.st_size)
+            if stored.get(repo) != state:
+                packages = read_sync_db(db_file, repo)
+                self.conn.execute("DELETE FROM sync_packages WHERE repo = ?", (repo,))
+                self.conn.executemany(
+                    "INSERT INTO sync_packages VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (p["name"], repo, p["version"], p["csize"], p["isize"])
+                        for p in packages.values()
+                    ],
+                )
+                reparsed += 1
+            # Priority follows pacman.conf even when the DB file itself is unchanged
+            self.conn.execute(
+                "INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?, ?)", (repo,) + state + (priority,)
+            )
+
+        for repo in set(stored) - seen:
+            self.conn.execute("DELETE FROM sync_packages WHERE repo = ?", (repo,))
+            self.conn.execute("DELETE FROM repos WHERE repo = ?", (repo,))
+            reparsed += 1
+        return reparsed
+
+    def _update_local(self) -> int:
+        """Read desc files only for local DB entries added since the last update"""
+        try:
+            current = {
+                entry.name: entry.path for entry in os.scandir(self.local_db) if entry.is_dir()
+            }
+        except OSError as e:
+            print(f"Warning: Could not read local database {self.local_db}: {e}", file=sys.stderr)
+            return 0
+        stored = {row[0] for row in self.conn.execute("SELECT entry FROM local_packages")}
+
+        removed = stored - set(current)
+        self.conn.executemany(
+            "DELETE FROM local_packages WHERE entry = ?", [(entry,) for entry in removed]
+        )
+        added = set(current) - stored
+        rows = []
+        for entry in added:
+            record = read_local_entry(current[entry])
+            if record:
+                rows.append((entry, record["name"], record["version"], record["isize"]))
+        self.conn.executemany("INSERT OR REPLACE INTO local_packages VALUES (?, ?, ?, ?)", rows)
+        return len(removed) + len(added)
+
+    def update(self) -> bool:
+        """Bring the index up to date with the pacman databases; True if anything changed"""
+        with self.conn:
+            changed = self._update_sync() + self._update_local()
+        return changed > 0
+
+    def pending_updates(self) -> List[Dict]:
+        """Return pending repo upgrades in the same shape as pacman_db.compute_updates"""
+        query = CANDIDATES + " WHERE c.version IS NOT NULL AND vercmp(c.version, l.version) > 0 ORDER BY l.name"
+        return [
+            {
+                "name": row[0],
+                "old_version": row[1],
+                "new_version": row[2],
+                "repo": row[3],
+                "download_size": row[4],
+                "installed_size_delta": row[5],
+            }
+            for row in self.conn.execute(query)
+        ]
+
+    def foreign_packages(self) -> Dict[str, str]:
+        """Return installed packages that no sync DB provides (AUR or local builds)"""
+        query = CANDIDATES + " WHERE c.version IS NULL ORDER BY l.name"
+        return {row[0]: row[1] for row in self.conn.execute(query)}
+
+    def package_details(self, name: str) -> Optional[Dict]:
+        """Look up local and repo versions of a single package"""
+        row = self.conn.execute(CANDIDATES + " WHERE l.name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "name": row[0],
+            "local_version": row[1],
+            "repo_version": row[2],
+            "repo": row[3],
+            "download_size": row[4],
+            "installed_size_delta": row[5],
+        }
+
+
+def query_repo_updates(index_path: Path, sync_dir: Path) -> Optional[List[Dict]]:
+    """Refresh the index and return pending upgrades, or None if the index is unusable"""
+    if not SQLITE_AVAILABLE:
+        return None
+    try:
+        with PackageIndex(index_path, sync_dir) as index:
+            index.update()
+            return index.pending_updates()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: Package index {index_path} unavailable: {e}", file=sys.stderr)
+        return None
+
+
+def add_repo_details(records: List[Dict], index_path: Path, sync_dir: Path) -> List[Dict]:
+    """Fill in repo and size details for pacman update records from the index"""
+    if not SQLITE_AVAILABLE or not any(r["source"] == "pacman" for r in records):
+        return records
+    try:
+        with PackageIndex(index_path, sync_dir) as index:
+            index.update()
+            for record in records:
+                if record["source"] != "pacman":
+                    continue
+                details = index.package_details(record["name"])
+                if details and details["repo_version"] == record["new_version"]:
+                    record["repo"] = details["repo"]
+                    record["download_size"] = details["download_size"]
+                    record["installed_size_delta"] = details["installed_size_delta"]
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: Package index {index_path} unavailable: {e}", file=sys.stderr)
+    return records
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Native pacman database reader for the Waybar updates module
+Computes pending repo upgrades from the local DB and sync DB archives without forking checkupdates
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tarfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from poll_snapshot import PACMAN_DB_DIR
+
+PACMAN_DB_PATH = Path(PACMAN_DB_DIR)
+PACMAN_CONF = Path(os.getenv("WAYBAR_UPDATES_PACMAN_CONF") or "/etc/pacman.conf")
+
+
+def default_private_db_path() -> Path:
+    """Return the private DB path shared with checkupdates"""
+    env_db = os.getenv("CHECKUPDATES_DB")
+    if env_db:
+        return Path(env_db)
+    tmp_dir = os.getenv("TMPDIR") or "/tmp"
+    return Path(tmp_dir) / f"checkup-db-{os.getuid()}"
+
+
+# Port of alpm_pkg_vercmp()/rpmvercmp() from libalpm's version.c. Character
+# classes are ASCII only, matching the C locale pacman uses.
+
+
+def _isdigit(ch: str) -> bool:
+    return "0" <= ch <= "9"
+
+
+def _isalpha(ch: str) -> bool:
+    return "a" <= ch <= "z" or "A" <= ch <= "Z"
+
+
+def _isalnum(ch: str) -> bool:
+    return _isdigit(ch) or _isalpha(ch)
+
+
+def _rpmvercmp(a: str, b: str) -> int:
+    """Compare two version segments the way rpm and pacman do"""
+    if a == b:
+        return 0
+
+    len_a, len_b = len(a), len(b)
+    one = two = 0
+    ptr1 = ptr2 = 0
+
+    while one < len_a and two < len_b:
+        while one < len_a and not _isalnum(a[one]):
+            one += 1
+        while two < len_b and not _isalnum(b[two]):
+            two += 1
+
+        # Ran to the end of either string
+        if not (one < len_a and two < len_b):
+            break
+
+        # Different separator lengths decide the comparison
+        if (one - ptr1) != (two - ptr2):
+            return -1 if (one - ptr1) < (two - ptr2) else 1
+
+        ptr1, ptr2 = one, two
+
+        # Grab the first completely numeric or completely alpha segment
+        if _isdigit(a[ptr1]):
+            while ptr1 < len_a and _isdigit(a[ptr1]):
+                ptr1 += 1
+            while ptr2 < len_b and _isdigit(b[ptr2]):
+                ptr2 += 1
+            isnum = True
+        else:
+            while ptr1 < len_a and _isalpha(a[ptr1]):
+                ptr1 += 1
+            while ptr2 < len_b and _isalpha(b[ptr2]):
+                ptr2 += 1
+            isnum = False
+
+        seg1, seg2 = a[one:ptr1], b[two:ptr2]
+        if not seg1:
+            return -1
+        # Numeric segments are always newer than alpha segments
+        if not seg2:
+            return 1 if isnum else -1
+
+        if isnum:
+            seg1 = seg1.lstrip("0")
+            seg2 = seg2.lstrip("0")
+            if len(seg1) != len(seg2):
+                return 1 if len(seg1) > len(seg2) else -1
+
+        if seg1 != seg2:
+            return -1 if seg1 < seg2 else 1
+
+        one, two = ptr1, ptr2
+
+    if one >= len_a and two >= len_b:
+        return 0
+
+    # A remaining alpha string never beats an empty string
+    if (one >= len_a and not _isalpha(b[two])) or (one < len_a and _isalpha(a[one])):
+        return -1
+    return 1
+
+
+def _parse_evr(evr: str) -> Tuple[str, str, Optional[str]]:
+    """Split 'epoch:version-release' into its parts"""
+    pos = 0
+    while pos < len(evr) and _isdigit(evr[pos]):
+        pos += 1
+    if pos < len(evr) and evr[pos] == ":":
+        epoch = evr[:pos] or "0"
+        rest = evr[pos + 1:]
+    else:
+        epoch = "0"
+        rest = evr
+    version, sep, release = rest.rpartition("-")
+    if not sep:
+        return epoch, rest, None
+    return epoch, version, release
+
+
+def vercmp(a: str, b: str) -> int:
+    """Compare two full package versions: -1 if a is older, 0 if equal, 1 if newer"""
+    if a == b:
+        return 0
+    epoch1, ver1, rel1 = _parse_evr(a)
+    epoch2, ver2, rel2 = _parse_evr(b)
+    result = _rpmvercmp(epoch1, epoch2)
+    if result == 0:
+        result = _rpmvercmp(ver1, ver2)
+        if result == 0 and rel1 is not None and rel2 is not None:
+            result = _rpmvercmp(rel1, rel2)
+    return result
+
+
+def parse_desc(text: str) -> Dict[str, List[str]]:
+    """Parse a pacman desc file into a mapping of %FIELD% names to value lines"""
+    fields = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("%") and line.endswith("%") and len(line) > 2:
+            current = line[1:-1]
+            fields[current] = []
+        elif line and current is not None:
+            fields[current].append(line)
+        elif not line:
+            current = None
+    return fields
+
+
+def _package_record(fields: Dict[str, List[str]], repo: str = None) -> Optional[Dict]:
+    """Reduce parsed desc fields to the record used by the update engine"""
+    name = fields.get("NAME")
+    version = fields.get("VERSION")
+    if not name or not version:
+        return None
+
+    def _size(key: str) -> int:
+        try:
+            return int(fields.get(key, ["0"])[0])
+        except ValueError:
+            return 0
+
+    return {
+        "name": name[0],
+        "version": version[0],
+        "repo": repo,
+        "csize": _size("CSIZE"),
+        "isize": _size("ISIZE") or _size("SIZE"),
+    }
+
+
+def read_local_entry(entry_path: str) -> Optional[Dict]:
+    """Read a single installed package from its local/<pkg>/desc file"""
+    try:
+        with open(os.path.join(entry_path, "desc"), "r", errors="replace") as f:
+            return _package_record(parse_desc(f.read()))
+    except OSError:
+        return None
+
+
+def read_local_db(local_db: Path = PACMAN_DB_PATH / "local") -> Dict[str, Dict]:
+    """Read installed packages from local/<pkg>/desc"""
+    packages = {}
+    try:
+        entries = list(os.scandir(local_db))
+    except OSError as e:
+        print(f"Warning: Could not read local database {local_db}: {e}", file=sys.stderr)
+        return packages
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        record = read_local_entry(entry.path)
+        if record:
+            packages[record["name"]] = record
+    return packages
+
+
+def read_sync_db(db_file: Path, repo: str = None) -> Dict[str, Dict]:
+    """Read packages from a compressed sync DB archive such as core.db"""
+    repo = repo or Path(db_file).stem
+    packages = {}
+    try:
+        with tarfile.open(db_file, "r:*") as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.endswith("/desc"):
+                    continue
+                handle = archive.extractfile(member)
+                if handle is None:
+                    continue
+                record = _package_record(
+                    parse_desc(handle.read().decode(errors="replace")), repo
+                )
+                if record:
+                    packages[record["name"]] = record
+    except (tarfile.TarError, OSError, EOFError) as e:
+        print(f"Warning: Could not read sync database {db_file}: {e}", file=sys.stderr)
+    return packages
+
+
+def configured_repos(pacman_conf: Path = PACMAN_CONF) -> List[str]:
+    """Return repository names in pacman.conf order, which is their priority"""
+    repos = []
+    try:
+        with open(pacman_conf, "r") as f:
+            for line in f:
+                match = re.match(r"^\s*\[([^\]]+)\]", line)
+                if match and match.group(1) != "options":
+                    repos.append(match.group(1))
+    except OSError:
+        pass
+    return repos
+
+
+def parallel_downloads(pacman_conf: Path = PACMAN_CONF) -> int:
+    """ParallelDownloads from the [options] section of pacman.conf; 1 when unset"""
+    section = None
+    try:
+        with open(pacman_conf, "r") as f:
+            for line in f:
+                header = re.match(r"^\s*\[([^\]]+)\]", line)
+                if header:
+                    section = header.group(1)
+                    continue
+                match = re.match(r"^\s*ParallelDownloads\s*=\s*(\d+)", line)
+                if match and section == "options":
+                    return max(1, int(match.group(1)))
+    except OSError:
+        pass
+    return 1
+
+
+def sync_db_files(sync_dir: Path, repos: List[str] = None) -> List[Path]:
+    """List sync DB files ordered by repository priority"""
+    available = {p.stem: p for p in sorted(Path(sync_dir).glob("*.db"))}
+    if not repos:
+        return list(available.values())
+    ordered = [available[repo] for repo in repos if repo in available]
+    ordered += [path for name, path in available.items() if name not in repos]
+    return ordered
+
+
+def compute_updates(
+    local: Dict[str, Dict], sync_dbs: List[Dict[str, Dict]]
+) -> List[Dict]:
+    """Compare installed packages against sync DBs in priority order"""
+    updates = []
+    for name, installed in sorted(local.items()):
+        for packages in sync_dbs:
+            candidate = packages.get(name)
+            if candidate is None:
+                continue
+            # The first repository providing the package wins, as in pacman
+            if vercmp(candidate["version"], installed["version"]) > 0:
+                updates.append(
+                    {
+                        "name": name,
+                        "old_version": installed["version"],
+                        "new_version": candidate["version"],
+                        "repo": candidate["repo"],
+                        "download_size": candidate["csize"],
+                        "installed_size_delta": candidate["isize"] - installed["isize"],
+                    }
+                )
+            break
+    return updates
+
+
+def foreign_packages(local: Dict[str, Dict], sync_dbs: List[Dict[str, Dict]]) -> Dict[str, str]:
+    """Return installed packages found in no sync DB (AUR or local builds)"""
+    return {
+        name: record["version"]
+        for name, record in local.items()
+        if not any(name in packages for packages in sync_dbs)
+    }
+
+
+def format_update_line(update: Dict) -> str:
+    """Render an update in checkupdates' 'name old -> new' format"""
+    return f"{update['name']} {update['old_version']} -> {update['new_version']}"
+
+
+def resolve_sync_dir(private_db: Path = None) -> Path:
+    """Prefer the private (checkupdates) sync DBs and fall back to the system ones"""
+    private_sync = Path(private_db or default_private_db_path()) / "sync"
+    if any(private_sync.glob("*.db")):
+        return private_sync
+    return PACMAN_DB_PATH / "sync"
+
+
+def find_repo_updates(
+    private_db: Path = None,
+    local_db: Path = PACMAN_DB_PATH / "local",
+    pacman_conf: Path = PACMAN_CONF,
+) -> List[Dict]:
+    """Compute pending repo upgrades from local data only"""
+    sync_dir = resolve_sync_dir(private_db)
+    repos = configured_repos(pacman_conf)
+    sync_dbs = [read_sync_db(path) for path in sync_db_files(sync_dir, repos)]
+    return compute_updates(read_local_db(local_db), sync_dbs)
+
+
+def sync_databases(private_db: Path = None, timeout: float = 120, pacman_conf: Path = None) -> bool:
+    """Refresh the private sync DBs the way checkupdates does, without touching the system DBs"""
+    db_path = Path(private_db or default_private_db_path())
+    try:
+        db_path.mkdir(parents=True, exist_ok=True)
+        local_link = db_path / "local"
+        if not local_link.is_symlink() and not local_link.exists():
+            local_link.symlink_to(PACMAN_DB_PATH / "local")
+    except OSError as e:
+        print(f"Error preparing private database {db_path}: {e}", file=sys.stderr)
+        return False
+
+    cmd = ["fakeroot", "--", "pacman", "-Sy", "--dbpath", str(db_path), "--logfile", "/dev/null"]
+    if pacman_conf:
+        # An alternative pacman.conf can point at a local file:// mirror
+        cmd += ["--config", str(pacman_conf)]
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except (subprocess.TimeoutExpired, subprocess.SubprocessError, FileNotFoundError) as e:
+        print(f"Error syncing package databases: {e}", file=sys.stderr)
+        return False
+    if result.returncode != 0:
+        print(f"Error syncing package databases: {result.stderr.strip()}", file=sys.stderr)
+        return False
+    return True
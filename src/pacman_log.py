@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Incremental pacman.log reader for the Waybar updates module
+Resumes from a saved inode and byte offset, so each read only parses the
+transactions logged since the last one
+"""
+
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from pacman_watch import PACMAN_LOG
+from update_cache import atomic_write
+
+STATE_FILE = "pacman_log_state.json"
+
+READ_BUFFER = 1 << 16
+
+# [2026-10-16T09:12:44+0200] [ALPM] upgraded linux (6.11.1.arch1-1 -> 6.11.2.arch1-1)
+LOG_LINE = re.compile(
+    r"^\[(?P<time>[^\]]+)\] \[ALPM\] "
+    r"(?P<action>installed|upgraded|downgraded|reinstalled|removed) "
+    r"(?P<name>\S+) \((?P<versions>[^)]*)\)"
+)
+
+TRANSACTION_LINE = re.compile(
+    r"^\[(?P<time>[^\]]+)\] \[ALPM\] transaction (?P<status>started|completed|interrupted|failed)"
+)
+
+# [2026-10-16T09:12:40+0200] [PACMAN] Running 'pacman -Syu'
+COMMAND_LINE = re.compile(r"^\[(?P<time>[^\]]+)\] \[PACMAN\] Running '(?P<command>.*)'$")
+
+# Current pacman first, then the format used before pacman 5.2
+TIME_FORMATS = ("%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%d %H:%M")
+
+
+def parse_log_time(value: str) -> Optional[float]:
+    """Epoch seconds of a pacman.log timestamp"""
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_log_line(line: str) -> Optional[Dict]:
+    """Package action of an ALPM log line, or None for anything else"""
+    match = LOG_LINE.match(line)
+    if not match:
+        return None
+    timestamp = parse_log_time(match.group("time"))
+    if timestamp is None:
+        return None
+    old_version, _, new_version = match.group("versions").partition(" -> ")
+    action = match.group("action")
+    if action in ("installed", "reinstalled"):
+        old_version, new_version = "", old_version
+    elif action == "removed":
+        new_version = ""
+    return {
+        "time": timestamp,
+        "action": action,
+        "name": match.group("name"),
+        "old_version": old_version,
+        "new_version": new_version,
+    }
+
+
+class PacmanLogReader:
+    """Reads package actions appended to pacman.log since a checkpoint"""
+
+    def __init__(self, log_file: Path = PACMAN_LOG):
+        self.log_file = Path(log_file)
+        # Where the last read stopped; saved by the caller once the events are stored
+        self.checkpoint: Dict = {}
+        # Just past the line most recently yielded by _lines
+        self.position: Dict = {}
+
+    def _rotated_file(self, inode: int) -> Optional[Path]:
+        """The file logrotate moved the checkpointed log to, if it still exists"""
+        for name in (f"{self.log_file.name}.1", f"{self.log_file.name}-1"):
+            path = self.log_file.with_name(name)
+            try:
+                if path.stat().st_ino == inode:
+                    return path
+            except OSError:
+                continue
+        return None
+
+    def _read(self, path: Path, offset: int) -> Iterator[str]:
+        """ALPM and command lines among the complete lines after offset"""
+        with open(path, "rb", buffering=READ_BUFFER) as f:
+            self.position = {"inode": os.fstat(f.fileno()).st_ino, "offset": offset}
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # pacman is still writing this line; it is read next time
+                    break
+                self.position = {"inode": self.position["inode"], "offset": self.position["offset"] + len(raw)}
+                # Hooks and scriptlet output make up most of the log; skip it before decoding
+                if b"] [ALPM] " in raw or b"] [PACMAN] Running " in raw:
+                    yield raw.decode("utf-8", "replace").rstrip("\n")
+
+    def _lines(self, checkpoint: Dict) -> Iterator[str]:
+        """Lines logged after the checkpoint, following log rotation and truncation"""
+        self.position = dict(checkpoint)
+        try:
+            stat = self.log_file.stat()
+        except OSError:
+            return
+        inode, offset = checkpoint.get("inode"), checkpoint.get("offset", 0)
+        if inode is not None and inode != stat.st_ino:
+            rotated = self._rotated_file(inode)
+            if rotated:
+                yield from self._read(rotated, offset)
+            offset = 0
+        elif offset > stat.st_size:
+            # Truncated in place
+            offset = 0
+        yield from self._read(self.log_file, offset)
+
+    def end_checkpoint(self) -> Dict:
+        """Checkpoint at the current end of the log, for a reader that does not need the past"""
+        try:
+            stat = self.log_file.stat()
+        except OSError:
+            return {}
+        return {"inode": stat.st_ino, "offset": stat.st_size}
+
+    def read(self, checkpoint: Optional[Dict] = None) -> Iterator[Dict]:
+        """Stream the actions logged after the checkpoint"""
+        for line in self._lines(checkpoint or {}):
+            event = parse_log_line(line)
+            if event:
+                yield event
+        self.checkpoint = dict(self.position)
+
+    def transactions(self, checkpoint: Optional[Dict] = None) -> Iterator[Dict]:
+        """Stream the transactions finished after the checkpoint with their actions"""
+        # The checkpoint stops before a transaction that is still running, and before
+        # the command that started it, so a later read returns it whole once pacman
+        # has logged its end
+        self.checkpoint = dict(checkpoint or {})
+        command = ""
+        current = None
+        for line in self._lines(self.checkpoint):
+            running = COMMAND_LINE.match(line)
+            marker = TRANSACTION_LINE.match(line)
+            if running:
+                command = running.group("command")
+            elif marker and marker.group("status") == "started":
+                if current is not None:
+                    # A crashed pacman never logged the end of its transaction
+                    yield dict(current, status="interrupted")
+                current = {"started": parse_log_time(marker.group("time")), "command": command, "actions": []}
+            elif marker and current is not None:
+                yield dict(current, status=marker.group("status"), finished=parse_log_time(marker.group("time")))
+                current = None
+                command = ""
+            elif current is not None:
+                event = parse_log_line(line)
+                if event:
+                    current["actions"].append(event)
+            if current is None and not command:
+                self.checkpoint = dict(self.position)
+        if current is None and not command:
+            self.checkpoint = dict(self.position)
+
+
+class TransactionLog:
+    """Pacman transactions finished since the last read, with the checkpoint kept in the cache dir"""
+
+    def __init__(self, state_dir: Path, log_file: Path = PACMAN_LOG):
+        self.state_file = Path(state_dir) / STATE_FILE
+        self.reader = PacmanLogReader(log_file)
+
+    def load(self) -> Dict:
+        """Saved checkpoint"""
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+            if isinstance(state, dict):
+                return state
+        except (OSError, json.JSONDecodeError):
+            pass
+        return {}
+
+    def save(self, state: Dict):
+        """Write the checkpoint atomically; concurrent readers at worst apply a transaction twice"""
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(self.state_file, json.dumps(state))
+        except OSError as e:
+            print(f"Warning: Could not save pacman.log checkpoint: {e}", file=sys.stderr)
+
+    def advance(self):
+        """Move the checkpoint past every finished transaction, e.g. once a check has seen them"""
+        state = self.load()
+        for _ in self.reader.transactions(state or self.reader.end_checkpoint()):
+            pass
+        if self.reader.checkpoint != state:
+            self.save(self.reader.checkpoint)
+
+    def applied(self) -> Optional[Dict[str, Dict]]:
+        """Last action per package from transactions finished since the checkpoint, None if unknown"""
+        # The first read only sets the checkpoint at the end of the log; with
+        # nothing logged since, the caller cannot tell what changed either
+        state = self.load()
+        if not state.get("inode"):
+            self.save(self.reader.end_checkpoint())
+            return None
+        applied = {}
+        for transaction in self.reader.transactions(state):
+            for action in transaction["actions"]:
+                applied[action["name"]] = action
+        if self.reader.checkpoint != state:
+            self.save(self.reader.checkpoint)
+        return applied or None
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Pacman database and log watcher for the Waybar updates module
+Uses inotify through libc when available and falls back to polling stat
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from pacman_db import PACMAN_DB_PATH, vercmp
+
+PACMAN_LOG = Path("/var/log/pacman.log")
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Longest time to wait for a running transaction to release db.lck
+MAX_TRANSACTION_WAIT = 600
+
+
+def installed_versions(local_db: Path = PACMAN_DB_PATH / "local") -> Dict[str, str]:
+    """Map installed package names to versions from the local DB directory names"""
+    versions = {}
+    try:
+        for entry in os.scandir(local_db):
+            parts = entry.name.rsplit("-", 2)
+            if entry.is_dir() and len(parts) == 3:
+                versions[parts[0]] = f"{parts[1]}-{parts[2]}"
+    except OSError:
+        pass
+    return versions
+
+
+def pending_updates(lines: List[str], installed: Dict[str, str]) -> List[str]:
+    """Keep only 'name old -> new' lines whose new version is newer than the installed one"""
+    pending = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+        name, new_version = fields[0], fields[3]
+        current = installed.get(name)
+        if current is not None and vercmp(new_version, current) > 0:
+            pending.append(line)
+    return pending
+
+
+def signal_waybar(signal_number: int = 8):
+    """Ask Waybar to re-run the module by sending SIGRTMIN+N"""
+    try:
+        subprocess.run(
+            ["pkill", f"-RTMIN+{signal_number}", "waybar"],
+            capture_output=True,
+            timeout=5,
+        )
+    except (subprocess.SubprocessError, FileNotFoundError):
+        pass
+
+
+class PacmanWatcher:
+    def __init__(
+        self,
+        db_path: Path = PACMAN_DB_PATH,
+        log_file: Path = PACMAN_LOG,
+        settle: float = 2.0,
+        poll_interval: float = 5.0,
+    ):
+        self.db_path = Path(db_path)
+        self.log_file = Path(log_file)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.lock_file = self.db_path / "db.lck"
+        self.fd = None
+        self.watches = {}
+        self._libc = None
+        self._snapshot = self._stat_snapshot()
+        self._init_inotify()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self.fd is not None
+
+    def _init_inotify(self):
+        """Set up inotify watches, leaving fd as None to select the stat fallback"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        self._libc = libc
+        self.fd = fd
+        targets = [
+            # db.lck disappears when a transaction completes
+            (self.db_path, "transaction", IN_DELETE),
+            (self.db_path / "local", "local", IN_CREATE | IN_DELETE | IN_MOVED_TO),
+            (self.db_path / "sync", "sync", IN_CLOSE_WRITE | IN_MOVED_TO),
+            (self.log_file, "log", IN_MODIFY),
+            # Catches the new pacman.log after rotation, however long it takes to appear
+            (self.log_file.parent, "log_dir", IN_CREATE | IN_MOVED_TO),
+        ]
+        for path, kind, mask in targets:
+            self._add_watch(path, kind, mask)
+        if not self.watches:
+            self.close()
+
+    def _add_watch(self, path: Path, kind: str, mask: int) -> bool:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+        if wd < 0:
+            return False
+        self.watches[wd] = kind
+        return True
+
+    def _rewatch_log(self):
+        """Move the log watch from the rotated file to the new pacman.log"""
+        for wd, kind in list(self.watches.items()):
+            if kind == "log":
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+        self._add_watch(self.log_file, "log", IN_MODIFY)
+
+    def close(self):
+        """Release the inotify file descriptor"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.watches = {}
+
+    def _read_events(self, timeout: float) -> Set[str]:
+        """Read one batch of inotify events and translate them into change kinds"""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return set()
+
+        kinds = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            start = offset + _EVENT_HEADER.size
+            name = data[start:start + length].rstrip(b"\0").decode(errors="replace")
+            offset = start + length
+
+            kind = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                # The log was rotated away; re-attach now if the new file exists,
+                # otherwise the log_dir watch does once it is created
+                self.watches.pop(wd, None)
+                if kind == "log":
+                    self._add_watch(self.log_file, "log", IN_MODIFY)
+                continue
+            if kind == "log_dir":
+                if name != self.log_file.name:
+                    continue
+                self._rewatch_log()
+                kind = "log"
+            if kind == "transaction" and name != "db.lck":
+                continue
+            if kind == "sync" and not name.endswith(".db"):
+                continue
+            if kind:
+                kinds.add(kind)
+        return kinds
+
+    def _stat_snapshot(self) -> Dict[str, object]:
+        """Collect the stat data compared by the polling fallback"""
+        snapshot = {}
+        try:
+            snapshot["local"] = (self.db_path / "local").stat().st_mtime
+        except OSError:
+            snapshot["local"] = None
+        try:
+            snapshot["sync"] = tuple(
+                (p.name, p.stat().st_mtime, p.stat().st_size)
+                for p in sorted((self.db_path / "sync").glob("*.db"))
+            )
+        except OSError:
+            snapshot["sync"] = None
+        try:
+            log_stat = self.log_file.stat()
+            snapshot["log"] = (log_stat.st_ino, log_stat.st_size)
+        except OSError:
+            snapshot["log"] = None
+        return snapshot
+
+    def _poll(self, timeout: float) -> Set[str]:
+        """Compare stat snapshots every poll_interval until something changes"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if not self.lock_file.exists():
+                snapshot = self._stat_snapshot()
+                changed = {k for k, v in snapshot.items() if self._snapshot.get(k) != v}
+                if changed:
+                    self._snapshot = snapshot
+                    return changed
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            time.sleep(min(self.poll_interval, remaining))
+
+    def wait(self, timeout: float) -> Set[str]:
+        """Block until pacman state changes and settles; return kinds: local, sync, log, transaction"""
+        if self.fd is None:
+            return self._poll(timeout)
+
+        changes = self._read_events(timeout)
+        if not changes:
+            return changes
+
+        # Coalesce the burst of events from one transaction and wait for db.lck to go away
+        settle_deadline = time.monotonic() + MAX_TRANSACTION_WAIT
+        while time.monotonic() < settle_deadline:
+            more = self._read_events(self.settle)
+            if more:
+                changes |= more
+            elif not self.lock_file.exists():
+                break
+        self._snapshot = self._stat_snapshot()
+        return changes
+
+    def start(
+        self, callback: Callable[[Set[str]], None], stop: Optional[threading.Event] = None
+    ) -> threading.Thread:
+        """Run callback with the change kinds on a background thread"""
+        stop = stop or threading.Event()
+
+        def _loop():
+            while not stop.is_set():
+                changes = self.wait(60)
+                if changes and not stop.is_set():
+                    callback(changes)
+            self.close()
+
+        thread = threading.Thread(target=_loop, name="pacman-watch", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Lean Waybar poll path for the updates module
+Plain --check polls are answered from a marshal snapshot of the last rendered
+output, keyed by the config file, the state files it was rendered from and
+the pacman DB state.
+Only modules the interpreter has already loaded are imported here, so a warm
+poll costs little more than interpreter start-up
+"""
+
+# typing is left out on purpose: importing it costs more than the whole poll
+from __future__ import annotations
+
+import marshal
+import os
+import time
+
+SNAPSHOT_VERSION = 2
+
+# Overridable so benchmarks can run against fixture databases
+PACMAN_DB_DIR = os.getenv("WAYBAR_UPDATES_DBPATH") or "/var/lib/pacman"
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# Arguments a plain Waybar poll may carry; anything else needs the full entry point
+POLL_FLAGS = ("--check", "--no-daemon")
+
+
+def cache_base_dir() -> str:
+    """Per-user cache directory, following the XDG base directory spec"""
+    xdg_cache = os.getenv("XDG_CACHE_HOME")
+    base = xdg_cache if xdg_cache else os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "waybar-updates")
+
+
+def resolve_config_path(config_path: str = None, script_dir: str = SCRIPT_DIR) -> str:
+    """Determine config file path: explicit path, then $WAYBAR_UPDATE_CONFIG, then the script dir"""
+    if config_path:
+        return os.path.realpath(config_path)
+    env_config = os.getenv("WAYBAR_UPDATE_CONFIG")
+    if env_config:
+        env_path = os.path.realpath(env_config)
+        if os.path.exists(env_path):
+            return env_path
+    return os.path.join(script_dir, "update_config.json")
+
+
+def pacman_db_fingerprint(
+    local_db=os.path.join(PACMAN_DB_DIR, "local"), sync_dir=os.path.join(PACMAN_DB_DIR, "sync")
+) -> dict:
+    """Collect mtimes that change when packages are installed or repos are synced"""
+    fingerprint = {}
+    try:
+        fingerprint["local"] = os.stat(local_db).st_mtime
+    except OSError:
+        pass
+    try:
+        names = sorted(name for name in os.listdir(sync_dir) if name.endswith(".db"))
+        for name in names:
+            fingerprint[f"sync/{name}"] = os.stat(os.path.join(sync_dir, name)).st_mtime
+    except OSError:
+        pass
+    return fingerprint
+
+
+def file_key(path) -> list | None:
+    """mtime and size of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def snapshot_path(config_path: str) -> str:
+    """One snapshot per config file, so bars with different configs do not collide"""
+    name = config_path.replace("%", "%25").replace("/", "%2F")
+    return os.path.join(cache_base_dir(), "poll", f"{name}.marshal")
+
+
+def write_snapshot(config_path: str, files: dict, entry: dict, fresh_until: float, output: str):
+    """Store rendered output together with everything that decides whether it is still valid"""
+    # files maps each state file the output was rendered from to its file_key, taken
+    # before the file was read, so a file rewritten in between invalidates the snapshot
+    # instead of pairing new data with old output
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "config": file_key(config_path),
+        "files": {str(path): key for path, key in files.items()},
+        "timestamp": entry.get("timestamp", 0),
+        "fresh_until": fresh_until,
+        "fingerprint": entry.get("fingerprint"),
+        "output": output,
+    }
+    path = snapshot_path(config_path)
+    data = marshal.dumps(snapshot)
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    except OSError:
+        pass
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        # The snapshot is only an accelerator; the full path keeps working without it
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def remove_snapshot(config_path: str):
+    """Drop the snapshot so the next poll takes the full path"""
+    try:
+        os.unlink(snapshot_path(config_path))
+    except OSError:
+        pass
+
+
+def read_snapshot(config_path: str) -> str | None:
+    """Return the stored output if config, state files and pacman DBs are unchanged and it is still fresh"""
+    try:
+        with open(snapshot_path(config_path), "rb") as f:
+            snapshot = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    now = time.time()
+    if not snapshot["timestamp"] <= now < snapshot["fresh_until"]:
+        return None
+    if snapshot["config"] != file_key(config_path):
+        return None
+    for path, key in snapshot["files"].items():
+        if file_key(path) != key:
+            return None
+    if snapshot["fingerprint"] != pacman_db_fingerprint():
+        return None
+    return snapshot["output"]
+
+
+def _poll_config(argv: list) -> str | None:
+    """Config path argument of a plain Waybar poll ('' for the default); None for anything else"""
+    config = ""
+    args = iter(argv)
+    for arg in args:
+        if arg in POLL_FLAGS:
+            continue
+        if arg == "--config":
+            config = next(args, None)
+            if not config:
+                return None
+        elif arg.startswith("--config="):
+            config = arg[len("--config="):]
+        else:
+            return None
+    return config
+
+
+def cached_waybar_output(argv: list) -> str | None:
+    """Answer a plain Waybar poll from the snapshot, or None to fall through to the full path"""
+    config = _poll_config(argv)
+    if config is None:
+        return None
+    return read_snapshot(resolve_config_path(config or None))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Background prefetch for the Waybar updates module
+Syncs the private sync DBs and downloads pending packages into a separate cache
+dir while the machine is idle or on an unmetered connection, so the actual
+upgrade mostly installs from local files
+"""
+
+import json
+import os
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+from pacman_db import default_private_db_path, sync_databases
+from update_cache import atomic_write
+
+PREFETCH_INTERVAL = 3600
+SYSTEM_PACKAGE_CACHE = Path("/var/cache/pacman/pkg")
+# Files this module downloaded; pruning never touches anything else in package_cache
+MANIFEST_FILE = ".prefetched.json"
+
+# NetworkManager's NMMetered values
+NM_METERED_YES = (1, 3)
+NM_METERED_NO = (2, 4)
+
+
+def default_package_cache(cache_dir: Path) -> Path:
+    """Directory holding prefetched packages, next to the update cache"""
+    return Path(cache_dir) / "pkg"
+
+
+def is_system_cache(package_cache: Path) -> bool:
+    """True if package_cache is pacman's own cache, which prefetch must never manage"""
+    try:
+        return Path(package_cache).resolve() == SYSTEM_PACKAGE_CACHE.resolve()
+    except (OSError, RuntimeError):
+        return True
+
+
+def is_package_file(name: str) -> bool:
+    """Match package archives and their detached signatures"""
+    return ".pkg.tar" in name and not name.startswith(".")
+
+
+def package_files(package_cache: Path) -> Set[str]:
+    """Names of the package archives and signatures currently in package_cache"""
+    try:
+        return {entry.name for entry in package_cache.iterdir() if is_package_file(entry.name) and entry.is_file()}
+    except OSError:
+        return set()
+
+
+def load_manifest(package_cache: Path) -> Set[str]:
+    """File names recorded as downloaded by prefetch"""
+    try:
+        with open(package_cache / MANIFEST_FILE, "r") as f:
+            names = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return set()
+    if not isinstance(names, list):
+        return set()
+    return {name for name in names if isinstance(name, str) and is_package_file(name) and "/" not in name}
+
+
+def save_manifest(package_cache: Path, names: Set[str]):
+    try:
+        atomic_write(package_cache / MANIFEST_FILE, json.dumps(sorted(names)))
+    except OSError as e:
+        print(f"Warning: Could not record prefetched packages: {e}", file=sys.stderr)
+
+
+def connection_metered(timeout: float = 5) -> Optional[bool]:
+    """Ask NetworkManager whether the primary connection is metered; None if unknown"""
+    try:
+        result = subprocess.run(
+            [
+                "busctl",
+                "get-property",
+                "org.freedesktop.NetworkManager",
+                "/org/freedesktop/NetworkManager",
+                "org.freedesktop.NetworkManager",
+                "Metered",
+            ],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except (subprocess.TimeoutExpired, subprocess.SubprocessError, FileNotFoundError):
+        return None
+    # Output looks like "u 2"
+    fields = result.stdout.split()
+    if result.returncode != 0 or len(fields) != 2 or not fields[1].isdigit():
+        return None
+    value = int(fields[1])
+    if value in NM_METERED_YES:
+        return True
+    if value in NM_METERED_NO:
+        return False
+    return None
+
+
+def system_idle(max_load: float = 1.0) -> bool:
+    """Treat the machine as idle while the one-minute load average stays low"""
+    try:
+        return os.getloadavg()[0] <= max_load
+    except OSError:
+        return False
+
+
+def prefetch_allowed(policy: str = "idle_or_unmetered", max_load: float = 1.0) -> Tuple[bool, str]:
+    """Decide whether package downloads may run now, with a reason for the log"""
+    if policy == "always":
+        return True, "policy is always"
+    metered = connection_metered()
+    if metered:
+        return False, "connection is metered"
+    if metered is False:
+        return True, "connection is unmetered"
+    if policy == "unmetered":
+        return False, "connection metering is unknown"
+    if system_idle(max_load):
+        return True, "system is idle"
+    return False, "system is busy"
+
+
+def pacman_args(private_db: Path, pacman_conf: Path = None) -> List[str]:
+    """Common pacman options for working on the private DB without touching the system"""
+    args = ["--dbpath", str(private_db), "--logfile", "/dev/null"]
+    if pacman_conf:
+        args += ["--config", str(pacman_conf)]
+    return args
+
+
+def pending_package_files(
+    private_db: Path, pacman_conf: Path = None, timeout: float = 60
+) -> Optional[Set[str]]:
+    """File names of the packages an upgrade against the private DB would download"""
+    try:
+        result = subprocess.run(
+            ["pacman", "-Sup", "--print-format", "%f"] + pacman_args(private_db, pacman_conf),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except (subprocess.TimeoutExpired, subprocess.SubprocessError, FileNotFoundError) as e:
+        print(f"Error listing pending packages: {e}", file=sys.stderr)
+        return None
+    if result.returncode != 0:
+        print(f"Error listing pending packages: {result.stderr.strip()}", file=sys.stderr)
+        return None
+    return {line.strip() for line in result.stdout.splitlines() if line.strip()}
+
+
+def download_packages(
+    private_db: Path, package_cache: Path, pacman_conf: Path = None, timeout: float = 1800
+) -> bool:
+    """Download pending upgrades into package_cache, like checkupdates -d but off the system cache"""
+    if is_system_cache(package_cache):
+        print(f"Error: Refusing to prefetch into the system package cache {package_cache}", file=sys.stderr)
+        return False
+    try:
+        package_cache.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        print(f"Error preparing package cache {package_cache}: {e}", file=sys.stderr)
+        return False
+    before = package_files(package_cache)
+    try:
+        result = subprocess.run(
+            ["fakeroot", "--", "pacman", "-Swu", "--noconfirm", "--noprogressbar"]
+            + ["--cachedir", str(package_cache)]
+            + pacman_args(private_db, pacman_conf),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError) as e:
+        print(f"Error downloading packages: {e}", file=sys.stderr)
+        return False
+    finally:
+        # Record whatever arrived, even from a failed run, so the prune can reclaim it later
+        downloaded = package_files(package_cache) - before
+        if downloaded:
+            save_manifest(package_cache, load_manifest(package_cache) | downloaded)
+    if result.returncode != 0:
+        print(f"Error downloading packages: {result.stderr.strip()}", file=sys.stderr)
+        return False
+    return True
+
+
+def prune_package_cache(package_cache: Path, keep: Set[str]) -> int:
+    """Delete prefetched packages (and signatures) that are no longer pending"""
+    if is_system_cache(package_cache):
+        return 0
+    removed = 0
+    owned = load_manifest(package_cache)
+    remaining = set()
+    for name in owned:
+        if (name[:-4] if name.endswith(".sig") else name) in keep:
+            remaining.add(name)
+            continue
+        try:
+            (package_cache / name).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            remaining.add(name)
+            print(f"Warning: Could not remove {package_cache / name}: {e}", file=sys.stderr)
+    if remaining != owned:
+        save_manifest(package_cache, remaining)
+    return removed
+
+
+def run_prefetch(
+    package_cache: Path,
+    private_db: Path = None,
+    pacman_conf: Path = None,
+    download: bool = True,
+    timeout: float = 1800,
+) -> bool:
+    """Sync the private DBs, then download pending packages and drop stale ones"""
+    if download and is_system_cache(package_cache):
+        print(
+            f"Error: prefetch.package_cache must not be the system package cache {SYSTEM_PACKAGE_CACHE}",
+            file=sys.stderr,
+        )
+        return False
+    private_db = Path(private_db or default_private_db_path())
+    if not sync_databases(private_db, pacman_conf=pacman_conf):
+        return False
+    if not download:
+        return True
+    pending = pending_package_files(private_db, pacman_conf)
+    if pending is None:
+        return False
+    if pending and not download_packages(private_db, package_cache, pacman_conf, timeout):
+        return False
+    prune_package_cache(package_cache, pending)
+    return True
+
+
+def cache_dir_args(package_cache: Path) -> str:
+    """pacman --cachedir options that let an upgrade pick up prefetched packages"""
+    if is_system_cache(package_cache):
+        return ""
+    try:
+        if not any(package_cache.glob("*.pkg.tar*")):
+            return ""
+    except OSError:
+        return ""
+    # pacman downloads into the first writable cache dir, so keep the system one first
+    return f"--cachedir {SYSTEM_PACKAGE_CACHE} --cachedir {shlex.quote(str(package_cache))}"
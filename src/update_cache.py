@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Persistent update cache for the Waybar updates module
+Freshness is decided from the on-disk timestamp and the pacman database state,
+so a freshly spawned process can serve cached counts without running any check
+"""
+
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+from check_engine import AUR_SOURCES
+from check_schedule import next_check
+from metrics import METRICS
+from poll_snapshot import cache_base_dir, pacman_db_fingerprint
+
+
+def atomic_write(
+    path: Path, data: Union[str, bytes], mode: Optional[int] = None,
+    mtime: Optional[float] = None, fsync: bool = False,
+):
+    """Write a sibling temp file and rename it over path so readers never see a partial file"""
+    path = Path(path)
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            "wb" if isinstance(data, bytes) else "w",
+            dir=path.parent,
+            prefix=f".{path.name}.",
+            suffix=".tmp",
+            delete=False,
+        ) as f:
+            temp_path = f.name
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(temp_path, mode)
+        if mtime is not None:
+            os.utime(temp_path, (mtime, mtime))
+        os.replace(temp_path, path)
+        temp_path = None
+    finally:
+        if temp_path:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+
+def default_cache_dir() -> Path:
+    """Return the per-user cache directory, following the XDG base directory spec"""
+    return Path(cache_base_dir())
+
+
+def parse_update_line(line: str, source: str) -> Optional[Dict]:
+    """Turn a 'name old -> new' line from any backend into a structured record"""
+    fields = line.split()
+    if len(fields) < 4 or fields[2] != "->":
+        return None
+    return {
+        "name": fields[0],
+        "old_version": fields[1],
+        "new_version": fields[3],
+        "source": source,
+        "repo": "aur" if source in AUR_SOURCES else None if source == "pacman" else source,
+        "download_size": None,
+        "installed_size_delta": None,
+    }
+
+
+def lists_from_records(records: List[Dict]) -> Dict[str, List[str]]:
+    """Rebuild per-source 'name old -> new' lines from cached records"""
+    lists = {}
+    for record in records:
+        lists.setdefault(record["source"], []).append(
+            f"{record['name']} {record['old_version']} -> {record['new_version']}"
+        )
+    return lists
+
+
+def unique_updates(records: List[Dict]) -> List[Dict]:
+    """Drop duplicate packages reported by several AUR sources, keeping the first"""
+    seen = set()
+    unique = []
+    for record in records:
+        if record["name"] not in seen:
+            seen.add(record["name"])
+            unique.append(record)
+    return unique
+
+
+def diff_updates(previous: List[Dict], current: List[Dict]) -> Dict[str, List[str]]:
+    """Report updates that appeared or were applied since the previous check"""
+    previous_keys = {(r["name"], r["new_version"]) for r in previous}
+    current_names = {r["name"] for r in current}
+    return {
+        "new": sorted({r["name"] for r in current if (r["name"], r["new_version"]) not in previous_keys}),
+        "applied": sorted({r["name"] for r in previous if r["name"] not in current_names}),
+    }
+
+
+class UpdateCache:
+    def __init__(self, cache_file: Path, ttl: int):
+        self.cache_file = Path(cache_file)
+        self.lock_file = self.cache_file.with_name(self.cache_file.name + ".lock")
+        self.ttl = ttl
+
+    def load(self) -> Optional[Dict]:
+        """Read the raw cache entry from disk"""
+        try:
+            with METRICS.span("cache_read"), open(self.cache_file, "r") as f:
+                cached = json.load(f)
+            if isinstance(cached, dict):
+                return cached
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError, IOError) as e:
+            print(f"Warning: Could not load cache file {self.cache_file}: {e}", file=sys.stderr)
+        return None
+
+    def is_fresh(self, cached: Dict, sources: List[str] = None) -> bool:
+        """Check that no backend is due and the pacman databases did not change"""
+        now = time.time()
+        scheduled = cached.get("sources")
+        # Every enabled backend needs a schedule; a newly enabled one is due at once
+        if scheduled and any(source not in scheduled for source in sources or []):
+            return False
+        if now < cached.get("timestamp", 0) or now >= self.fresh_until(cached):
+            return False
+        return cached.get("fingerprint") == pacman_db_fingerprint()
+
+    def fresh_until(self, cached: Dict) -> float:
+        """Time a cache entry goes stale, leaving pacman DB changes aside"""
+        scheduled = cached.get("sources")
+        if scheduled:
+            return next_check(scheduled)
+        # Caches written before per-backend scheduling only have one timestamp
+        return cached.get("timestamp", 0) + self.ttl
+
+    def load_fresh(self, sources: List[str] = None) -> Optional[Dict]:
+        """Return the cache entry only if it can be served without rechecking"""
+        cached = self.load()
+        if cached is not None and "counts" in cached and self.is_fresh(cached, sources):
+            METRICS.count("cache_hits")
+            return cached
+        METRICS.count("cache_misses")
+        return None
+
+    def save(
+        self,
+        counts: Dict[str, int],
+        packages: List[Dict] = None,
+        sources: Dict[str, Dict] = None,
+    ) -> Dict:
+        """Store update counts, package records and per-backend schedules with the DB fingerprint"""
+        packages = packages or []
+        previous = self.load() or {}
+        cache_data = {
+            "counts": counts,
+            "timestamp": time.time(),
+            "fingerprint": pacman_db_fingerprint(),
+            "packages": packages,
+            "sources": sources or {},
+            "changes": diff_updates(previous.get("packages", []), packages),
+        }
+        try:
+            # Ensure parent directory exists
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with METRICS.span("cache_write"):
+                atomic_write(self.cache_file, json.dumps(cache_data), fsync=True)
+        except (OSError, IOError) as e:
+            print(f"Warning: Could not write cache file {self.cache_file}: {e}", file=sys.stderr)
+        return cache_data
+
+    @contextmanager
+    def check_lock(self, timeout: float = 0) -> Iterator[bool]:
+        """Hold the exclusive check lock; yields False if another process kept it past timeout"""
+        try:
+            self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            print(f"Warning: Could not open lock file {self.lock_file}: {e}", file=sys.stderr)
+            yield True
+            return
+
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        acquired = False
+                        break
+                    time.sleep(0.1)
+            yield acquired
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
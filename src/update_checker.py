@@ -0,0 +1,1057 @@
+#!/usr/bin/env python3
+"""
+Simplified Arch Linux Update Checker for Waybar
+Core functionality without GUI dependencies
+"""
+
+import html
+import json
+import subprocess
+import sys
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import atexit
+from functools import cached_property, partial
+
+from backends import (
+    BACKENDS,
+    UpdateBackend,
+    create_backend,
+    create_backends,
+    is_pacman_managed,
+    source_label,
+)
+from check_engine import AUR_SOURCES, aur_count, build_counts, run_checks
+from check_schedule import (
+    is_due,
+    load_state,
+    record_failure,
+    record_success,
+    record_unavailable,
+    source_errors,
+)
+from metrics import METRICS, record_startup, report_metrics
+from pacman_db import resolve_sync_dir, sync_databases, vercmp
+from poll_snapshot import file_key, remove_snapshot, resolve_config_path, write_snapshot
+from update_cache import (
+    UpdateCache,
+    default_cache_dir,
+    lists_from_records,
+    pacman_db_fingerprint,
+    parse_update_line,
+    unique_updates,
+)
+
+# Feature modules (journal scan, pacman.log, prefetch, command progress, daemon,
+# watch mode, fleet, LAN cache, AUR builds, SQLite stores, upgrade plans) are
+# imported where they are used, so a call only loads what its mode needs
+
+# Flags that ask for something other than one Waybar poll; menu only exists in update_manager
+NON_POLL_ARGS = (
+    "menu",
+    "update",
+    "daemon",
+    "watch",
+    "sync_db",
+    "prefetch",
+    "list",
+    "revalidate",
+    "status",
+    "fleet",
+    "journal",
+    "plan",
+    "upgrade",
+    "build_aur",
+)
+
+
+class ArchUpdateChecker:
+    def __init__(self, config_path: str = None):
+        self.script_dir = Path(__file__).parent.resolve()
+        self.config_path = self._determine_config_path(config_path)
+        self.config = self.load_config()
+        self.cache_dir = Path(
+            self.config["update_settings"].get("cache_dir") or default_cache_dir()
+        ).expanduser()
+        self.cache_file = self.cache_dir / "update_cache.json"
+        self.index_file = self.cache_dir / "package_index.sqlite"
+        self.cache = UpdateCache(
+            self.cache_file, self.config["update_settings"]["check_interval"]
+        )
+        self.journal_error_count = 0
+        self.running = []
+        self.last_check = 0
+        self.update_count = build_counts({})
+        self.update_lists = {"pacman": [], "yay": [], "paru": [], "aur": []}
+        self.update_details = []
+        self.source_states = {}
+
+    @cached_property
+    def pacman_log(self):
+        from pacman_log import TransactionLog
+        from pacman_watch import PACMAN_LOG
+
+        return TransactionLog(self.cache_dir, Path(self.config["update_settings"].get("pacman_log") or PACMAN_LOG))
+
+    @cached_property
+    def journal(self):
+        from journal_scan import JournalScanner, journal_settings
+
+        return JournalScanner(self.cache_dir, journal_settings(self.config["update_settings"]))
+
+    @cached_property
+    def runs_dir(self) -> Path:
+        from update_executor import runs_dir
+
+        return runs_dir(self.cache_dir)
+
+    @cached_property
+    def package_cache(self) -> Path:
+        from prefetch import default_package_cache
+
+        return Path(
+            self.config["update_settings"].get("prefetch", {}).get("package_cache")
+            or default_package_cache(self.cache_dir)
+        ).expanduser()
+
+    @property
+    def history_file(self) -> Path:
+        from update_history import HISTORY_FILE
+
+        return self.cache_dir / HISTORY_FILE
+
+    def _determine_config_path(self, config_path: str = None) -> Path:
+        """Determine config file path with fallback options"""
+        return Path(resolve_config_path(config_path, str(self.script_dir)))
+
+    def load_config(self) -> Dict:
+        """Load configuration from JSON file with fallback to defaults"""
+        with METRICS.span("config_load"):
+            try:
+                if self.config_path.exists():
+                    with open(self.config_path, "r") as f:
+                        return json.load(f)
+                else:
+                    print(f"Config file not found at {self.config_path}, using defaults", file=sys.stderr)
+                    return self._get_default_config()
+            except json.JSONDecodeError as e:
+                print(f"Invalid JSON in config file {self.config_path}: {e}", file=sys.stderr)
+                print("Using default configuration", file=sys.stderr)
+                return self._get_default_config()
+            except (OSError, IOError) as e:
+                print(f"Error reading config file {self.config_path}: {e}", file=sys.stderr)
+                print("Using default configuration", file=sys.stderr)
+                return self._get_default_config()
+
+    def _get_default_config(self) -> Dict:
+        """Return default configuration"""
+        return {
+            "update_settings": {
+                "check_interval": 600,
+                "check_timeout": 30,
+                "package_managers": ["pacman", "yay", "paru"],
+                "icons": {
+                    "no_updates": "✅",
+                    "updates_available": "📦",
+                    "updating": "🔄",
+                    "error": "⚠️",
+                },
+                "colors": {
+                    "no_updates": "#588157",
+                    "updates_available": "#f9c74f",
+                    "updating": "#277da1",
+                    "error": "#e63946",
+                },
+            }
+        }
+
+    def backend(self, name: str) -> UpdateBackend:
+        """Instantiate a registered update backend with the current settings"""
+        return create_backend(name, self.config["update_settings"], self.cache_dir)
+
+    def enabled_sources(self) -> List[str]:
+        """Names of the configured backends that exist in the registry"""
+        managers = self.config["update_settings"].get("package_managers", ["pacman", "yay", "paru"])
+        return [name for name in managers if name in BACKENDS]
+
+    def check_pacman_updates(self, timeout: float = 30) -> Tuple[int, List[str]]:
+        """Check for pacman updates; raises BackendError if the check fails"""
+        return self.backend("pacman").check(timeout)
+
+    def check_native_pacman_updates(self) -> Tuple[int, List[str]]:
+        """Check for pacman updates by reading the local and sync databases directly"""
+        return self.backend("pacman").check_native()
+
+    def sync_package_databases(self) -> bool:
+        """Refresh the private sync databases used by the native pacman backend"""
+        return sync_databases(self.config["update_settings"].get("sync_db_path"))
+
+    def prefetch_packages(self) -> bool:
+        """Sync the private DBs and, when the connection policy allows, download pending packages"""
+        from prefetch import prefetch_allowed, run_prefetch
+
+        settings = self.config["update_settings"]
+        prefetch = settings.get("prefetch", {})
+        download = prefetch.get("download", True)
+        if download:
+            allowed, reason = prefetch_allowed(
+                prefetch.get("policy", "idle_or_unmetered"), prefetch.get("max_load", 1.0)
+            )
+            if not allowed:
+                print(f"Skipping package downloads: {reason}", file=sys.stderr)
+                download = False
+        return run_prefetch(
+            self.package_cache,
+            settings.get("sync_db_path"),
+            prefetch.get("pacman_conf"),
+            download=download,
+        )
+
+    def command_environment(self) -> Dict[str, str]:
+        """Environment for update commands, pointing pacman at prefetched packages"""
+        from prefetch import cache_dir_args
+
+        env = dict(os.environ)
+        env["WAYBAR_UPDATES_CACHEDIRS"] = cache_dir_args(self.package_cache)
+        return env
+
+    def check_aur_updates(
+        self, manager: str = "yay", timeout: float = 30
+    ) -> Tuple[int, List[str]]:
+        """Check for AUR updates using yay or paru"""
+        if manager not in ["yay", "paru"]:
+            return 0, []
+        return self.backend(manager).check(timeout)
+
+    def check_aur_rpc_updates(self, timeout: float = 30) -> Tuple[int, List[str]]:
+        """Check for AUR updates with the built-in RPC client instead of a helper"""
+        return self.backend("aur").check(timeout)
+
+    def check_all_updates(
+        self,
+        force: bool = False,
+        background: bool = False,
+        on_partial: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, int]:
+        """Check updates from all package managers
+
+        on_partial receives the counts published after the cheap backends, when expensive ones follow
+        """
+        # Serve the on-disk cache while no backend is due and the pacman DBs are unchanged
+        if not force:
+            cached = self.cache.load_fresh(self.enabled_sources())
+            if cached is None and self.recount_from_pacman_log() is not None:
+                # The upgrade that changed the local DB was applied from pacman.log
+                cached = self.cache.load_fresh(self.enabled_sources())
+            if cached is not None:
+                self._apply_cached(cached)
+                return self.update_count
+
+        # Stale-while-revalidate: answer from the stale cache and recheck in a detached process
+        stale = self.cache.load()
+        if background and not force and stale is not None and "counts" in stale:
+            self._apply_cached(stale)
+            self.start_background_refresh()
+            return self.update_count
+
+        # Only one process runs the real check; others serve the stale value or wait for it
+        timeout = self.config["update_settings"].get("check_timeout", 30)
+        wait = timeout if force or stale is None else 0
+        with self.cache.check_lock(wait) as acquired:
+            if not acquired:
+                # Never run a second check next to the one holding the lock; serve whatever
+                # it has written by now, or report the wait as a failed check
+                cached = self.cache.load() or stale
+                if cached is not None:
+                    self._apply_cached(cached)
+                else:
+                    self.source_states = {"check": {"error": f"another check is still running after {wait}s"}}
+                return self.update_count
+            if acquired and not force:
+                cached = self.cache.load_fresh(self.enabled_sources())
+                if cached is not None:
+                    self._apply_cached(cached)
+                    return self.update_count
+            deferred = self._run_all_checks(timeout, force, defer_expensive=background, on_partial=on_partial)
+        if deferred:
+            # Started once the lock is released, so the detached process can take it
+            self.start_background_refresh()
+        return self.update_count
+
+    def _run_all_checks(
+        self,
+        timeout: float,
+        force: bool = False,
+        defer_expensive: bool = False,
+        on_partial: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> List[str]:
+        """Run the enabled backends that are due and cache the merged results; return the deferred ones"""
+        current_time = time.time()
+        print("Checking for updates...", file=sys.stderr)
+
+        settings = self.config["update_settings"]
+        backends = create_backends(
+            settings, self.cache_dir, settings.get("package_managers", ["pacman", "yay", "paru"])
+        )
+
+        # Start from the previous results so backends that are not due keep their last answer
+        previous = self.cache.load() or {}
+        self._apply_cached(previous)
+        # Transactions finished by now are reflected in this check; later ones are applied from the log
+        self.pacman_log.advance()
+        db_changed = previous.get("fingerprint") != pacman_db_fingerprint()
+        states = {}
+        due = {}
+        for name, backend in backends.items():
+            if not backend.is_available():
+                states[name] = record_unavailable(backend.ttl, current_time)
+                continue
+            states[name] = load_state(self.source_states.get(name))
+            if force or is_due(states[name], current_time) or (backend.pacman_managed and db_changed):
+                due[name] = backend
+
+        # Cheap backends are published first, so a slow Flatpak or fwupd check never
+        # holds back the pacman and AUR counts; expensive ones run in a second pass
+        cheap = {name: backend for name, backend in due.items() if backend.cost != "expensive"}
+        expensive = {name: backend for name, backend in due.items() if backend.cost == "expensive"}
+        durations = {}
+        errors = {}
+        deferred = []
+        # New journal errors are picked up with each real check, not on every poll;
+        # the scan runs next to the cheap backends so it adds no latency of its own
+        extra = {"journal": lambda: (len(self.journal.scan()), [])} if self.journal.enabled else {}
+        self._check_backends(cheap, states, current_time, timeout, durations, errors, extra)
+        if cheap and expensive:
+            self.cache_updates()
+            if defer_expensive:
+                # A Waybar poll answers now; a detached process runs the rest
+                deferred = sorted(expensive)
+                expensive = {}
+            elif on_partial is not None:
+                on_partial(self.update_count)
+        if expensive:
+            self._check_backends(expensive, states, current_time, timeout, durations, errors)
+
+        # Cache results
+        self.cache_updates()
+        self.last_check = current_time
+
+        # The cache only holds the last check; the history keeps every one
+        from update_history import history_settings, record_history
+
+        record_history(
+            self.history_file,
+            history_settings(settings),
+            current_time,
+            time.time() - current_time,
+            durations,
+            errors,
+            self.update_count,
+            self.update_details,
+        )
+
+        return deferred
+
+    def _check_backends(
+        self,
+        due: Dict[str, UpdateBackend],
+        states: Dict[str, Dict],
+        current_time: float,
+        timeout: float,
+        durations: Dict[str, float],
+        errors: Dict[str, str],
+        extra: Dict[str, Callable[[], Tuple[int, List[str]]]] = None,
+    ):
+        """Run one pass of due backends, plus any extra local checks, at once and merge their results"""
+        checks = {name: partial(backend.check, backend.timeout) for name, backend in due.items()}
+        classes = {name: backend.concurrency for name, backend in due.items()}
+        for name, check in (extra or {}).items():
+            checks[name] = check
+            classes[name] = "local"
+        # Each backend keeps its own TTL and backoff
+        results, pass_errors = run_checks(
+            checks,
+            max((backend.timeout for backend in due.values()), default=timeout),
+            classes,
+            durations,
+        )
+        errors.update(pass_errors)
+        for name, backend in due.items():
+            if name in results:
+                lines = [u for u in results[name][1] if u.strip()]
+                changed = set(lines) != set(self.update_lists.get(name, []))
+                self.update_lists[name] = lines
+                states[name] = record_success(states[name], backend.ttl, current_time, changed)
+            else:
+                # Keep the last known lines; the error state is shown instead of a false zero
+                error = pass_errors.get(name, "check failed")
+                states[name] = record_failure(states[name], backend.ttl, current_time, error)
+        self.source_states = dict(states)
+        self.update_lists = {
+            source: self.update_lists.get(source, [])
+            for source, state in states.items()
+            if not state.get("unavailable")
+        }
+
+        # Update counts, counting AUR updates once however many sources report them
+        self.update_count = build_counts(
+            {source: len(lines) for source, lines in self.update_lists.items()}
+        )
+        self.update_details = self.describe_updates()
+
+    def recount_from_local_db(self) -> Optional[Dict[str, int]]:
+        """Drop already applied updates from the last results using only the local DB"""
+        counts = self.update_count
+        known = sum(len(lines) for lines in self.update_lists.values())
+        if known != sum(counts.get(source, 0) for source in self.update_lists):
+            # Package lists do not match the counts, so only a real check can tell
+            return None
+
+        from pacman_watch import installed_versions, pending_updates
+
+        installed = installed_versions()
+        self.update_lists = {
+            manager: pending_updates(lines, installed) if is_pacman_managed(manager) else lines
+            for manager, lines in self.update_lists.items()
+        }
+        pending = {
+            (source, line.split()[0])
+            for source, lines in self.update_lists.items()
+            for line in lines
+        }
+        self.update_details = [
+            record
+            for record in self.update_details
+            if (record["source"], record["name"]) in pending
+        ]
+        self.update_count = build_counts(
+            {source: len(lines) for source, lines in self.update_lists.items()}
+        )
+        self.cache_updates()
+        return self.update_count
+
+    def recount_from_pacman_log(self) -> Optional[Dict[str, int]]:
+        """Drop updates applied by transactions logged since the last check; None if a real check is needed"""
+        cached = self.cache.load()
+        if cached is None or "counts" not in cached or time.time() >= self.cache.fresh_until(cached):
+            return None
+        # New sync DBs can bring new updates, which only a real check finds
+        previous = {k: v for k, v in (cached.get("fingerprint") or {}).items() if k != "local"}
+        if previous != {k: v for k, v in pacman_db_fingerprint().items() if k != "local"}:
+            return None
+        applied = self.pacman_log.applied()
+        if applied is None or any(action["action"] == "downgraded" for action in applied.values()):
+            return None
+
+        def is_applied(name: str, new_version: str) -> bool:
+            action = applied.get(name)
+            if action is None:
+                return False
+            return action["action"] == "removed" or vercmp(action["new_version"], new_version) >= 0
+
+        self._apply_cached(cached)
+        if sum(len(lines) for lines in self.update_lists.values()) != sum(
+            self.update_count.get(source, 0) for source in self.update_lists
+        ):
+            # Package lists do not match the counts, so only a real check can tell
+            return None
+        self.update_lists = {
+            source: [line for line in lines if not is_applied(line.split()[0], line.split()[-1])]
+            for source, lines in self.update_lists.items()
+        }
+        self.update_details = [
+            record for record in self.update_details if not is_applied(record["name"], record["new_version"])
+        ]
+        self.update_count = build_counts(
+            {source: len(lines) for source, lines in self.update_lists.items()}
+        )
+        self.cache_updates()
+        return self.update_count
+
+    def describe_updates(self) -> List[Dict]:
+        """Build structured per-package records from the current update lists"""
+        records = []
+        for source, lines in self.update_lists.items():
+            for line in lines:
+                record = parse_update_line(line, source)
+                if record:
+                    records.append(record)
+        from package_index import add_repo_details
+
+        private_db = self.config["update_settings"].get("sync_db_path")
+        return add_repo_details(records, self.index_file, resolve_sync_dir(private_db))
+
+    def _apply_cached(self, cached: Dict):
+        """Restore counts, package records and lists from a cache entry"""
+        self.update_count = build_counts(cached.get("counts", {}))
+        self.last_check = cached.get("timestamp", 0)
+        self.update_details = cached.get("packages", [])
+        self.source_states = dict(cached.get("sources", {}))
+        self.update_lists = {source: [] for source in ("pacman",) + AUR_SOURCES}
+        self.update_lists.update(lists_from_records(self.update_details))
+
+    def load_cached_updates(self) -> Dict[str, int]:
+        """Load cached update counts"""
+        cached = self.cache.load()
+        if cached is not None:
+            self._apply_cached(cached)
+        return self.update_count
+
+    def cache_updates(self):
+        """Cache update counts and package records with timestamp and pacman DB fingerprint"""
+        self.cache.save(self.update_count, self.update_details, self.source_states)
+
+    def start_background_refresh(self):
+        """Run due checks in a detached process so the caller can answer from the stale cache"""
+        try:
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    str(Path(__file__).resolve()),
+                    "--config",
+                    str(self.config_path),
+                    "--revalidate",
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except OSError as e:
+            print(f"Warning: Could not start background refresh: {e}", file=sys.stderr)
+
+    def revalidate(self):
+        """Run due checks unless another process is, then make Waybar re-poll on changes"""
+        before = self.get_waybar_output(self.load_cached_updates())
+        with self.cache.check_lock() as acquired:
+            checked = acquired and self.cache.load_fresh(self.enabled_sources()) is None
+            if checked:
+                timeout = self.config["update_settings"].get("check_timeout", 30)
+                self._run_all_checks(timeout)
+        if checked and self.get_waybar_output(self.update_count) != before:
+            self.signal_waybar()
+        # The detached process is off the poll path, so the slow history work happens here
+        self.maintain_history()
+
+    def signal_waybar(self):
+        """Make Waybar re-poll the module now"""
+        from pacman_watch import signal_waybar
+
+        signal_waybar(self.config["update_settings"].get("waybar_signal", 8))
+
+    def maintain_history(self):
+        """Import pacman.log into the history store and compact it when due"""
+        from update_history import history_settings, maintain_history
+
+        maintain_history(self.history_file, history_settings(self.config["update_settings"]))
+
+    def plan_upgrade(self) -> Dict:
+        """Plan one repo transaction and the pending AUR builds from the (cached) check results"""
+        from prefetch import cache_dir_args
+        from upgrade_plan import build_upgrade_plan
+
+        self.check_all_updates()
+        return build_upgrade_plan(
+            self.update_details,
+            self.config["update_settings"],
+            cache_dir_args(self.package_cache),
+            self.last_check,
+            cache_dir=self.cache_dir,
+        )
+
+    def run_upgrade(self) -> bool:
+        """Run the upgrade plan, then drop applied updates from the cache without another sync"""
+        from upgrade_plan import run_upgrade_plan
+
+        success = run_upgrade_plan(self.plan_upgrade(), self.command_environment())
+        if self.recount_from_local_db() is None:
+            self.check_all_updates()
+        self.signal_waybar()
+        return success
+
+    def build_aur(self) -> Dict:
+        """Build the pending AUR packages in parallel into the local repo, installing them if configured"""
+        from aur_build import AurBuilder, aur_build_settings, build_dir
+
+        self.check_all_updates()
+        settings = aur_build_settings(self.config["update_settings"])
+        names = [r["name"] for r in unique_updates(self.update_details) if r["source"] in AUR_SOURCES]
+        result = AurBuilder(build_dir(self.cache_dir, settings), settings).build(names)
+        if settings["install"] and result.get("installed"):
+            if self.recount_from_local_db() is None:
+                self.check_all_updates()
+            self.signal_waybar()
+        return result
+
+    def check_journal_errors(self) -> List[Dict]:
+        """Error groups logged since they were last shown, reading only new journal entries"""
+        return self.journal.scan()
+
+    def acknowledge_journal_errors(self, groups: List[Dict]):
+        """Mark shown journal errors as seen and let Waybar drop them from the tooltip"""
+        if groups:
+            self.journal.acknowledge(groups)
+            self.signal_waybar()
+
+    def get_status_data(self) -> Dict:
+        """Counts, package lists and per-backend state from the last check"""
+        from update_executor import active_runs
+
+        return {
+            "counts": self.update_count,
+            "packages": self.update_lists,
+            "details": self.update_details,
+            "sources": self.source_states,
+            "last_check": self.last_check,
+            "journal_errors": self.journal.new_error_count(),
+            "running": active_runs(self.runs_dir),
+        }
+
+    def format_update_details(self, limit: int = None) -> List[str]:
+        """Render one line per pending update, AUR duplicates removed"""
+        records = unique_updates(self.update_details)
+        lines = []
+        for record in records[:limit]:
+            repo = record.get("repo") or record["source"]
+            line = f"{repo}/{record['name']} {record['old_version']} -> {record['new_version']}"
+            if record.get("download_size"):
+                line += f" ({record['download_size'] / 1048576:.1f} MiB)"
+            lines.append(line)
+        if limit is not None and len(records) > limit:
+            lines.append(f"... and {len(records) - limit} more")
+        return lines
+
+    def get_waybar_output(self, counts: Dict[str, int] = None) -> str:
+        """Generate JSON output for Waybar"""
+        if counts is None:
+            counts = self.check_all_updates()
+        with METRICS.span("render"):
+            output = self._render_waybar_output(counts)
+        self.save_poll_snapshot(counts, output)
+        return output
+
+    def save_poll_snapshot(self, counts: Dict[str, int], output: str):
+        """Let the lean poll path answer with this output while the cache it shows stays fresh"""
+        files = {
+            self.cache_file: file_key(self.cache_file),
+            self.journal.state_file: file_key(self.journal.state_file),
+            self.runs_dir: file_key(self.runs_dir),
+        }
+        cached = self.cache.load()
+        if (
+            cached is None
+            or self.running
+            or self.journal.new_error_count() != self.journal_error_count
+            or not self.cache.is_fresh(cached, self.enabled_sources())
+            or build_counts(cached.get("counts", {})) != counts
+            or cached.get("packages", []) != self.update_details
+            or cached.get("sources", {}) != self.source_states
+        ):
+            remove_snapshot(str(self.config_path))
+            return
+        write_snapshot(
+            str(self.config_path),
+            files,
+            cached,
+            self.cache.fresh_until(cached),
+            output,
+        )
+
+    def _render_waybar_output(self, counts: Dict[str, int]) -> str:
+        """Build the Waybar JSON for the given counts"""
+        total = counts["total"]
+        icons = self.config["update_settings"]["icons"]
+        colors = self.config["update_settings"]["colors"]
+
+        if total == 0:
+            icon = icons["no_updates"]
+            css_class = "no-updates"
+            color = colors["no_updates"]
+            tooltip = "System is up to date"
+        else:
+            icon = icons["updates_available"]
+            css_class = "updates-available"
+            color = colors["updates_available"]
+            tooltip = f"Updates available:\nPacman: {counts['pacman']}\nAUR: {aur_count(counts)}"
+            for source, count in counts.items():
+                if count and source not in ("pacman", "total") + AUR_SOURCES:
+                    tooltip += f"\n{source_label(source)}: {count}"
+            tooltip += f"\nTotal: {total}"
+            limit = self.config["update_settings"].get("tooltip_max_packages", 10)
+            details = self.format_update_details(limit) if limit else []
+            if details:
+                tooltip += "\n\n" + "\n".join(details)
+
+        errors = source_errors(self.source_states)
+        if errors:
+            # A failed check must not read as "up to date": flag it and keep the last known counts
+            icon = icons["error"]
+            css_class = "error"
+            color = colors["error"]
+            failed = "\n".join(
+                f"{source_label(source)}: {error}" for source, error in sorted(errors.items())
+            )
+            message = f"<span color='{color}'>Update check failed\n{html.escape(failed)}</span>"
+            tooltip = f"{message}\n\n{tooltip}" if total > 0 else message
+
+        # Only the count of errors not yet shown, read from the scanner's state file
+        self.journal_error_count = self.journal.new_error_count()
+        if self.journal_error_count:
+            noun = "error" if self.journal_error_count == 1 else "errors"
+            tooltip += f"\n\n{self.journal_error_count} new journal {noun}"
+
+        output = {
+            "text": f"{icon} {total}" if total > 0 else icon,
+            "tooltip": tooltip,
+            "class": css_class,
+            "percentage": min(100, total * 10) if total > 0 else 0,
+        }
+
+        # Commands started from the menu show their live progress instead of the counts
+        from update_executor import active_runs, format_progress
+
+        self.running = active_runs(self.runs_dir)
+        if self.running:
+            percent = self.running[0].get("percent")
+            progress = "\n".join(html.escape(format_progress(run)) for run in self.running)
+            output["text"] = f"{icons['updating']} {percent}%" if percent is not None else icons["updating"]
+            output["tooltip"] = f"{progress}\n\n{tooltip}"
+            output["class"] = "updating"
+            output["percentage"] = percent or 0
+
+        return json.dumps(output)
+
+    def get_updating_output(self) -> str:
+        """Generate transient JSON output shown while a check is running"""
+        icon = self.config["update_settings"]["icons"]["updating"]
+        output = {
+            "text": icon,
+            "tooltip": "Checking for updates...",
+            "class": "updating",
+            "percentage": 0,
+        }
+        return json.dumps(output)
+
+    def execute_terminal_update(self):
+        """Execute interactive terminal update"""
+        # Use the improved terminal script
+        terminal_script = self.script_dir / "update_terminal.sh"
+
+        if not terminal_script.exists():
+            print(f"Terminal update script not found at {terminal_script}", file=sys.stderr)
+            print("Please ensure update_terminal.sh exists in the script directory", file=sys.stderr)
+            return
+
+        if not os.access(terminal_script, os.X_OK):
+            print(f"Terminal update script is not executable: {terminal_script}", file=sys.stderr)
+            print(f"Run: chmod +x {terminal_script}", file=sys.stderr)
+            return
+
+        try:
+            subprocess.run([str(terminal_script)], check=True, env=self.command_environment())
+        except subprocess.CalledProcessError as e:
+            print(f"Terminal update script failed with exit code {e.returncode}", file=sys.stderr)
+        except subprocess.SubprocessError as e:
+            print(f"Failed to launch terminal update: {e}", file=sys.stderr)
+        except FileNotFoundError:
+            print(f"Terminal update script not found or not executable: {terminal_script}", file=sys.stderr)
+
+    def run_default(self, args: argparse.Namespace):
+        """Run the entry point's own action once no shared flag has handled the call"""
+        if args.update:
+            self.execute_terminal_update()
+        else:
+            # Default: output for Waybar
+            print(self.get_waybar_output(self.check_all_updates(background=True)))
+
+
+def build_parser(description: str = "Arch Linux Update Checker for Waybar") -> argparse.ArgumentParser:
+    """Command line shared by the checker and the manager"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--config", help="Path to config file (overrides environment variable and defaults)")
+    parser.add_argument(
+        "--check", action="store_true", help="Check for updates and output JSON"
+    )
+    parser.add_argument("--update", action="store_true", help="Run interactive update")
+    parser.add_argument(
+        "--refresh", action="store_true", help="Ignore the cache and check for updates now"
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="List pending updates per package from the cache",
+    )
+    parser.add_argument(
+        "--sync-db",
+        action="store_true",
+        help="Refresh the private sync databases, then recheck",
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Sync the private databases and download pending packages, then recheck",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Stay resident and serve update status over a Unix socket",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Stay alive and print a JSON line for Waybar whenever the state changes",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Check in-process even if an update daemon is running",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Print counts, package details and backend state as JSON",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the combined pacman and AUR upgrade plan as JSON without running it",
+    )
+    parser.add_argument(
+        "--upgrade",
+        action="store_true",
+        help="Upgrade repo and AUR packages with at most one database sync",
+    )
+    parser.add_argument(
+        "--build-aur",
+        action="store_true",
+        help="Build pending AUR packages in parallel into the local repo and print the result as JSON",
+    )
+    parser.add_argument(
+        "--history",
+        nargs="?",
+        const="day",
+        metavar="{day,repo}",
+        help="Stream the update history as JSON lines, aggregated by day (default) or repo",
+    )
+    parser.add_argument(
+        "--history-days",
+        type=int,
+        default=30,
+        help="Days of history to include (0 for all)",
+    )
+    parser.add_argument(
+        "--journal",
+        action="store_true",
+        help="Print journal errors logged since they were last shown as JSON and mark them seen",
+    )
+    parser.add_argument(
+        "--fleet",
+        metavar="HOSTS_FILE",
+        help="Check every host in HOSTS_FILE over SSH and print an aggregated report",
+    )
+    parser.add_argument(
+        "--fleet-format",
+        choices=["json", "csv"],
+        default="json",
+        help="Report format for --fleet (default: json)",
+    )
+    parser.add_argument(
+        "--fleet-workers", type=int, help="Number of hosts checked at once in --fleet mode"
+    )
+    parser.add_argument(
+        "--serve-cache",
+        nargs="?",
+        const="",
+        metavar="HOST:PORT",
+        help="Serve synced package databases and AUR lookups to other machines over HTTP",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="Write timings and counters as a Prometheus textfile for node_exporter",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Print a per-phase timing breakdown to stderr"
+    )
+    # Internal: background re-check started when a stale cache was served
+    parser.add_argument("--revalidate", action="store_true", help=argparse.SUPPRESS)
+
+    return parser
+
+
+def is_waybar_poll(args: argparse.Namespace) -> bool:
+    """Whether the arguments ask for nothing but the Waybar output"""
+    return not any(getattr(args, name, False) for name in NON_POLL_ARGS) and (
+        args.serve_cache is None and args.history is None
+    )
+
+
+def answer_from_daemon(args: argparse.Namespace) -> bool:
+    """Fast path: let a running daemon answer status queries and Waybar polls"""
+    if args.no_daemon or not (args.status or is_waybar_poll(args)):
+        return False
+    from update_daemon import DAEMON_REFRESH_TIMEOUT, query_daemon
+
+    if args.status:
+        output = query_daemon("status")
+    elif args.refresh:
+        output = query_daemon("refresh", timeout=DAEMON_REFRESH_TIMEOUT)
+    else:
+        output = query_daemon("waybar")
+    if output is None:
+        return False
+    print(output)
+    return True
+
+
+def run_daemon(checker, args: argparse.Namespace):
+    from update_daemon import UpdateDaemon
+
+    UpdateDaemon(checker).serve_forever()
+
+
+def run_watch(checker, args: argparse.Namespace):
+    from waybar_watch import watch_updates
+
+    watch_updates(checker)
+
+
+def run_revalidate(checker, args: argparse.Namespace):
+    checker.revalidate()
+
+
+def run_fleet_report(checker, args: argparse.Namespace):
+    from fleet import run_fleet
+
+    settings = checker.config["update_settings"]
+    print(run_fleet(Path(args.fleet), settings, args.fleet_format, args.fleet_workers))
+
+
+def run_serve_cache(checker, args: argparse.Namespace):
+    from lan_cache import run_cache_server
+
+    run_cache_server(checker.config["update_settings"], args.serve_cache or None)
+
+
+def run_refresh(checker, args: argparse.Namespace):
+    """Bring the results up to date first when --prefetch, --sync-db or --refresh asks for it"""
+    if args.prefetch:
+        if not checker.prefetch_packages():
+            sys.exit(1)
+    elif args.sync_db:
+        if not checker.sync_package_databases():
+            sys.exit(1)
+    elif not args.refresh:
+        return
+    checker.check_all_updates(force=True)
+
+
+def run_list(checker, args: argparse.Namespace):
+    checker.check_all_updates()
+    for line in checker.format_update_details():
+        print(line)
+
+
+def run_plan(checker, args: argparse.Namespace):
+    print(json.dumps(checker.plan_upgrade(), indent=2))
+
+
+def run_upgrade(checker, args: argparse.Namespace):
+    if not checker.run_upgrade():
+        sys.exit(1)
+
+
+def run_history(checker, args: argparse.Namespace):
+    from update_history import history_settings, print_history
+
+    settings = history_settings(checker.config["update_settings"])
+    if not print_history(checker.history_file, settings, args.history, args.history_days):
+        sys.exit(1)
+
+
+def run_build_aur(checker, args: argparse.Namespace):
+    result = checker.build_aur()
+    print(json.dumps(result, indent=2))
+    if result["failed"] or result["skipped"]:
+        sys.exit(1)
+
+
+def run_journal(checker, args: argparse.Namespace):
+    groups = checker.check_journal_errors()
+    print(json.dumps({"new_errors": sum(group["count"] for group in groups), "groups": groups}))
+    checker.acknowledge_journal_errors(groups)
+
+
+def run_status(checker, args: argparse.Namespace):
+    checker.check_all_updates()
+    print(json.dumps(checker.get_status_data()))
+
+
+# Long-running and standalone modes, tried in this order before anything else
+SERVICE_MODES = (
+    ("daemon", run_daemon),
+    ("watch", run_watch),
+    ("revalidate", run_revalidate),
+    ("fleet", run_fleet_report),
+    ("serve_cache", run_serve_cache),
+)
+
+# Modes that work on the (optionally refreshed) results; the first one given runs
+RESULT_MODES = (
+    ("list", run_list),
+    ("plan", run_plan),
+    ("upgrade", run_upgrade),
+    ("history", run_history),
+    ("build_aur", run_build_aur),
+    ("journal", run_journal),
+    ("status", run_status),
+)
+
+
+def selected_mode(args: argparse.Namespace, modes: tuple) -> Optional[Callable]:
+    """Handler of the first mode given on the command line; flags with a const of "" count too"""
+    for name, handler in modes:
+        if getattr(args, name, None) not in (None, False):
+            return handler
+    return None
+
+
+def run_cli(checker_class: type, parser: argparse.ArgumentParser):
+    """Parse the command line and run it with a checker or manager"""
+    args = parser.parse_args()
+    if args.history is not None:
+        from update_history import HISTORY_VIEWS
+
+        if args.history not in HISTORY_VIEWS:
+            parser.error(f"argument --history: invalid choice: {args.history!r} (choose from {', '.join(HISTORY_VIEWS)})")
+    record_startup()
+    if args.metrics or args.profile:
+        atexit.register(report_metrics, args.metrics, args.profile)
+
+    if answer_from_daemon(args):
+        return
+
+    try:
+        checker = checker_class(args.config)
+        handler = selected_mode(args, SERVICE_MODES)
+        if handler is None:
+            run_refresh(checker, args)
+            handler = selected_mode(args, RESULT_MODES)
+        if handler is None:
+            checker.run_default(args)
+        else:
+            handler(checker, args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    run_cli(ArchUpdateChecker, build_parser())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Resident update daemon for the Waybar updates module
+Keeps one checker in memory and serves Waybar JSON and package lists over a Unix socket
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from metrics import METRICS, export_textfile
+from pacman_watch import PacmanWatcher, signal_waybar
+from prefetch import PREFETCH_INTERVAL
+from update_executor import active_runs
+
+SOCKET_NAME = "waybar-updates.sock"
+
+# A forced refresh waits for a full check, so clients allow it more time
+DAEMON_REFRESH_TIMEOUT = 60.0
+
+
+def default_socket_path() -> Path:
+    """Return the daemon socket path, preferring the private runtime directory"""
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir and Path(runtime_dir).is_dir():
+        return Path(runtime_dir) / SOCKET_NAME
+    return Path(f"/tmp/waybar-updates-{os.getuid()}.sock")
+
+
+def query_daemon(
+    command: str = "waybar", socket_path: Path = None, timeout: float = 2.0
+) -> Optional[str]:
+    """Send a command to a running daemon and return its reply, or None if unreachable"""
+    path = socket_path or default_socket_path()
+    try:
+        with METRICS.span("daemon_query"), socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            sock.sendall(f"{command}\n".encode())
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return None
+    reply = b"".join(chunks).decode().strip()
+    return reply or None
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        command = self.rfile.readline().decode(errors="replace").strip()
+        reply = self.server.update_daemon.handle_command(command)
+        self.wfile.write(f"{reply}\n".encode())
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class UpdateDaemon:
+    def __init__(self, checker, socket_path: Path = None, poll_interval: float = 30):
+        self.checker = checker
+        self.socket_path = Path(socket_path or default_socket_path())
+        self.poll_interval = poll_interval
+        self.waybar_output = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._server = None
+        self._changes = set()
+        self._changes_lock = threading.Lock()
+        self._prefetched = threading.Event()
+        self.metrics_file = checker.config["update_settings"].get("metrics_file")
+
+    def refresh(self, force: bool = False) -> str:
+        """Run a (cached) check and re-render the Waybar output"""
+        with self._lock:
+            counts = self.checker.check_all_updates(force=force, on_partial=self._publish_partial)
+            self.waybar_output = self.checker.get_waybar_output(counts)
+            return self.waybar_output
+
+    def _publish_partial(self, counts: Dict[str, int]):
+        """Serve the cheap backends' counts while the expensive ones are still checked"""
+        output = self.checker.get_waybar_output(counts)
+        if output != self.waybar_output:
+            self.waybar_output = output
+            signal_waybar(self.checker.config["update_settings"].get("waybar_signal", 8))
+
+    def export_metrics(self):
+        """Write the Prometheus textfile when metrics_file is configured"""
+        if self.metrics_file:
+            export_textfile(self.metrics_file)
+
+    def status(self) -> str:
+        """Return counts and package lists from the last check as JSON"""
+        with self._lock:
+            return json.dumps(self.checker.get_status_data())
+
+    def handle_command(self, command: str) -> str:
+        """Dispatch a single client command: waybar, status, refresh or progress"""
+        if command == "waybar":
+            if self.checker.running or active_runs(self.checker.runs_dir):
+                # Render per request while a command's progress is changing, and once after it ends
+                with self._lock:
+                    self.waybar_output = self.checker.get_waybar_output(self.checker.update_count)
+                    return self.waybar_output
+            return self.waybar_output or self.refresh()
+        if command == "progress":
+            return json.dumps(active_runs(self.checker.runs_dir))
+        if command == "status":
+            return self.status()
+        if command == "refresh":
+            return self.refresh(force=True)
+        return json.dumps({"error": f"unknown command: {command}"})
+
+    def _on_pacman_change(self, kinds: Set[str]):
+        """Queue pacman database changes for the refresh thread"""
+        with self._changes_lock:
+            self._changes.update(kinds)
+        self._wake.set()
+
+    def _recount(self) -> bool:
+        """Apply finished transactions offline; False when a real check is needed"""
+        with self._changes_lock:
+            seen = set(self._changes)
+            self._changes.clear()
+        if not seen & {"local", "transaction"}:
+            return False
+        with self._lock:
+            counts = self.checker.recount_from_local_db()
+            if counts is None:
+                return False
+            self.waybar_output = self.checker.get_waybar_output(counts)
+            return True
+
+    def _refresh_loop(self):
+        """Re-validate the cache periodically; the cache decides when a real check runs"""
+        signal_number = self.checker.config["update_settings"].get("waybar_signal", 8)
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            previous = self.waybar_output
+            # A prefetch synced the private DBs, so the last results may be out of date
+            forced = self._prefetched.is_set()
+            self._prefetched.clear()
+            try:
+                if forced:
+                    self.refresh(force=True)
+                elif not self._recount():
+                    self.refresh()
+            except Exception as e:
+                print(f"Warning: Background refresh failed: {e}", file=sys.stderr)
+            if self.waybar_output != previous:
+                signal_waybar(signal_number)
+            self.export_metrics()
+            self.checker.maintain_history()
+
+    def _prefetch_loop(self, interval: float):
+        """Sync the private DBs and download pending packages on a slow schedule of its own"""
+        while not self._stop.wait(interval):
+            try:
+                if self.checker.prefetch_packages():
+                    self._prefetched.set()
+                    self._wake.set()
+            except Exception as e:
+                print(f"Warning: Package prefetch failed: {e}", file=sys.stderr)
+
+    def _claim_socket(self):
+        """Remove a stale socket file, refusing to start if another daemon answers"""
+        if not self.socket_path.exists():
+            return
+        if query_daemon("waybar", self.socket_path, timeout=1.0) is not None:
+            raise RuntimeError(f"Update daemon already running on {self.socket_path}")
+        self.socket_path.unlink()
+
+    def serve_forever(self):
+        """Start the refresh thread and serve clients until SIGINT/SIGTERM"""
+        self._claim_socket()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Fill package lists with a real check before accepting clients
+        self.refresh(force=True)
+        self.export_metrics()
+
+        self._server = _UnixServer(str(self.socket_path), _RequestHandler)
+        self._server.update_daemon = self
+        os.chmod(self.socket_path, 0o600)
+
+        refresher = threading.Thread(
+            target=self._refresh_loop, name="update-refresh", daemon=True
+        )
+        refresher.start()
+        PacmanWatcher().start(self._on_pacman_change, self._stop)
+
+        prefetch = self.checker.config["update_settings"].get("prefetch", {})
+        if prefetch.get("enabled"):
+            threading.Thread(
+                target=self._prefetch_loop,
+                args=(prefetch.get("interval", PREFETCH_INTERVAL),),
+                name="update-prefetch",
+                daemon=True,
+            ).start()
+
+        def _terminate(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, _terminate)
+        print(f"Update daemon listening on {self.socket_path}", file=sys.stderr)
+
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            self._wake.set()
+            self._server.server_close()
+            try:
+                self.socket_path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Update executor for the Waybar updates module
+Runs maintenance commands directly or in a terminal, follows their output,
+parses pacman, AUR helper and makepkg progress and publishes it to Waybar,
+the daemon and the GUI
+"""
+
+import codecs
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from pacman_db import parallel_downloads
+from pacman_watch import signal_waybar
+from update_cache import atomic_write
+
+RUNS_DIR = "runs"
+
+# Progress files are rewritten at most this often, apart from phase changes
+PUBLISH_INTERVAL = 0.5
+# Waybar is asked to re-poll at most this often while a command runs
+SIGNAL_INTERVAL = 2.0
+# How often a terminal run's output log is read
+FOLLOW_INTERVAL = 0.2
+# A terminal that never starts the wrapper script is given up on after this long
+TERMINAL_START_TIMEOUT = 10.0
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]|\x1b\][^\x07]*\x07")
+
+PHASE_HEADERS = (
+    (":: Synchronizing package databases", "sync"),
+    (":: Starting full system upgrade", "resolve"),
+    (":: Searching AUR", "resolve"),
+    (":: Retrieving packages", "download"),
+    (":: Running pre-transaction hooks", "hooks"),
+    (":: Processing package changes", "install"),
+    (":: Running post-transaction hooks", "hooks"),
+)
+
+# " core-1.0-1-x86_64   120.5 KiB  1000 KiB/s 00:00 [######-----]  45%"
+PROGRESS_BAR = re.compile(
+    r"^\s*(?P<label>.+?)\s+[\d.]+\s+\S*B\s+(?P<rate>[\d.]+\s+\S*B/s)\s+[\d:-]+\s+\[[^\]]*\]\s+(?P<percent>\d+)%"
+)
+# The aggregate bar pacman draws while ParallelDownloads fetches several files at once
+TOTAL_LABEL = re.compile(r"^Total \(\s*(\d+)/(\d+)\)")
+# "( 3/12) upgrading linux   [#####] 100%", the bar missing when stdout is not a tty
+STEP = re.compile(r"^\(\s*(\d+)/(\d+)\)\s+(?P<text>.*?)(?:\s+\[[^\]]*\]\s+(?P<percent>\d+)%)?\s*$")
+PACKAGE_COUNT = re.compile(r"^Packages \((\d+)\)")
+DOWNLOAD_SIZE = re.compile(r"^Total Download Size:\s+(.+)$")
+# Without a tty pacman prints one line per download and per transaction step
+PLAIN_DOWNLOAD = re.compile(r"^\s*(\S+) downloading\.\.\.$")
+PLAIN_STEP = re.compile(r"^(installing|upgrading|reinstalling|downgrading|removing) (\S+?)\.\.\.$")
+MAKEPKG = re.compile(r"^==> Making package: (\S+)")
+
+TRANSACTION_VERBS = ("installing", "upgrading", "reinstalling", "downgrading", "removing")
+CHECK_VERBS = ("checking", "loading")
+
+
+def runs_dir(cache_dir: Path) -> Path:
+    """Private directory holding the temporary files and progress of running commands"""
+    return Path(cache_dir) / RUNS_DIR
+
+
+class ProgressParser:
+    """Turns pacman, yay/paru and makepkg output into a progress record"""
+
+    def __init__(self, slots: int = 1):
+        self.progress = {
+            "phase": "starting",
+            "done": 0,
+            "total": 0,
+            "percent": None,
+            "current": "",
+            "rate": "",
+            "packages": 0,
+            "download_size": "",
+            "parallel_downloads": slots,
+            "active_downloads": 0,
+        }
+        self._pending = ""
+        self._finished = set()
+        self._total_bar = False
+        # Percent of each file pacman is still downloading, oldest first; it never
+        # draws more bars at once than ParallelDownloads allows
+        self._slots = max(1, slots)
+        self._active = {}
+
+    def feed(self, text: str) -> bool:
+        """Parse a chunk of output; True when the progress changed"""
+        before = dict(self.progress)
+        # Progress bars are redrawn after a carriage return, so both end a line
+        parts = re.split(r"[\r\n]", self._pending + text)
+        self._pending = parts.pop()
+        for part in parts:
+            self.parse_line(part)
+        return self.progress != before
+
+    def finish(self) -> bool:
+        """Parse whatever is left after the last line break"""
+        pending, self._pending = self._pending, ""
+        return self.feed(pending + "\n")
+
+    def _set_phase(self, phase: str):
+        progress = self.progress
+        if progress["phase"] == phase:
+            return
+        progress.update(phase=phase, done=0, percent=None, current="", rate="", active_downloads=0)
+        progress["total"] = progress["packages"] if phase in ("download", "install") else 0
+        self._finished.clear()
+        self._total_bar = False
+        self._active.clear()
+
+    def _count_done(self, name: str):
+        progress = self.progress
+        if name in self._finished:
+            return
+        self._finished.add(name)
+        progress["done"] = len(self._finished)
+        if progress["total"]:
+            progress["percent"] = min(100, progress["done"] * 100 // progress["total"])
+
+    def _download_slot(self, label: str, percent: int):
+        """Fold one file's bar into the overall percentage across the parallel download slots"""
+        progress = self.progress
+        self._active.pop(label, None)
+        if percent >= 100:
+            self._count_done(label)
+        elif label not in self._finished:
+            self._active[label] = percent
+            while len(self._active) > self._slots:
+                # A bar that was never finished is no longer on screen
+                del self._active[next(iter(self._active))]
+        progress["active_downloads"] = len(self._active)
+        if progress["total"]:
+            in_flight = sum(self._active.values())
+            progress["percent"] = min(100, (progress["done"] * 100 + in_flight) // progress["total"])
+        elif self._active:
+            progress["percent"] = sum(self._active.values()) // len(self._active)
+
+    def parse_line(self, line: str):
+        """Update the progress from one line of output"""
+        line = ANSI_ESCAPE.sub("", line).rstrip()
+        if not line.strip():
+            return
+        progress = self.progress
+
+        for header, phase in PHASE_HEADERS:
+            if line.startswith(header):
+                self._set_phase(phase)
+                return
+
+        match = PACKAGE_COUNT.match(line)
+        if match:
+            progress["packages"] = int(match.group(1))
+            return
+        match = DOWNLOAD_SIZE.match(line)
+        if match:
+            progress["download_size"] = match.group(1).strip()
+            return
+        match = MAKEPKG.match(line)
+        if match:
+            self._set_phase("build")
+            progress["current"] = match.group(1)
+            return
+
+        bar = PROGRESS_BAR.match(line)
+        if bar:
+            label = bar.group("label").strip()
+            percent = int(bar.group("percent"))
+            total = TOTAL_LABEL.match(label)
+            if total:
+                self._set_phase("download")
+                self._total_bar = True
+                progress.update(
+                    done=int(total.group(1)), total=int(total.group(2)), percent=percent
+                )
+                progress["rate"] = bar.group("rate")
+                return
+            if progress["phase"] not in ("sync", "download"):
+                self._set_phase("download")
+            progress["current"] = label
+            if not self._total_bar:
+                progress["rate"] = bar.group("rate")
+                self._download_slot(label, percent)
+            return
+
+        step = STEP.match(line)
+        if step:
+            done, total = int(step.group(1)), int(step.group(2))
+            text = step.group("text")
+            verb = text.split(" ", 1)[0]
+            if verb in TRANSACTION_VERBS:
+                self._set_phase("install")
+            elif verb in CHECK_VERBS:
+                self._set_phase("verify")
+            percent = int(step.group("percent") or 0)
+            progress.update(
+                done=done if percent >= 100 else done - 1,
+                total=total,
+                current=text,
+                percent=min(100, round(((done - 1) + percent / 100) * 100 / max(total, 1))),
+            )
+            return
+
+        match = PLAIN_DOWNLOAD.match(line)
+        if match:
+            self._set_phase("download")
+            progress["current"] = match.group(1)
+            self._count_done(match.group(1))
+            return
+        match = PLAIN_STEP.match(line)
+        if match:
+            self._set_phase("install")
+            progress["current"] = match.group(2)
+            self._count_done(match.group(2))
+
+
+def _pid_alive(pid: int) -> bool:
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def active_runs(directory: Path) -> List[Dict]:
+    """Progress of the commands still running, oldest first; files of dead runs are removed"""
+    runs = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return runs
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = Path(directory) / name
+        try:
+            with open(path, "r") as f:
+                run = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if not isinstance(run, dict) or not _pid_alive(run.get("pid", 0)):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            continue
+        runs.append(run)
+    return sorted(runs, key=lambda run: run.get("started", 0))
+
+
+def format_progress(run: Dict) -> str:
+    """One line such as 'System Update: download 3/12 45% (4/5 parallel, 4.2 MiB/s)'"""
+    text = f"{run.get('name', 'Command')}: {run.get('phase', 'starting')}"
+    if run.get("total"):
+        text += f" {run.get('done', 0)}/{run['total']}"
+    if run.get("percent") is not None:
+        text += f" {run['percent']}%"
+    details = []
+    if run.get("phase") == "download" and run.get("parallel_downloads", 1) > 1:
+        active = run.get("active_downloads")
+        slots = run["parallel_downloads"]
+        details.append(f"{active}/{slots} parallel" if active else f"{slots} parallel")
+    if run.get("rate"):
+        details.append(run["rate"])
+    if details:
+        text += f" ({', '.join(details)})"
+    if run.get("current") and run.get("phase") in ("install", "build"):
+        text += f" {run['current']}"
+    return text
+
+
+class ProgressPublisher:
+    """Writes a run's progress file and passes updates to Waybar and a callback"""
+
+    def __init__(
+        self,
+        path: Path,
+        run: Dict,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        waybar_signal: Optional[int] = None,
+    ):
+        self.path = path
+        self.run = run
+        self.on_progress = on_progress
+        self.waybar_signal = waybar_signal
+        self._written = 0.0
+        self._signalled = 0.0
+        self._closed = False
+
+    def update(self, progress: Dict, force: bool = False):
+        """Publish progress, throttled except when the phase changes"""
+        phase_changed = progress.get("phase") != self.run.get("phase")
+        self.run.update(progress)
+        self.run["updated"] = time.time()
+        now = time.monotonic()
+        if not (force or phase_changed or now - self._written >= PUBLISH_INTERVAL):
+            return
+        self._written = now
+        self._write()
+        if self.on_progress:
+            self.on_progress(dict(self.run))
+        if self.waybar_signal is not None and (phase_changed or now - self._signalled >= SIGNAL_INTERVAL):
+            self._signalled = now
+            signal_waybar(self.waybar_signal)
+
+    def _write(self):
+        try:
+            atomic_write(self.path, json.dumps(self.run))
+        except OSError as e:
+            print(f"Warning: Could not publish progress to {self.path}: {e}", file=sys.stderr)
+
+    def close(self):
+        """Remove the progress file so readers see the run has ended"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+        if self.waybar_signal is not None:
+            signal_waybar(self.waybar_signal)
+
+
+TERMINAL_SCRIPT = """#!/bin/bash
+echo $$ > {pid_file}
+{exports}
+echo -e "{bold}{info}Executing: {shown}{reset}"
+echo -e "{info}Press Enter to continue...{reset}"
+read
+echo -e "{bold}Starting command execution...{reset}"
+{runner}
+echo $exit_code > {status_file}
+if [ $exit_code -eq 0 ]; then
+    echo -e "{success}{bold}Command completed successfully!{reset}"
+else
+    echo -e "{error}{bold}Command failed with exit code: $exit_code{reset}"
+fi
+echo -e "{info}Press Enter to close...{reset}"
+read
+"""
+
+
+class UpdateExecutor:
+    """Runs commands with live progress; every run gets its own temporary files"""
+
+    def __init__(
+        self,
+        directory: Path,
+        terminal_settings: Dict,
+        exports: Dict[str, str] = None,
+        waybar_signal: Optional[int] = None,
+    ):
+        self.directory = Path(directory)
+        self.terminal_settings = terminal_settings
+        self.exports = exports or {}
+        self.waybar_signal = waybar_signal
+
+    def run(
+        self,
+        command: str,
+        name: str = None,
+        terminal: bool = True,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+    ) -> bool:
+        """Run a command to completion while publishing its progress; True if it succeeded"""
+        try:
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd, script = tempfile.mkstemp(prefix="run-", suffix=".sh", dir=self.directory)
+            os.close(fd)
+        except OSError as e:
+            print(f"Error creating temporary script: {e}", file=sys.stderr)
+            return False
+        base = Path(script[: -len(".sh")])
+        files = {
+            "script": Path(script),
+            "log": base.with_suffix(".log"),
+            "status": base.with_suffix(".status"),
+            "pid": base.with_suffix(".pid"),
+        }
+        parser = ProgressParser(parallel_downloads())
+        publisher = ProgressPublisher(
+            base.with_suffix(".json"),
+            {"id": base.name, "name": name or command, "pid": os.getpid(), "started": time.time()},
+            on_progress,
+            self.waybar_signal,
+        )
+        publisher.update(parser.progress, force=True)
+        try:
+            if terminal:
+                exit_code = self._run_in_terminal(command, files, parser, publisher)
+            else:
+                exit_code = self._run_direct(command, files, parser, publisher)
+        finally:
+            publisher.close()
+            for path in files.values():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        return exit_code == 0
+
+    def _consume(self, decoder, data: bytes, parser: ProgressParser, publisher: ProgressPublisher):
+        if parser.feed(decoder.decode(data)):
+            publisher.update(parser.progress)
+
+    def _run_direct(
+        self, command: str, files: Dict[str, Path], parser: ProgressParser, publisher: ProgressPublisher
+    ) -> Optional[int]:
+        """Run without a terminal, streaming the merged output as it arrives"""
+        try:
+            process = subprocess.Popen(
+                command,
+                shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env={**os.environ, **self.exports},
+            )
+        except OSError as e:
+            print(f"Error running command: {e}", file=sys.stderr)
+            return None
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for chunk in iter(lambda: process.stdout.read1(65536), b""):
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
+            self._consume(decoder, chunk, parser, publisher)
+        parser.feed(decoder.decode(b"", final=True))
+        parser.finish()
+        publisher.update(parser.progress, force=True)
+        return process.wait()
+
+    def _terminal_script(self, command: str, files: Dict[str, Path]) -> str:
+        colors = self.terminal_settings.get("color_scheme", {})
+        quote = shlex.quote
+        if shutil.which("script"):
+            # script(1) keeps a pty, so pacman still draws progress bars and asks questions
+            runner = f"script -qfec {quote(command)} {quote(str(files['log']))}\nexit_code=$?"
+        else:
+            runner = f"{{ {command}\n}} 2>&1 | tee {quote(str(files['log']))}\nexit_code=${{PIPESTATUS[0]}}"
+        exports = "\n".join(f"export {key}={quote(value)}" for key, value in self.exports.items())
+        return TERMINAL_SCRIPT.format(
+            pid_file=quote(str(files["pid"])),
+            status_file=quote(str(files["status"])),
+            exports=exports,
+            shown=command.replace("\\", "\\\\").replace('"', '\\"').replace("$", "\\$").replace("`", "\\`"),
+            runner=runner,
+            **{key: colors.get(key, "") for key in ("bold", "info", "reset", "success", "error")},
+        )
+
+    def _run_in_terminal(
+        self, command: str, files: Dict[str, Path], parser: ProgressParser, publisher: ProgressPublisher
+    ) -> Optional[int]:
+        """Run in a terminal window and follow the output it logs"""
+        terminal_cmd = self.terminal_settings["default_terminal"]
+        terminal_args = self.terminal_settings["terminal_args"]
+        try:
+            with open(files["script"], "w") as f:
+                f.write(self._terminal_script(command, files))
+            os.chmod(files["script"], 0o700)
+        except OSError as e:
+            print(f"Error creating temporary script: {e}", file=sys.stderr)
+            return None
+        try:
+            process = subprocess.Popen([terminal_cmd] + terminal_args + [str(files["script"])])
+        except OSError as e:
+            print(f"Terminal not found: {terminal_cmd}. Error: {e}", file=sys.stderr)
+            return None
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        position = 0
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    with open(files["log"], "rb") as log:
+                        log.seek(position)
+                        data = log.read()
+                except OSError:
+                    data = b""
+                if data:
+                    position += len(data)
+                    self._consume(decoder, data, parser, publisher)
+                    continue
+                status = self._read_int(files["status"])
+                if status is not None:
+                    parser.finish()
+                    publisher.update(parser.progress, force=True)
+                    return status
+                # Some terminals hand the window to a server process and exit at once,
+                # so the wrapper script's own PID decides whether the run is still going
+                script_pid = self._read_int(files["pid"])
+                if script_pid is not None:
+                    if not _pid_alive(script_pid):
+                        return None
+                elif process.poll() not in (None, 0) or time.monotonic() - started > TERMINAL_START_TIMEOUT:
+                    print(f"Terminal {terminal_cmd} did not start the command", file=sys.stderr)
+                    return None
+                time.sleep(FOLLOW_INTERVAL)
+        finally:
+            # The result is known once the wrapper writes its status; the window stays
+            # open until dismissed, so the terminal is reaped without holding up the run
+            publisher.close()
+            threading.Thread(target=process.wait, name="terminal-reaper", daemon=True).start()
+
+    @staticmethod
+    def _read_int(path: Path) -> Optional[int]:
+        try:
+            with open(path, "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Update history store for the Waybar updates module
+Appends every check's counts and backend timings to SQLite, and, off the poll
+path, the upgrades applied according to pacman.log, rolling old samples up into daily totals
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from pacman_log import PacmanLogReader
+from pacman_watch import PACMAN_LOG
+from update_cache import unique_updates
+
+try:
+    import sqlite3
+
+    SQLITE_AVAILABLE = True
+except ImportError:
+    SQLITE_AVAILABLE = False
+
+HISTORY_FILE = "history.sqlite"
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    # Samples older than this are rolled up into one row per day, kind and key
+    "raw_days": 90,
+}
+
+COMPACT_INTERVAL = 86400
+
+# Rows per executemany batch when importing pacman.log, bounding memory on a first import of years of log
+IMPORT_BATCH = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    time INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_time ON samples (time);
+CREATE TABLE IF NOT EXISTS rollups (
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    total REAL NOT NULL,
+    maximum REAL NOT NULL,
+    PRIMARY KEY (day, kind, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS upgrades (
+    time INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    old_version TEXT NOT NULL,
+    new_version TEXT NOT NULL,
+    repo TEXT
+);
+CREATE INDEX IF NOT EXISTS upgrades_time ON upgrades (time);
+CREATE TABLE IF NOT EXISTS package_repos (
+    name TEXT PRIMARY KEY,
+    repo TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Raw samples aggregated per day in the rollup shape, plus upgrades counted per repo
+DAILY = """
+WITH combined AS (
+    SELECT date(time, 'unixepoch', 'localtime') AS day, kind, key,
+           COUNT(*) AS n, SUM(value) AS total, MAX(value) AS maximum
+    FROM samples WHERE time >= :since GROUP BY day, kind, key
+    UNION ALL
+    SELECT day, kind, key, n, total, maximum FROM rollups
+    WHERE day >= date(:since, 'unixepoch', 'localtime')
+    UNION ALL
+    SELECT date(time, 'unixepoch', 'localtime') AS day, 'upgrade', COALESCE(repo, 'unknown'),
+           COUNT(*), COUNT(*), 1
+    FROM upgrades WHERE time >= :since GROUP BY day, COALESCE(repo, 'unknown')
+)
+"""
+
+BY_DAY = DAILY + """
+SELECT day, kind, key, SUM(n), SUM(total), MAX(maximum)
+FROM combined GROUP BY day, kind, key ORDER BY day, kind, key
+"""
+
+BY_REPO = DAILY + """
+SELECT key, kind, SUM(n), SUM(total), MAX(maximum)
+FROM combined WHERE kind IN ('pending', 'upgrade') GROUP BY key, kind ORDER BY key, kind
+"""
+
+CHECK_COUNT = DAILY + "SELECT COALESCE(SUM(n), 0) FROM combined WHERE kind = 'check'"
+
+HISTORY_VIEWS = ("day", "repo")
+
+
+def history_settings(update_settings: Dict) -> Dict:
+    """The history block of update_settings merged over the defaults"""
+    pacman_log = update_settings.get("pacman_log") or str(PACMAN_LOG)
+    return {**DEFAULT_SETTINGS, "pacman_log": pacman_log, **update_settings.get("history", {})}
+
+
+def check_samples(
+    duration: float,
+    durations: Dict[str, float],
+    errors: Dict[str, str],
+    counts: Dict[str, int],
+    records: List[Dict],
+) -> List[tuple]:
+    """(kind, key, value) rows describing one check"""
+    samples = [("check", "", duration), ("total", "", counts.get("total", 0))]
+    samples += [("backend", name, seconds) for name, seconds in sorted(durations.items())]
+    samples += [("failure", name, 1) for name in sorted(errors)]
+    pending = {}
+    for record in unique_updates(records):
+        repo = record.get("repo") or record["source"]
+        pending[repo] = pending.get(repo, 0) + 1
+    # Repos without updates are left out; averages divide by the number of checks
+    samples += [("pending", repo, count) for repo, count in sorted(pending.items())]
+    return samples
+
+
+def _average(total: float, count: int) -> float:
+    return round(total / count, 3) if count else 0
+
+
+class UpdateHistory:
+    """Append-only SQLite store of checks and applied upgrades"""
+
+    def __init__(self, path: Path, settings: Dict):
+        if not SQLITE_AVAILABLE:
+            raise RuntimeError("sqlite3 module is not available")
+        self.path = Path(path)
+        self.settings = settings
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+        # Only takes effect on a new database; lets compaction hand pages back to the file system
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the SQLite connection"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def import_log(self) -> int:
+        """Store upgrades logged since the saved pacman.log checkpoint; return how many"""
+        reader = PacmanLogReader(Path(self.settings["pacman_log"]))
+        try:
+            checkpoint = json.loads(self._meta("pacman_log") or "{}")
+        except json.JSONDecodeError:
+            checkpoint = {}
+        imported = 0
+        batch = []
+
+        def flush():
+            # The repo is the one the package was last pending from, when a check saw it
+            self.conn.executemany(
+                "INSERT INTO upgrades SELECT ?, ?, ?, ?, (SELECT repo FROM package_repos WHERE name = ?)",
+                batch,
+            )
+            batch.clear()
+
+        for event in reader.read(checkpoint):
+            if event["action"] != "upgraded":
+                continue
+            batch.append(
+                (int(event["time"]), event["name"], event["old_version"], event["new_version"], event["name"])
+            )
+            imported += 1
+            if len(batch) >= IMPORT_BATCH:
+                flush()
+        if batch:
+            flush()
+        if reader.checkpoint and reader.checkpoint != checkpoint:
+            self._set_meta("pacman_log", json.dumps(reader.checkpoint))
+        return imported
+
+    def record_check(
+        self,
+        timestamp: float,
+        duration: float,
+        durations: Dict[str, float],
+        errors: Dict[str, str],
+        counts: Dict[str, int],
+        records: List[Dict],
+    ):
+        """Append one check; pacman.log is imported separately by maintain()"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "INSERT INTO samples VALUES (?, ?, ?, ?)",
+                [(int(timestamp),) + sample for sample in check_samples(duration, durations, errors, counts, records)],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO package_repos VALUES (?, ?)",
+                [(r["name"], r.get("repo") or r["source"]) for r in records],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def maintain(self, now: float = None) -> int:
+        """Import upgrades logged since the last import and compact once a day; return how many"""
+        now = time.time() if now is None else now
+        # IMMEDIATE: concurrent processes must not import the same log lines twice
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            imported = self.import_log()
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        if now - float(self._meta("compacted") or 0) >= COMPACT_INTERVAL:
+            self.compact(now)
+        return imported
+
+    def compact(self, now: float = None):
+        """Roll samples older than raw_days up into daily rows and free their pages"""
+        now = time.time() if now is None else now
+        cutoff = int(now - self.settings["raw_days"] * 86400)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                """
+                INSERT INTO rollups
+                SELECT date(time, 'unixepoch', 'localtime') AS day, kind, key, COUNT(*), SUM(value), MAX(value)
+                FROM samples WHERE time < ? GROUP BY day, kind, key
+                ON CONFLICT (day, kind, key) DO UPDATE SET
+                    n = n + excluded.n, total = total + excluded.total, maximum = MAX(maximum, excluded.maximum)
+                """,
+                (cutoff,),
+            )
+            removed = self.conn.execute("DELETE FROM samples WHERE time < ?", (cutoff,)).rowcount
+            self._set_meta("compacted", str(now))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        if removed:
+            # executescript steps the pragma to completion; execute() would free a single page
+            self.conn.executescript("PRAGMA incremental_vacuum;")
+
+    def by_day(self, since: float = 0) -> Iterator[Dict]:
+        """One summary per day, streamed in date order"""
+        current = None
+        for day, kind, key, n, total, maximum in self.conn.execute(BY_DAY, {"since": int(since)}):
+            if current is None or current["day"] != day:
+                if current is not None:
+                    yield current
+                current = {
+                    "day": day,
+                    "checks": 0,
+                    "check_seconds": {"avg": 0, "max": 0},
+                    "updates": {"avg": 0, "max": 0},
+                    "backends": {},
+                    "pending": {},
+                    "upgrades": {},
+                }
+            if kind == "check":
+                current["checks"] = n
+                current["check_seconds"] = {"avg": _average(total, n), "max": round(maximum, 3)}
+            elif kind == "total":
+                current["updates"] = {"avg": _average(total, n), "max": int(maximum)}
+            elif kind == "backend":
+                backend = current["backends"].setdefault(key, {"failures": 0})
+                backend.update(checks=n, avg_seconds=_average(total, n), max_seconds=round(maximum, 3))
+            elif kind == "failure":
+                current["backends"].setdefault(key, {"failures": 0})["failures"] = n
+            elif kind == "pending":
+                # Rows come ordered by kind, so the day's check count is already known
+                current["pending"][key] = {"avg": _average(total, current["checks"]), "max": int(maximum)}
+            elif kind == "upgrade":
+                current["upgrades"][key] = n
+        if current is not None:
+            yield current
+
+    def by_repo(self, since: float = 0) -> Iterator[Dict]:
+        """One summary per repo over the whole period, streamed in name order"""
+        checks = self.conn.execute(CHECK_COUNT, {"since": int(since)}).fetchone()[0]
+        current = None
+        for repo, kind, n, total, maximum in self.conn.execute(BY_REPO, {"since": int(since)}):
+            if current is None or current["repo"] != repo:
+                if current is not None:
+                    yield current
+                current = {"repo": repo, "pending_avg": 0, "pending_max": 0, "upgrades": 0}
+            if kind == "pending":
+                current.update(pending_avg=_average(total, checks), pending_max=int(maximum))
+            else:
+                current["upgrades"] = n
+        if current is not None:
+            yield current
+
+
+def record_history(
+    path: Path,
+    settings: Dict,
+    timestamp: float,
+    duration: float,
+    durations: Dict[str, float],
+    errors: Dict[str, str],
+    counts: Dict[str, int],
+    records: List[Dict],
+):
+    """Append a check to the history store, warning instead of failing the check"""
+    if not (SQLITE_AVAILABLE and settings.get("enabled", True)):
+        return
+    try:
+        with UpdateHistory(path, settings) as history:
+            history.record_check(timestamp, duration, durations, errors, counts, records)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: Could not record update history in {path}: {e}", file=sys.stderr)
+
+
+def maintain_history(path: Path, settings: Dict):
+    """Import pacman.log and compact the store; run from the detached refresh or the daemon, not a poll"""
+    if not (SQLITE_AVAILABLE and settings.get("enabled", True)):
+        return
+    try:
+        with UpdateHistory(path, settings) as history:
+            history.maintain()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: Could not update history in {path}: {e}", file=sys.stderr)
+
+
+def print_history(path: Path, settings: Dict, view: str = "day", days: int = 30) -> bool:
+    """Stream a history view as JSON lines; False if the store cannot be read"""
+    if not SQLITE_AVAILABLE:
+        print("Error: sqlite3 module is not available", file=sys.stderr)
+        return False
+    since = time.time() - days * 86400 if days > 0 else 0
+    try:
+        with UpdateHistory(path, settings) as history:
+            history.maintain()
+            rows = history.by_repo(since) if view == "repo" else history.by_day(since)
+            for row in rows:
+                print(json.dumps(row), flush=True)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error: Could not read update history {path}: {e}", file=sys.stderr)
+        return False
+    return True
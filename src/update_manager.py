@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Arch Linux Update Manager for Waybar
+A comprehensive update checker and system maintenance tool for Hyprland/Waybar
+"""
+
+import json
+import subprocess
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+import argparse
+from functools import partial
+
+from journal_scan import format_group
+from prefetch import cache_dir_args
+from update_checker import ArchUpdateChecker, build_parser, run_cli
+from update_daemon import query_daemon
+from update_executor import UpdateExecutor, format_progress
+
+
+class _ConsoleDialogs:
+    """Minimal sg-like interface for non-GUI operations"""
+
+    @staticmethod
+    def popup(*args, **kwargs):
+        print(" ".join(str(arg) for arg in args))
+        return True
+
+    @staticmethod
+    def popup_scrolled(*args, **kwargs):
+        print(" ".join(str(arg) for arg in args))
+        return True
+
+
+# PySimpleGUI pulls in Tk, so it is only imported once a window is actually needed
+sg = _ConsoleDialogs
+_gui_loaded: Optional[bool] = None
+
+
+def gui_available() -> bool:
+    """Import PySimpleGUI on first use; False when it is not installed"""
+    global sg, _gui_loaded
+    if _gui_loaded is None:
+        try:
+            import PySimpleGUI
+        except ImportError:
+            _gui_loaded = False
+        else:
+            sg = PySimpleGUI
+            _gui_loaded = True
+    return _gui_loaded
+
+
+# Events posted by the menu's worker threads and element keys they update
+MENU_UPDATES_EVENT = "-UPDATES-"
+MENU_JOURNAL_EVENT = "-JOURNAL-"
+MENU_COMMAND_EVENT = "-COMMAND-"
+MENU_PROGRESS_EVENT = "-PROGRESS-"
+MENU_STATUS_KEY = "-STATUS-"
+MENU_ACTIVITY_KEY = "-ACTIVITY-"
+SPINNER_FRAMES = "◐◓◑◒"
+SPINNER_INTERVAL_MS = 150
+
+
+class ArchUpdateManager(ArchUpdateChecker):
+    """The checker plus the GUI menu and the commands it runs"""
+
+    def __init__(self, config_path: str = None):
+        super().__init__(config_path)
+        self.current_status = "checking"
+
+    def _get_default_config(self) -> Dict:
+        """Return default configuration"""
+        config = super()._get_default_config()
+        config.update(
+            {
+                "gui_settings": {
+                    "transparency": 0.9,
+                    "popup_width": 300,
+                    "popup_height": 400,
+                    "button_padding": 10,
+                },
+                "terminal_settings": {
+                    "default_terminal": "kitty",
+                    "terminal_args": ["-e"],
+                    "color_scheme": {
+                        "reset": "\\033[0m",
+                        "bold": "\\033[1m",
+                        "info": "\\033[34m",
+                        "success": "\\033[32m",
+                        "error": "\\033[31m",
+                    },
+                },
+                "menu_buttons": [],
+            }
+        )
+        return config
+
+    def get_package_manager_priority(self) -> str:
+        """Determine which package manager to use based on availability"""
+        managers = self.config["update_settings"]["package_managers"]
+        for manager in managers:
+            if subprocess.run(["which", manager], capture_output=True).returncode == 0:
+                return manager
+        return "pacman"  # fallback
+
+    def get_update_status(self) -> Dict[str, int]:
+        """Get update counts and lists from the daemon, falling back to a local check"""
+        reply = query_daemon("status")
+        if reply is not None:
+            try:
+                status = json.loads(reply)
+                self.update_count = status["counts"]
+                self.update_lists = status["packages"]
+                self.update_details = status.get("details", [])
+                self.source_states = status.get("sources", {})
+                self.last_check = status["last_check"]
+                return self.update_count
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                print(f"Warning: Invalid reply from update daemon: {e}", file=sys.stderr)
+        return self.check_all_updates()
+
+    def confirm_command(self, command: str) -> bool:
+        """Ask before running a command, in a dialog or on the terminal"""
+        if gui_available():
+            layout = [
+                [sg.Text("Execute command:", font=("Arial", 12, "bold"))],
+                [sg.Text(command, font=("Courier", 10), text_color="yellow")],
+                [sg.Text("Are you sure you want to continue?")],
+                [
+                    sg.Button("Yes", button_color=("white", "green")),
+                    sg.Button("No", button_color=("white", "red")),
+                ],
+            ]
+
+            window = sg.Window(
+                "Confirm Command",
+                layout,
+                modal=True,
+                alpha_channel=0.9,
+                no_titlebar=False,
+                finalize=True,
+            )
+
+            event, values = window.read()
+            window.close()
+            return event == "Yes"
+
+        # Fallback to terminal confirmation
+        print(f"\nExecute command: {command}")
+        response = input("Are you sure you want to continue? (y/N): ")
+        return response.lower() in ["y", "yes"]
+
+    def execute_command(
+        self,
+        command: str,
+        terminal: bool = True,
+        requires_confirmation: bool = False,
+        name: str = None,
+        on_progress=None,
+    ) -> bool:
+        """Execute a system command, publishing its progress while it runs"""
+        if requires_confirmation and not self.confirm_command(command):
+            return False
+
+        executor = UpdateExecutor(
+            self.runs_dir,
+            self.config.get("terminal_settings", {}),
+            {"WAYBAR_UPDATES_CACHEDIRS": cache_dir_args(self.package_cache)},
+            self.config["update_settings"].get("waybar_signal", 8),
+        )
+        return executor.run(command, name, terminal, on_progress)
+
+    def menu_status(self, counts: Dict[str, int]) -> Tuple[str, str, str]:
+        """Text, colour and tooltip of the menu's update line"""
+        total = counts["total"]
+        if total > 0:
+            tooltip = "\n".join(self.format_update_details(20))
+            return f"📦 {total} updates available", "orange", tooltip
+        return "✅ System up to date", "green", "No pending updates"
+
+    def refresh_menu_status(self) -> Tuple[str, str, str]:
+        """Check for updates (or ask the daemon) and render the menu's update line"""
+        return self.menu_status(self.get_update_status())
+
+    def post_menu_event(self, window, event, value):
+        """Hand a value from a worker thread to the menu's event loop"""
+        try:
+            window.write_event_value(event, value)
+        except Exception:
+            # The menu was closed before the task finished
+            pass
+
+    def start_menu_worker(self, window, event, work, *args) -> threading.Thread:
+        """Run work on a daemon thread and post its result to the menu's event loop"""
+
+        def run():
+            try:
+                result = work(*args)
+            except Exception as e:
+                print(f"Warning: Background task {event} failed: {e}", file=sys.stderr)
+                result = None
+            self.post_menu_event(window, event, result)
+
+        worker = threading.Thread(target=run, name="menu-worker", daemon=True)
+        worker.start()
+        return worker
+
+    def show_journal_errors(self, journal_errors: List[Dict], non_blocking: bool = False):
+        """Show new journal errors, most recent first, in a scrollable popup"""
+        sg.popup_scrolled(
+            "New system errors detected in journal:\n\n"
+            + "\n".join(format_group(group) for group in journal_errors),
+            title="Journal Errors",
+            size=(80, 20),
+            non_blocking=non_blocking,
+        )
+        self.acknowledge_journal_errors(journal_errors)
+
+    def show_popup_menu(self, scan_journal: bool = False):
+        """Show the translucent popup menu with system maintenance options"""
+        if not gui_available():
+            # --update ends up here too, so point at the modes that work without a GUI
+            print("GUI not available. Use --list to see pending updates and --upgrade to install them.")
+            return
+
+        sg.theme("DarkGrey9")
+
+        gui_settings = self.config["gui_settings"]
+        buttons = self.config["menu_buttons"]
+
+        # Create layout with buttons
+        layout = []
+        layout.append(
+            [
+                sg.Text(
+                    "System Maintenance",
+                    font=("Arial", 14, "bold"),
+                    justification="center",
+                    expand_x=True,
+                )
+            ]
+        )
+        layout.append([sg.HSeparator()])
+
+        # Add update info from the cache; the refresh runs once the window is up
+        status_text, status_color, status_tooltip = self.menu_status(self.load_cached_updates())
+        layout.append(
+            [
+                sg.Text(
+                    status_text,
+                    key=MENU_STATUS_KEY,
+                    font=("Arial", 12),
+                    text_color=status_color,
+                    justification="center",
+                    tooltip=status_tooltip,
+                )
+            ]
+        )
+        layout.append(
+            [
+                sg.Text(
+                    "",
+                    key=MENU_ACTIVITY_KEY,
+                    font=("Arial", 9),
+                    text_color="gray",
+                    justification="center",
+                    expand_x=True,
+                )
+            ]
+        )
+
+        layout.append([sg.HSeparator()])
+
+        # Add menu buttons
+        for button in buttons:
+            button_layout = [
+                sg.Button(
+                    f"{button['icon']} {button['name']}",
+                    key=button["key"],
+                    size=(25, 1),
+                    font=("Arial", 10),
+                    tooltip=button["description"],
+                    button_color=("white", "#2d2d3a"),
+                    border_width=1,
+                )
+            ]
+            layout.append(button_layout)
+
+        layout.append([sg.HSeparator()])
+        layout.append([sg.Button("Close", key="close", button_color=("white", "red"))])
+
+        # Create window with transparency and no title bar for blur effect
+        window = sg.Window(
+            "System Updates",
+            layout,
+            no_titlebar=True,
+            alpha_channel=gui_settings["transparency"],
+            grab_anywhere=True,
+            keep_on_top=True,
+            size=(gui_settings["popup_width"], gui_settings["popup_height"]),
+            element_padding=(gui_settings["button_padding"], 5),
+            finalize=True,
+        )
+
+        # Background tasks still running, by event key
+        tasks = {MENU_UPDATES_EVENT: "Checking for updates..."}
+        self.start_menu_worker(window, MENU_UPDATES_EVENT, self.refresh_menu_status)
+        if scan_journal:
+            tasks[MENU_JOURNAL_EVENT] = "Scanning the journal..."
+            self.start_menu_worker(window, MENU_JOURNAL_EVENT, self.check_journal_errors)
+        # Commands being executed, by button key; several may run at once
+        running = {}
+        command_workers = {}
+        frame = 0
+
+        # Event loop
+        while True:
+            if tasks:
+                frame = (frame + 1) % len(SPINNER_FRAMES)
+                activity = f"{SPINNER_FRAMES[frame]} {' | '.join(tasks.values())}"
+            else:
+                activity = ""
+            window[MENU_ACTIVITY_KEY].update(value=activity)
+
+            # Poll only while something is running, to animate the indicator
+            event, values = window.read(timeout=SPINNER_INTERVAL_MS if tasks else None)
+
+            if event in (sg.WINDOW_CLOSED, "close"):
+                break
+
+            if event == sg.TIMEOUT_KEY:
+                continue
+
+            if event == MENU_UPDATES_EVENT:
+                tasks.pop(event, None)
+                if values[event] is not None:
+                    status_text, status_color, status_tooltip = values[event]
+                    window[MENU_STATUS_KEY].update(value=status_text, text_color=status_color)
+                    window[MENU_STATUS_KEY].set_tooltip(status_tooltip)
+                continue
+
+            if event == MENU_JOURNAL_EVENT:
+                tasks.pop(event, None)
+                if values[event]:
+                    self.show_journal_errors(values[event], non_blocking=True)
+                continue
+
+            if isinstance(event, tuple) and event[0] == MENU_PROGRESS_EVENT:
+                command_event = (MENU_COMMAND_EVENT, event[1])
+                if command_event in tasks:
+                    tasks[command_event] = format_progress(values[event])
+                continue
+
+            if isinstance(event, tuple) and event[0] == MENU_COMMAND_EVENT:
+                tasks.pop(event, None)
+                key = event[1]
+                running.pop(key, None)
+                command_workers.pop(key, None)
+                window[key].update(disabled=False)
+                if not running:
+                    window.keep_on_top_set()
+
+                # Special handling for reboot
+                if key == "reboot" and values[event]:
+                    break
+
+                # The command may have installed updates, so recount them
+                if MENU_UPDATES_EVENT not in tasks:
+                    tasks[MENU_UPDATES_EVENT] = "Checking for updates..."
+                    self.start_menu_worker(window, MENU_UPDATES_EVENT, self.refresh_menu_status)
+                continue
+
+            # Find the button configuration
+            button_config = None
+            for button in buttons:
+                if button["key"] == event:
+                    button_config = button
+                    break
+
+            if button_config and button_config["key"] not in running:
+                # Dialogs stay on the GUI thread; only the command itself runs in the background
+                if button_config["requires_confirmation"] and not self.confirm_command(
+                    button_config["command"]
+                ):
+                    continue
+
+                key = button_config["key"]
+                running[key] = button_config
+                window[key].update(disabled=True)
+                # Let the terminal the command opens come to the front
+                window.keep_on_top_clear()
+                tasks[(MENU_COMMAND_EVENT, key)] = f"Running {button_config['name']}..."
+                command_workers[key] = self.start_menu_worker(
+                    window,
+                    (MENU_COMMAND_EVENT, key),
+                    self.execute_command,
+                    button_config["command"],
+                    button_config["terminal"],
+                    False,
+                    button_config["name"],
+                    partial(self.post_menu_event, window, (MENU_PROGRESS_EVENT, key)),
+                )
+
+        window.close()
+
+        # Commands left running keep the process alive until they finish and clean up
+        for worker in command_workers.values():
+            worker.join()
+
+    def run_interactive_update(self):
+        """Run interactive system update process"""
+        if gui_available():
+            # The journal is scanned in the background and reported once the menu is up
+            self.show_popup_menu(scan_journal=True)
+            return
+
+        journal_errors = self.check_journal_errors()
+
+        if journal_errors:
+            self.show_journal_errors(journal_errors)
+
+        # Show interactive update menu
+        self.show_popup_menu()
+
+    def run_default(self, args: argparse.Namespace):
+        """Show the menu or run the interactive update; plain calls print the Waybar output"""
+        if args.check:
+            print(self.get_waybar_output(self.check_all_updates(background=True)))
+        elif args.menu:
+            self.show_popup_menu()
+        elif args.update:
+            self.run_interactive_update()
+        else:
+            # Default: output for Waybar
+            print(self.get_waybar_output(self.check_all_updates(background=True)))
+
+
+def main():
+    parser = build_parser("Arch Linux Update Manager for Waybar")
+    parser.add_argument("--menu", action="store_true", help="Show interactive menu")
+    run_cli(ArchUpdateManager, parser)
+
+
+if __name__ == "__main__":
+    main()
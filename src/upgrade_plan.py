@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Fused upgrade planner for the Waybar updates module
+Builds one repo transaction plus the AUR builds that are actually pending from
+the cached check results, using system sync databases that are already fresh
+instead of syncing again for pacman and once more for the AUR helper
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aur_build import AurBuilder, aur_build_settings, build_dir, build_jobs, format_build_result
+from check_engine import AUR_SOURCES
+from pacman_db import PACMAN_DB_PATH, configured_repos, default_private_db_path
+from update_cache import default_cache_dir, unique_updates
+
+# System sync DBs younger than this are used instead of downloading them again
+DEFAULT_MAX_DB_AGE = 3600
+
+AUR_HELPERS = ("yay", "paru")
+
+
+def upgrade_settings(update_settings: Dict) -> Dict:
+    """The upgrade block of update_settings merged over the defaults"""
+    return {"max_db_age": DEFAULT_MAX_DB_AGE, "aur_helper": "", **update_settings.get("upgrade", {})}
+
+
+def _db_files(sync_dir: Path, repos: List[str]) -> Optional[Dict[str, float]]:
+    """mtime of every configured repo's DB, or None if one is missing"""
+    mtimes = {}
+    for repo in repos:
+        try:
+            mtimes[repo] = (sync_dir / f"{repo}.db").stat().st_mtime
+        except OSError:
+            return None
+    return mtimes
+
+
+def database_plan(
+    private_sync: Path,
+    system_sync: Path = PACMAN_DB_PATH / "sync",
+    repos: List[str] = None,
+    max_age: float = DEFAULT_MAX_DB_AGE,
+    now: float = None,
+) -> Dict:
+    """Decide whether the upgrade can use the system DBs as they are or must sync"""
+    now = time.time() if now is None else now
+    repos = repos if repos is not None else configured_repos()
+    system = _db_files(system_sync, repos) if repos else None
+    private = _db_files(private_sync, repos) if repos and private_sync != system_sync else None
+
+    def age(mtimes: Optional[Dict[str, float]]) -> Optional[float]:
+        # The oldest DB decides: every repo has to be current for a consistent -Su
+        return now - min(mtimes.values()) if mtimes else None
+
+    # The private DBs are never copied into the system: they live in a directory any
+    # user can write to, and installing them as root would let that user pick the DBs
+    plan = {"repos": repos, "system_age": age(system), "private_age": age(private)}
+    if system and age(system) <= max_age and (not private or min(system.values()) >= min(private.values())):
+        plan.update(action="current", reason="system sync databases are fresh")
+    else:
+        plan.update(action="sync", reason="system sync databases are older than the maximum age or the last check")
+    return plan
+
+
+def choose_aur_helper(package_managers: List[str], preferred: str = "") -> Optional[str]:
+    """AUR helper that builds the pending AUR packages: the configured one, else the first installed"""
+    candidates = [preferred] if preferred else []
+    candidates += [name for name in package_managers if name in AUR_HELPERS]
+    candidates += list(AUR_HELPERS)
+    for helper in candidates:
+        if helper and shutil.which(helper):
+            return helper
+    return None
+
+
+def _package(record: Dict) -> Dict:
+    return {
+        "name": record["name"],
+        "old_version": record["old_version"],
+        "new_version": record["new_version"],
+        "repo": record.get("repo") or record["source"],
+        # None when the package index had no size for it
+        "download_size": record.get("download_size") or 0,
+    }
+
+
+def build_upgrade_plan(
+    records: List[Dict],
+    update_settings: Dict,
+    pacman_cache_args: str = "",
+    last_check: float = 0,
+    now: float = None,
+    cache_dir: Path = None,
+) -> Dict:
+    """Compute the combined transaction once from the cached per-package records"""
+    now = time.time() if now is None else now
+    settings = upgrade_settings(update_settings)
+    private_db = Path(update_settings.get("sync_db_path") or default_private_db_path())
+    databases = database_plan(private_db / "sync", max_age=settings["max_db_age"], now=now)
+
+    repo_packages = [_package(r) for r in records if r["source"] == "pacman"]
+    aur_packages = [_package(r) for r in unique_updates([r for r in records if r["source"] in AUR_SOURCES])]
+    builder = aur_build_settings(update_settings)
+    if not (builder["enabled"] and shutil.which("makepkg")):
+        builder = None
+    helper = None if builder else choose_aur_helper(update_settings.get("package_managers", []), settings["aur_helper"])
+
+    steps = []
+    cache_args = shlex.split(pacman_cache_args)
+    if databases["action"] == "sync":
+        # The cached results may be out of date, so upgrade even if none are known
+        steps.append(
+            {"description": "Sync databases and upgrade repo packages", "command": ["sudo", "pacman", "-Syu"] + cache_args}
+        )
+    elif repo_packages:
+        steps.append({"description": "Upgrade repo packages", "command": ["sudo", "pacman", "-Su"] + cache_args})
+    if aur_packages and builder:
+        root = build_dir(cache_dir or default_cache_dir(), builder)
+        steps.append(
+            {
+                "description": f"Build pending AUR packages ({build_jobs(builder)} parallel jobs)",
+                "builder": {"root": str(root), "settings": builder},
+                "packages": [p["name"] for p in aur_packages],
+            }
+        )
+    elif aur_packages and helper:
+        # -S without -y/-u: the helper neither syncs the repos again nor re-resolves the whole system
+        steps.append(
+            {
+                "description": "Build pending AUR packages",
+                "command": [helper, "-S", "--aur", "--needed"] + [p["name"] for p in aur_packages],
+            }
+        )
+
+    # The sequential pacman -Syu && helper -Syu refreshed the DBs twice
+    avoided = 2 - (1 if databases["action"] == "sync" else 0)
+    return {
+        "generated": now,
+        "last_check": last_check,
+        "databases": databases,
+        "repo": {
+            "packages": repo_packages,
+            "download_size": sum(p.get("download_size") or 0 for p in repo_packages),
+        },
+        "aur": {
+            "helper": "parallel builder" if builder else helper,
+            "packages": aur_packages,
+            "skipped": bool(aur_packages) and not (builder or helper),
+        },
+        "steps": steps,
+        "avoided_syncs": avoided,
+    }
+
+
+def format_step(step: Dict) -> str:
+    """Shell form of a plan step, for display"""
+    if "builder" in step:
+        return f"build {' '.join(step['packages'])} in {step['builder']['root']}"
+    return " ".join(shlex.quote(arg) for arg in step["command"])
+
+
+def run_upgrade_plan(plan: Dict, env: Dict[str, str] = None) -> bool:
+    """Run the plan's steps in order in the current terminal, stopping at the first failure"""
+    if plan["aur"]["skipped"]:
+        print("Warning: No AUR helper found (yay or paru); AUR packages are not upgraded", file=sys.stderr)
+    if not plan["steps"]:
+        print("Nothing to upgrade")
+        return True
+    for step in plan["steps"]:
+        print(f":: {step['description']}: {format_step(step)}", flush=True)
+        if "builder" in step:
+            builder = AurBuilder(Path(step["builder"]["root"]), step["builder"]["settings"])
+            result = builder.build(step["packages"])
+            for line in format_build_result(result):
+                print(line)
+            if result["failed"] or result["skipped"] or result.get("installed") is False:
+                print(f"{step['description']} failed", file=sys.stderr)
+                return False
+            continue
+        try:
+            result = subprocess.run(step["command"], env=env or dict(os.environ))
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"Error running {step['command'][0]}: {e}", file=sys.stderr)
+            return False
+        if result.returncode != 0:
+            print(f"{step['description']} failed with exit code {result.returncode}", file=sys.stderr)
+            return False
+    return True
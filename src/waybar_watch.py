@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Streaming Waybar output for the updates module
+Stays alive and prints one JSON object per line whenever the module state changes
+"""
+
+import os
+import signal
+import sys
+import threading
+
+from pacman_watch import PacmanWatcher
+
+# Seconds between cache re-validations; a real check only runs when the cache is stale
+WATCH_POLL_INTERVAL = 30
+
+
+def _emit(line: str, last_line: str) -> str:
+    """Print a line for Waybar unless it repeats the previous one"""
+    if line != last_line:
+        print(line, flush=True)
+    return line
+
+
+def watch_updates(checker, poll_interval: float = None):
+    """Emit Waybar JSON lines until stdout closes; SIGUSR1 forces an immediate recheck"""
+    if poll_interval is None:
+        poll_interval = checker.config["update_settings"].get(
+            "watch_poll_interval", WATCH_POLL_INTERVAL
+        )
+
+    wake = threading.Event()
+    force = {"next": False}
+
+    def _request_refresh(signum, frame):
+        force["next"] = True
+        wake.set()
+
+    signal.signal(signal.SIGUSR1, _request_refresh)
+
+    # Wake up as soon as a pacman transaction finishes instead of at the next tick
+    changes = set()
+    changes_lock = threading.Lock()
+
+    def _on_pacman_change(kinds):
+        with changes_lock:
+            changes.update(kinds)
+        wake.set()
+
+    PacmanWatcher().start(_on_pacman_change)
+
+    last_line = None
+
+    def _emit_partial(counts):
+        # Cheap backends finished; the expensive ones are still running
+        nonlocal last_line
+        last_line = _emit(checker.get_waybar_output(counts), last_line)
+
+    try:
+        while True:
+            forced = force["next"]
+            force["next"] = False
+            with changes_lock:
+                seen = set(changes)
+                changes.clear()
+
+            # Installed packages changed: recount offline from the last results
+            if not forced and seen & {"local", "transaction"}:
+                counts = checker.recount_from_local_db()
+                if counts is not None:
+                    last_line = _emit(checker.get_waybar_output(counts), last_line)
+
+            # Show the transient updating state only when a real check will run
+            if forced or checker.cache.load_fresh(checker.enabled_sources()) is None:
+                last_line = _emit(checker.get_updating_output(), last_line)
+
+            try:
+                counts = checker.check_all_updates(force=forced, on_partial=_emit_partial)
+                last_line = _emit(checker.get_waybar_output(counts), last_line)
+            except Exception as e:
+                print(f"Warning: Update check failed: {e}", file=sys.stderr)
+
+            wake.wait(poll_interval)
+            wake.clear()
+    except BrokenPipeError:
+        # Waybar closed the pipe; silence the flush at interpreter exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    except KeyboardInterrupt:
+        pass
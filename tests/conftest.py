@@ -0,0 +1,68 @@
+"""
+Shared fixtures for the test suite
+The modules in src/ import each other as top-level modules, the way the
+installed scripts run them, so src/ is put on sys.path first
+"""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+
+# A local stand-in for the AUR RPC v5 info endpoint, answering from AUR_PACKAGES
+AUR_PACKAGES = {
+    "yay": "12.4.2-1",
+    "paru": "2.0.4-1",
+    "visual-studio-code-bin": "1.94.2-1",
+    "google-chrome": "130.0.6723.58-1",
+}
+
+
+class AurStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        names = parse_qs(body).get("arg[]", [])
+        server.requests.append((self.path, self.client_address, names))
+        if server.status != 200:
+            payload = b"Service Unavailable"
+        elif server.error:
+            payload = json.dumps({"version": 5, "type": "error", "error": server.error}).encode()
+        else:
+            results = [{"Name": name, "Version": AUR_PACKAGES[name]} for name in names if name in AUR_PACKAGES]
+            payload = json.dumps({"version": 5, "type": "multiinfo", "resultcount": len(results), "results": results}).encode()
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if server.close_after:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def aur_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), AurStandIn)
+    server.requests = []
+    server.status = 200
+    server.error = None
+    server.close_after = False
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
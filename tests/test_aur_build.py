@@ -0,0 +1,201 @@
+"""Tests for the parallel AUR build stage against stub makepkg, pacman and sudo"""
+
+import os
+import stat
+
+import pytest
+
+import aur_build
+from aur_build import AurBuilder, build_order, dependency_graph, parse_srcinfo
+
+MAKEPKG = """#!/bin/sh
+names=$(sed -n 's/^pkgname = //p' .SRCINFO)
+ver=$(sed -n 's/^\\s*pkgver = //p' .SRCINFO | head -1)-$(sed -n 's/^\\s*pkgrel = //p' .SRCINFO | head -1)
+if [ "$1" = "--packagelist" ]; then
+    for n in $names; do echo "$PKGDEST/$n-$ver-x86_64.pkg.tar.zst"; done
+    exit 0
+fi
+echo "makepkg $(basename "$PWD") $*" >> "$STUB_LOG"
+[ -f FAIL ] && exit 1
+for n in $names; do touch "$PKGDEST/$n-$ver-x86_64.pkg.tar.zst"; done
+"""
+
+# pacman -T prints the dependencies listed in $MISSING_DEPS that it was asked about
+PACMAN = """#!/bin/sh
+if [ "$1" = "-T" ]; then
+    shift
+    for dep in "$@"; do
+        case " $MISSING_DEPS " in *" $dep "*) echo "$dep" ;; esac
+    done
+    exit 0
+fi
+echo "pacman $*" >> "$STUB_LOG"
+"""
+
+SUDO = """#!/bin/sh
+exec "$@"
+"""
+
+
+def srcinfo(base, version="1.0", pkgnames=None, depends=()):
+    lines = [f"pkgbase = {base}", f"\tpkgver = {version}", "\tpkgrel = 1"]
+    lines += [f"\tdepends = {dep}" for dep in depends]
+    lines += [f"pkgname = {name}" for name in pkgnames or [base]]
+    return "\n".join(lines) + "\n"
+
+
+def add_source(sources, base, **kwargs):
+    directory = sources / base
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "PKGBUILD").write_text(f"pkgbase={base}\npkgver={kwargs.get('version', '1.0')}\n")
+    (directory / ".SRCINFO").write_text(srcinfo(base, **kwargs))
+    return directory
+
+
+@pytest.fixture
+def stubs(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name, script in (("makepkg", MAKEPKG), ("pacman", PACMAN), ("sudo", SUDO)):
+        path = bin_dir / name
+        path.write_text(script)
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    log = tmp_path / "calls.log"
+    log.touch()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("STUB_LOG", str(log))
+    monkeypatch.setenv("MISSING_DEPS", "")
+    monkeypatch.delenv(aur_build.SOURCES_ENV, raising=False)
+    # No repo-add and no ccache, so only the stubs run
+    real_which = aur_build.shutil.which
+    monkeypatch.setattr(aur_build.shutil, "which", lambda name: None if name in ("repo-add", "ccache") else real_which(name))
+    return log
+
+
+def builder(tmp_path, **settings):
+    return AurBuilder(
+        tmp_path / "build",
+        {**aur_build.DEFAULT_SETTINGS, "sources": str(tmp_path / "sources"), "jobs": 2, **settings},
+    )
+
+
+def calls(log):
+    return log.read_text().splitlines()
+
+
+def test_parse_srcinfo_split_package():
+    info = parse_srcinfo(
+        "pkgbase = foo\n\tpkgver = 2.1\n\tpkgrel = 3\n\tepoch = 1\n"
+        "\tmakedepends = cmake>=3.20\n\tdepends_x86_64 = libbar.so=1-64\n\tprovides = foo-git\n"
+        "pkgname = foo\npkgname = foo-docs\n"
+    )
+    assert info["pkgbase"] == "foo"
+    assert info["version"] == "1:2.1-3"
+    assert info["pkgnames"] == ["foo", "foo-docs"]
+    assert info["depends"] == {"cmake", "libbar.so"}
+    assert info["provides"] == {"foo-git"}
+
+
+def test_build_order_waves_and_cycles():
+    packages = {
+        "app": parse_srcinfo(srcinfo("app", depends=["liba", "libb-provided"])),
+        "liba": parse_srcinfo(srcinfo("liba")),
+        "libb": parse_srcinfo(srcinfo("libb") + "\tprovides = libb-provided\n"),
+        "x": parse_srcinfo(srcinfo("x", depends=["y"])),
+        "y": parse_srcinfo(srcinfo("y", depends=["x"])),
+    }
+    waves, cyclic = build_order(dependency_graph(packages))
+    assert waves == [["liba", "libb"], ["app"]]
+    assert cyclic == ["x", "y"]
+
+
+def test_build_in_dependency_order_and_reuse_cached(tmp_path, stubs):
+    add_source(tmp_path / "sources", "liba")
+    add_source(tmp_path / "sources", "app", depends=["liba"])
+
+    result = builder(tmp_path, review=False, install=False).build(["app", "liba"])
+
+    assert result["built"] == ["liba", "app"]
+    assert result["failed"] == {} and result["skipped"] == {}
+    made = [line.split()[1] for line in calls(stubs) if line.startswith("makepkg")]
+    assert made == ["liba", "app"]
+    assert all("--syncdeps" in line for line in calls(stubs) if line.startswith("makepkg"))
+
+    stubs.write_text("")
+    result = builder(tmp_path, review=False, install=False).build(["app", "liba"])
+    assert sorted(result["cached"]) == ["app", "liba"]
+    assert calls(stubs) == []
+
+
+def test_failed_dependency_skips_dependents(tmp_path, stubs):
+    (add_source(tmp_path / "sources", "liba") / "FAIL").touch()
+    add_source(tmp_path / "sources", "app", depends=["liba"])
+    add_source(tmp_path / "sources", "solo")
+
+    result = builder(tmp_path, review=False, install=False).build(["app", "liba", "solo"])
+
+    assert "liba" in result["failed"]
+    assert result["skipped"] == {"app": "dependency liba failed"}
+    assert result["built"] == ["solo"]
+
+
+def test_install_only_wanted_split_packages(tmp_path, stubs):
+    add_source(tmp_path / "sources", "foo", pkgnames=["foo", "foo-docs"])
+
+    result = builder(tmp_path, review=False).build(["foo"])
+
+    assert result["installed"] is True
+    installs = [line for line in calls(stubs) if line.startswith("pacman -U")]
+    assert len(installs) == 1
+    assert "foo-1.0-1-x86_64" in installs[0] and "foo-docs" not in installs[0]
+
+
+def test_missing_repo_dependencies_installed_once(tmp_path, stubs, monkeypatch):
+    monkeypatch.setenv("MISSING_DEPS", "cmake")
+    add_source(tmp_path / "sources", "liba", depends=["cmake", "glibc"])
+    add_source(tmp_path / "sources", "app", depends=["liba", "cmake"])
+
+    builder(tmp_path, review=False, install=False).build(["app", "liba"])
+
+    assert [line for line in calls(stubs) if line.startswith("pacman -S")] == [
+        "pacman -S --needed --asdeps --noconfirm cmake"
+    ]
+
+
+def test_new_and_changed_pkgbuilds_need_approval(tmp_path, stubs, monkeypatch):
+    sources = tmp_path / "sources"
+    add_source(sources, "foo")
+    prompts = []
+    answers = [False]
+
+    def confirm(self, base, diff):
+        prompts.append((base, "".join(diff)))
+        return answers.pop(0)
+
+    monkeypatch.setattr(AurBuilder, "confirm", confirm)
+
+    result = builder(tmp_path, install=False).build(["foo"])
+    assert result["failed"] == {"foo": "PKGBUILD changes not approved"}
+    assert "+pkgbase=foo" in prompts[0][1]
+    assert calls(stubs) == []
+
+    answers.append(True)
+    assert builder(tmp_path, install=False).build(["foo"])["built"] == ["foo"]
+
+    # An unchanged clone is not asked about again
+    assert builder(tmp_path, install=False).build(["foo"])["cached"] == ["foo"]
+    assert len(prompts) == 2
+
+    add_source(sources, "foo", version="1.1")
+    answers.append(True)
+    assert builder(tmp_path, install=False).build(["foo"])["built"] == ["foo"]
+    assert "-pkgver=1.0" in prompts[2][1] and "+pkgver=1.1" in prompts[2][1]
+
+
+def test_unreviewed_pkgbuild_without_terminal_is_rejected(tmp_path, stubs, monkeypatch):
+    add_source(tmp_path / "sources", "foo")
+    monkeypatch.setattr(aur_build.sys.stdin, "isatty", lambda: False, raising=False)
+
+    result = builder(tmp_path, install=False).build(["foo"])
+
+    assert result["failed"] == {"foo": "PKGBUILD changes not approved"}
@@ -0,0 +1,126 @@
+"""Tests for the built-in AUR RPC client against a local stand-in server"""
+
+import os
+import socket
+import stat
+
+import pytest
+
+from aur_rpc import AurClient, AurRpcError, check_aur_rpc_updates, foreign_packages
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/rpc/"
+
+
+def test_updates_are_found_in_batches_over_one_connection(aur_server):
+    installed = {
+        "yay": "12.4.1-1",
+        "paru": "2.0.4-1",
+        "visual-studio-code-bin": "1.94.2-1",
+        "google-chrome": "1:129.0.6668.100-1",
+        "local-build": "1.0-1",
+    }
+
+    with AurClient(url(aur_server), timeout=5, batch_size=2) as client:
+        updates = client.find_updates(installed)
+
+    assert updates == [{"name": "yay", "old_version": "12.4.1-1", "new_version": "12.4.2-1", "repo": "aur"}]
+    assert [names for _, _, names in aur_server.requests] == [
+        ["google-chrome", "local-build"],
+        ["paru", "visual-studio-code-bin"],
+        ["yay"],
+    ]
+    assert {path for path, _, _ in aur_server.requests} == {"/rpc/v5/info"}
+    assert len({address for _, address, _ in aur_server.requests}) == 1
+
+
+def test_client_reconnects_when_the_server_closes_the_connection(aur_server):
+    aur_server.close_after = True
+
+    with AurClient(url(aur_server), timeout=5, batch_size=1) as client:
+        info = client.info(["yay", "paru"])
+
+    assert sorted(info) == ["paru", "yay"]
+    assert len({address for _, address, _ in aur_server.requests}) == 2
+
+
+@pytest.mark.parametrize("status,error,message", [
+    (503, None, "HTTP 503"),
+    (200, "Too many package results.", "Too many package results."),
+])
+def test_rpc_failures_raise(aur_server, status, error, message):
+    aur_server.status = status
+    aur_server.error = error
+
+    with AurClient(url(aur_server), timeout=5) as client:
+        with pytest.raises(AurRpcError, match=message):
+            client.info(["yay"])
+
+
+def test_unreachable_rpc_raises():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    with AurClient(f"http://127.0.0.1:{port}/rpc", timeout=2) as client:
+        with pytest.raises(AurRpcError):
+            client.info(["yay"])
+
+
+def test_unsupported_url_is_rejected():
+    with pytest.raises(ValueError):
+        AurClient("ftp://aur.archlinux.org/rpc")
+
+
+# pacman -Qm answering with $QM_STDOUT, $QM_STDERR and exit status $QM_STATUS
+PACMAN = """#!/bin/sh
+[ -n "$QM_SLEEP" ] && sleep "$QM_SLEEP"
+printf '%s' "$QM_STDOUT"
+printf '%s' "$QM_STDERR" >&2
+exit "${QM_STATUS:-0}"
+"""
+
+
+@pytest.fixture
+def pacman(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    path = bin_dir / "pacman"
+    path.write_text(PACMAN)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return monkeypatch
+
+
+def test_foreign_packages_against_the_stand_in(aur_server, pacman):
+    pacman.setenv("QM_STDOUT", "yay 12.4.1-1\nlocal-build 1.0-1\n")
+
+    assert foreign_packages(5) == {"yay": "12.4.1-1", "local-build": "1.0-1"}
+    assert check_aur_rpc_updates(url(aur_server), 5) == (1, ["yay 12.4.1-1 -> 12.4.2-1"])
+
+
+def test_no_foreign_packages_is_not_an_error(aur_server, pacman):
+    pacman.setenv("QM_STATUS", "1")
+
+    assert foreign_packages(5) == {}
+    assert check_aur_rpc_updates(url(aur_server), 5) == (0, [])
+    assert aur_server.requests == []
+
+
+@pytest.mark.parametrize(
+    "env, message",
+    [
+        ({"QM_STATUS": "1", "QM_STDERR": "error: failed to initialize alpm library"}, "failed to initialize"),
+        ({"QM_STATUS": "2"}, "exit status 2"),
+        ({"QM_SLEEP": "2"}, "timed out"),
+        ({"PATH": "/nonexistent"}, "Could not list foreign packages"),
+    ],
+)
+def test_foreign_package_failures_raise(aur_server, pacman, env, message):
+    for name, value in env.items():
+        pacman.setenv(name, value)
+
+    with pytest.raises(AurRpcError, match=message):
+        check_aur_rpc_updates(url(aur_server), 0.5)
+    assert aur_server.requests == []
@@ -0,0 +1,43 @@
+"""Tests for the concurrent check engine"""
+
+import threading
+
+from check_engine import build_counts, run_checks
+
+
+def test_stragglers_do_not_write_durations_after_the_deadline():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return 1, ["late 1 -> 2"]
+
+    durations = {}
+    results, errors = run_checks({"fast": lambda: (0, []), "slow": slow}, 0.2, durations=durations)
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name.startswith("update-check"):
+            thread.join(5)
+
+    assert list(results) == ["fast"]
+    assert errors == {"slow": "timed out after 0.2s"}
+    assert list(durations) == ["fast"]
+
+
+def test_failed_checks_are_reported_and_timed():
+    def broken():
+        raise RuntimeError("exit status 1")
+
+    durations = {}
+    results, errors = run_checks({"broken": broken}, 5, durations=durations)
+
+    assert results == {}
+    assert errors == {"broken": "exit status 1"}
+    assert list(durations) == ["broken"]
+
+
+def test_build_counts_counts_the_aur_once():
+    counts = build_counts({"pacman": 3, "yay": 2, "paru": 1, "flatpak": 4})
+
+    assert counts["total"] == 9
+    assert counts["aur"] == 0
@@ -0,0 +1,139 @@
+"""Tests for per-backend TTLs, backoff and error state"""
+
+import json
+
+import pytest
+
+import backends
+from check_schedule import (
+    MAX_BACKOFF,
+    MAX_TTL_FACTOR,
+    RETRY_INTERVAL,
+    is_due,
+    load_state,
+    next_check,
+    record_failure,
+    record_success,
+    record_unavailable,
+    source_errors,
+)
+from update_checker import ArchUpdateChecker
+
+NOW = 1_760_000_000.0
+
+
+def test_unchanged_results_stretch_the_ttl_up_to_the_cap():
+    state = {}
+    delays = []
+    for _ in range(5):
+        state = record_success(state, 600, NOW, changed=False)
+        delays.append(state["next"] - NOW)
+
+    assert delays == [1200, 2400, 2400, 2400, 2400]
+    assert MAX_TTL_FACTOR * 600 == 2400
+    assert state["streak"] == 5
+
+    # New results go back to the plain TTL
+    state = record_success(state, 600, NOW, changed=True)
+    assert (state["next"] - NOW, state["streak"]) == (600, 0)
+
+
+def test_failures_back_off_exponentially_up_to_the_caps():
+    state = record_success({}, 7200, NOW - 100, changed=True)
+    delays = []
+    for failure in range(8):
+        state = record_failure(state, 7200, NOW, f"timeout {failure}")
+        delays.append(state["next"] - NOW)
+
+    assert delays[:3] == [RETRY_INTERVAL, 2 * RETRY_INTERVAL, 4 * RETRY_INTERVAL]
+    assert max(delays) == MAX_BACKOFF
+    # The last good check and its streak survive the failures
+    assert (state["checked"], state["failures"], state["error"]) == (NOW - 100, 8, "timeout 7")
+
+    # A short TTL caps the backoff below MAX_BACKOFF
+    short = record_failure({"failures": 10}, 300, NOW, "timeout")
+    assert short["next"] - NOW == 300
+
+    recovered = record_success(state, 7200, NOW, changed=False)
+    assert (recovered["failures"], recovered["error"]) == (0, None)
+
+
+def test_due_and_next_check():
+    sources = {
+        "pacman": record_success({}, 600, NOW, changed=True),
+        "flatpak": record_unavailable(3600, NOW),
+        "yay": "garbage from an old cache",
+    }
+
+    assert load_state(sources["yay"]) == {}
+    assert is_due(load_state(sources["yay"]), NOW)
+    assert not is_due(sources["pacman"], NOW + 599)
+    assert is_due(sources["pacman"], NOW + 600)
+    # A malformed entry is due at once, so the whole cache is
+    assert next_check(sources) == 0
+    del sources["yay"]
+    assert next_check(sources) == NOW + 600
+    assert next_check({}) == 0
+
+
+def test_source_errors_lists_only_failing_backends():
+    sources = {
+        "pacman": record_success({}, 600, NOW, changed=True),
+        "yay": record_failure({}, 600, NOW, "aur.archlinux.org timed out"),
+        "paru": None,
+    }
+
+    assert source_errors(sources) == {"yay": "aur.archlinux.org timed out"}
+
+
+class FlakyBackend(backends.UpdateBackend):
+    name = "yay"
+    outcomes = []
+
+    def check(self, timeout=None):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return len(outcome), outcome
+
+
+@pytest.fixture
+def checker(monkeypatch, tmp_path):
+    monkeypatch.setitem(backends.BACKENDS, "yay", FlakyBackend)
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({
+        "update_settings": {
+            "check_interval": 600,
+            "check_timeout": 30,
+            "package_managers": ["yay"],
+            "cache_dir": str(tmp_path / "cache"),
+            "pacman_log": str(tmp_path / "pacman.log"),
+            "journal": {"enabled": False},
+            "history": {"enabled": False},
+        }
+    }))
+    return ArchUpdateChecker(str(config))
+
+
+def test_checker_keeps_the_last_result_through_failures(checker, monkeypatch):
+    FlakyBackend.outcomes = [
+        ["yay 12.4.1-1 -> 12.4.2-1"],
+        backends.BackendError("aur.archlinux.org timed out"),
+        ["yay 12.4.1-1 -> 12.4.2-1"],
+    ]
+
+    assert checker.check_all_updates(force=True)["yay"] == 1
+    first = checker.cache.load()["sources"]["yay"]
+
+    # A failure keeps the last count instead of reporting zero and retries soon
+    assert checker.check_all_updates(force=True)["yay"] == 1
+    failed = checker.cache.load()["sources"]["yay"]
+    assert failed["error"] == "aur.archlinux.org timed out"
+    assert failed["next"] - failed["checked"] < first["next"] - first["checked"]
+    assert checker.cache.load_fresh(["yay"]) is not None
+
+    # The same result again doubles the TTL
+    checker.check_all_updates(force=True)
+    recovered = checker.cache.load()["sources"]["yay"]
+    assert (recovered["error"], recovered["streak"]) == (None, 1)
+    assert recovered["next"] - recovered["checked"] == 1200
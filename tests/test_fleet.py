@@ -0,0 +1,91 @@
+"""Tests for fleet check mode"""
+
+import csv
+import io
+import json
+import subprocess
+import time
+
+import fleet
+
+
+class FakeTransport:
+    """In-process stand-in for SshTransport answering from canned per-host replies"""
+
+    def __init__(self, replies, delays=None):
+        self.replies = replies
+        self.delays = delays or {}
+        self.calls = []
+
+    def run(self, host, command, timeout):
+        self.calls.append((host, command))
+        delay = self.delays.get(host, 0)
+        if delay > timeout:
+            time.sleep(timeout)
+            raise subprocess.TimeoutExpired(command, timeout)
+        time.sleep(delay)
+        return self.replies.get(host, (255, "", f"ssh: Could not resolve hostname {host}"))
+
+
+def status_reply(details, sources=None):
+    counts = {"pacman": len(details), "total": len(details)}
+    return 0, json.dumps({"counts": counts, "details": details, "sources": sources or {}}), ""
+
+
+def record(name, new_version, repo="core"):
+    return {"name": name, "old_version": "1-1", "new_version": new_version, "source": "pacman", "repo": repo}
+
+
+def write_hosts(tmp_path):
+    hosts_file = tmp_path / "hosts"
+    hosts_file.write_text("alpha\nbeta  # build box\n\nalpha\ngamma\ndelta\nepsilon\n")
+    return hosts_file
+
+
+def test_report_aggregates_hosts_and_packages(tmp_path):
+    transport = FakeTransport(
+        {
+            "alpha": status_reply([record("linux", "6.11.2-1"), record("mesa", "24.2.4-1", "extra")]),
+            "beta": status_reply([record("linux", "6.11.3-1")]),
+            "gamma": status_reply([], {"aur": {"status": "error", "error": "timeout"}}),
+            "delta": (0, "not json", ""),
+            "epsilon": (0, status_reply([])[1], ""),
+        },
+        delays={"epsilon": 5},
+    )
+    settings = {"fleet": {"host_timeout": 0.2, "remote_command": "status"}}
+
+    report = json.loads(fleet.run_fleet(write_hosts(tmp_path), settings, transport=transport))
+
+    assert sorted(transport.calls) == [(host, "status") for host in ("alpha", "beta", "delta", "epsilon", "gamma")]
+    hosts = {host["host"]: host for host in report["hosts"]}
+    assert [host["host"] for host in report["hosts"]] == ["alpha", "beta", "gamma", "delta", "epsilon"]
+    assert hosts["alpha"]["status"] == "ok" and hosts["alpha"]["total"] == 2
+    assert hosts["gamma"]["status"] == "partial"
+    assert hosts["gamma"]["error"] == "failed sources: aur"
+    assert hosts["delta"]["status"] == "error"
+    assert hosts["epsilon"]["status"] == "timeout"
+    assert report["summary"] == {
+        "hosts": 5,
+        "ok": 2,
+        "failed": 2,
+        "hosts_with_updates": 2,
+        "total_updates": 3,
+        "distinct_packages": 2,
+    }
+    linux = report["packages"][0]
+    assert linux["name"] == "linux"
+    assert linux["host_count"] == 2
+    assert linux["versions"] == ["6.11.2-1", "6.11.3-1"]
+
+
+def test_unreachable_host_reports_ssh_error(tmp_path):
+    hosts_file = tmp_path / "hosts"
+    hosts_file.write_text("offline\n")
+
+    output = fleet.run_fleet(hosts_file, {}, output_format="csv", transport=FakeTransport({}))
+
+    rows = list(csv.reader(io.StringIO(output)))
+    assert rows[0][:3] == ["scope", "name", "status"]
+    assert rows[1][:3] == ["host", "offline", "error"]
+    assert rows[1][-1] == "ssh: Could not resolve hostname offline"
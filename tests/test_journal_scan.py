@@ -0,0 +1,125 @@
+"""Tests for the incremental journal scanner, replaying recorded journalctl exports"""
+
+import json
+
+import pytest
+
+from journal_scan import DEFAULT_SETTINGS, JournalScanner, format_group, merge_entries, parse_journal_output
+
+
+def entry(cursor, seconds, message, unit="sshd.service", **fields):
+    return {
+        "__CURSOR": cursor,
+        "__REALTIME_TIMESTAMP": str(seconds * 1000000),
+        "PRIORITY": "3",
+        "_SYSTEMD_UNIT": unit,
+        "MESSAGE": message,
+        **fields,
+    }
+
+
+def write_export(path, entries):
+    # The shape of `journalctl -o json --show-cursor` output
+    lines = [json.dumps(e) for e in entries] or ["-- No entries --"]
+    if entries:
+        lines.append(f"-- cursor: {entries[-1]['__CURSOR']}")
+    path.write_text("\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def export(tmp_path):
+    return tmp_path / "journal.json"
+
+
+def scanner(tmp_path, export, **settings):
+    return JournalScanner(tmp_path / "state", {**DEFAULT_SETTINGS, **settings}, recording=str(export))
+
+
+def test_replay_groups_repeated_errors(tmp_path, export):
+    write_export(export, [
+        entry("c1", 100, "error: kex_exchange_identification"),
+        entry("c2", 101, "Failed to start backup", unit="backup.service"),
+        entry("c3", 102, "error: kex_exchange_identification"),
+    ])
+
+    groups = scanner(tmp_path, export).scan()
+
+    assert [format_group(group) for group in groups] == [
+        "2x sshd.service: error: kex_exchange_identification",
+        "backup.service: Failed to start backup",
+    ]
+    assert groups[0]["first_seen"] == 100 and groups[0]["last_seen"] == 102
+
+
+def test_rescans_resume_after_the_saved_cursor(tmp_path, export):
+    records = [entry(f"c{i}", 100 + i, f"error {i}", unit=f"unit{i}.service") for i in range(5)]
+    write_export(export, records)
+    journal = scanner(tmp_path, export, initial_entries=2)
+
+    assert [group["message"] for group in journal.scan()] == ["error 4", "error 3"]
+    assert journal.load()["cursor"] == "c4"
+
+    # Nothing new: the groups stay pending and are not counted twice
+    assert journal.new_error_count() == 2
+    journal.scan()
+    assert journal.new_error_count() == 2
+
+    write_export(export, records + [entry("c5", 200, "error 3", unit="unit3.service")])
+    groups = journal.scan()
+    assert [(group["message"], group["count"]) for group in groups] == [("error 3", 2), ("error 4", 1)]
+    assert journal.load()["cursor"] == "c5"
+
+
+def test_acknowledged_groups_return_only_when_they_recur(tmp_path, export):
+    records = [entry("c1", 100, "disk error", unit="kernel"), entry("c2", 101, "oom", unit="earlyoom.service")]
+    write_export(export, records)
+    journal = scanner(tmp_path, export)
+
+    journal.acknowledge(journal.scan())
+    assert journal.pending() == []
+
+    write_export(export, records + [entry("c3", 150, "disk error", unit="kernel")])
+    assert [(group["unit"], group["count"]) for group in journal.scan()] == [("kernel", 1)]
+
+
+def test_byte_array_fields_and_missing_units():
+    lines = [
+        json.dumps({"__CURSOR": "k1", "__REALTIME_TIMESTAMP": "1", "_TRANSPORT": "kernel",
+                    "MESSAGE": list(b"ata1: failed command \xff")}),
+        "-- cursor: k1",
+    ]
+
+    entries, cursor = parse_journal_output(lines)
+
+    merged = merge_entries([], entries, 10)
+    assert cursor == "k1"
+    assert merged[0]["unit"] == "kernel"
+    assert merged[0]["message"] == "ata1: failed command �"
+
+
+def test_disabled_scanner_reads_nothing(tmp_path, export):
+    write_export(export, [entry("c1", 100, "error")])
+
+    assert scanner(tmp_path, export, enabled=False).scan() == []
+    assert not (tmp_path / "state").exists()
+
+
+def test_invalid_cursor_falls_back_to_a_rescan(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    journalctl = bin_dir / "journalctl"
+    journalctl.write_text(
+        "#!/bin/sh\n"
+        'case "$*" in *--after-cursor*) echo "Failed to seek to cursor" >&2; exit 1;; esac\n'
+        f"cat {tmp_path / 'export.json'}\n"
+    )
+    journalctl.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    write_export(tmp_path / "export.json", [entry("c9", 300, "error after vacuum")])
+    journal = JournalScanner(tmp_path / "state", DEFAULT_SETTINGS, recording="")
+    journal._update(lambda state: dict(state, cursor="vacuumed"))
+
+    groups = journal.scan()
+
+    assert [group["message"] for group in groups] == ["error after vacuum"]
+    assert journal.load()["cursor"] == "c9"
@@ -0,0 +1,137 @@
+"""Tests for the shared LAN cache server and its sync DB and AUR clients"""
+
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from email.utils import formatdate
+
+import pytest
+
+from aur_rpc import AurClient, AurRpcError
+from lan_cache import ETAG_FILE, CacheServer, LanCacheError, fetch_sync_dbs, file_etag, lan_aur_rpc_url, not_modified
+
+MTIME = 1_760_000_000
+
+
+def publish(sync_dir, name, data, mtime=MTIME):
+    path = sync_dir / name
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def lan(tmp_path, aur_server):
+    cache = CacheServer(tmp_path / "server", aur_rpc_url=f"http://127.0.0.1:{aur_server.server_address[1]}/rpc/")
+    cache.sync_dir.mkdir(parents=True)
+    publish(cache.sync_dir, "core.db", b"core v1")
+    publish(cache.sync_dir, "extra.db", b"extra v1")
+    server = cache.http_server("127.0.0.1:0")
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    cache.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield cache
+    server.shutdown()
+    server.server_close()
+
+
+def test_not_modified_prefers_if_none_match():
+    etag = '"abc-10"'
+    since = formatdate(MTIME, usegmt=True)
+
+    assert not_modified({"If-None-Match": etag}, etag, MTIME)
+    assert not_modified({"If-None-Match": '"old", ' + etag}, etag, MTIME)
+    assert not_modified({"If-None-Match": "*"}, etag, MTIME)
+    # A mismatching tag wins over a date that would still match
+    assert not not_modified({"If-None-Match": '"old"', "If-Modified-Since": since}, etag, MTIME)
+    assert not_modified({"If-Modified-Since": since}, etag, MTIME + 0.5)
+    assert not not_modified({"If-Modified-Since": since}, etag, MTIME + 1)
+    assert not not_modified({"If-Modified-Since": "yesterday"}, etag, MTIME)
+    assert not not_modified({}, etag, MTIME)
+
+
+def test_index_lists_served_dbs(lan):
+    with urllib.request.urlopen(f"{lan.url}/sync/") as response:
+        index = json.load(response)
+
+    assert sorted(index) == ["core", "extra"]
+    assert index["core"]["etag"] == file_etag((lan.sync_dir / "core.db").stat())
+
+
+@pytest.mark.parametrize("path", ["/sync/.lan-etags.json", "/sync/..%2Fcore.db", "/sync/missing.db", "/other"])
+def test_only_listed_dbs_are_served(lan, path):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"{lan.url}{path}")
+    assert error.value.code == 404
+
+
+def test_unchanged_dbs_are_answered_with_304(lan, tmp_path):
+    sync_dir = tmp_path / "client" / "sync"
+
+    assert fetch_sync_dbs(lan.url, sync_dir, ["core", "extra"], timeout=5) == 2
+    core = sync_dir / "core.db"
+    assert core.read_bytes() == b"core v1"
+    # The server's Last-Modified is mirrored, so the next If-Modified-Since matches
+    assert core.stat().st_mtime == MTIME
+    etags = json.loads((sync_dir / ETAG_FILE).read_text())
+    assert etags == {name: file_etag((lan.sync_dir / name).stat()) for name in ("core.db", "extra.db")}
+
+    before = core.stat()
+    assert fetch_sync_dbs(lan.url, sync_dir, ["core", "extra"], timeout=5) == 0
+    after = core.stat()
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+
+def test_changed_etag_replaces_the_db_atomically(lan, tmp_path):
+    sync_dir = tmp_path / "client" / "sync"
+    fetch_sync_dbs(lan.url, sync_dir, ["core", "extra"], timeout=5)
+    inode = (sync_dir / "core.db").stat().st_ino
+    # Same size and second as before: only the nanosecond mtime in the ETag differs
+    publish(lan.sync_dir, "core.db", b"core v2", MTIME + 0.25)
+
+    assert fetch_sync_dbs(lan.url, sync_dir, ["core", "extra"], timeout=5) == 1
+    assert (sync_dir / "core.db").read_bytes() == b"core v2"
+    assert (sync_dir / "core.db").stat().st_ino != inode
+    assert json.loads((sync_dir / ETAG_FILE).read_text())["core.db"] == file_etag((lan.sync_dir / "core.db").stat())
+    assert sorted(p.name for p in sync_dir.iterdir()) == [ETAG_FILE, "core.db", "extra.db"]
+
+
+def test_missing_repo_is_skipped_with_a_warning(lan, tmp_path, capsys):
+    assert fetch_sync_dbs(lan.url, tmp_path / "sync", ["core", "multilib"], timeout=5) == 1
+    assert "multilib" in capsys.readouterr().err
+
+
+def test_unreachable_server_raises(tmp_path):
+    with pytest.raises(LanCacheError):
+        fetch_sync_dbs("http://127.0.0.1:9", tmp_path / "sync", ["core"], timeout=1)
+
+
+def test_aur_proxy_asks_upstream_once_per_package(lan, aur_server):
+    with AurClient(lan_aur_rpc_url(lan.url), timeout=5) as client:
+        assert sorted(client.info(["yay", "not-in-aur"])) == ["yay"]
+        assert sorted(client.info(["yay", "not-in-aur", "paru"])) == ["paru", "yay"]
+
+    # Misses are cached too, and only the new name went upstream the second time
+    assert [names for _, _, names in aur_server.requests] == [["yay", "not-in-aur"], ["paru"]]
+
+    with urllib.request.urlopen(f"{lan_aur_rpc_url(lan.url)}/v5/info?arg[]=yay") as response:
+        assert json.load(response)["results"][0]["Version"] == "12.4.2-1"
+    assert len(aur_server.requests) == 2
+
+
+def test_aur_proxy_refetches_expired_entries(lan, aur_server):
+    lan.aur_ttl = -1
+    with AurClient(lan_aur_rpc_url(lan.url), timeout=5) as client:
+        client.info(["yay"])
+        client.info(["yay"])
+
+    assert len(aur_server.requests) == 2
+
+
+def test_aur_proxy_reports_upstream_failures(lan, aur_server):
+    aur_server.status = 503
+
+    with AurClient(lan_aur_rpc_url(lan.url), timeout=5) as client:
+        with pytest.raises(AurRpcError, match="HTTP 502"):
+            client.info(["yay"])
@@ -0,0 +1,152 @@
+"""Tests for the incrementally updated SQLite package index"""
+
+import os
+
+import pytest
+
+import package_index
+from package_index import PackageIndex, add_repo_details, query_repo_updates
+
+from .test_pacman_db import write_local_db, write_sync_db
+
+pytest.importorskip("sqlite3")
+
+
+@pytest.fixture
+def db(tmp_path):
+    write_local_db(tmp_path / "local", [
+        ("linux", "6.11.1.arch1-1", 149000000),
+        ("mesa", "1:24.2.3-1", 90000000),
+        ("yay", "12.4.2-1", 9000000),
+    ])
+    write_sync_db(tmp_path / "sync" / "core.db", [("linux", "6.11.2.arch1-1", 140000000, 150000000)])
+    write_sync_db(tmp_path / "sync" / "extra.db", [("mesa", "1:24.2.4-1", 29000000, 90500000)])
+    (tmp_path / "pacman.conf").write_text("[options]\n\n[core]\n\n[extra]\n")
+    return tmp_path
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Record which sync DBs and local entries the index actually parses"""
+    seen = {"sync": [], "local": []}
+    read_sync_db = package_index.read_sync_db
+    read_local_entry = package_index.read_local_entry
+
+    def sync(path, repo=None):
+        seen["sync"].append(path.name)
+        return read_sync_db(path, repo)
+
+    def local(path):
+        seen["local"].append(os.path.basename(path))
+        return read_local_entry(path)
+
+    monkeypatch.setattr(package_index, "read_sync_db", sync)
+    monkeypatch.setattr(package_index, "read_local_entry", local)
+    return seen
+
+
+def open_index(db):
+    return PackageIndex(db / "index.sqlite", db / "sync", db / "local", db / "pacman.conf")
+
+
+def pending(index):
+    return [(u["name"], u["new_version"], u["repo"]) for u in index.pending_updates()]
+
+
+def republish(db_file, packages, later=10):
+    mtime = db_file.stat().st_mtime
+    db_file.unlink()
+    write_sync_db(db_file, packages)
+    os.utime(db_file, (mtime + later, mtime + later))
+
+
+def test_first_update_reads_everything_and_the_next_nothing(db, reads):
+    with open_index(db) as index:
+        assert index.update()
+        assert sorted(reads["sync"]) == ["core.db", "extra.db"]
+        assert len(reads["local"]) == 3
+        assert pending(index) == [("linux", "6.11.2.arch1-1", "core"), ("mesa", "1:24.2.4-1", "extra")]
+        assert index.foreign_packages() == {"yay": "12.4.2-1"}
+
+    reads["sync"].clear()
+    reads["local"].clear()
+    # The index survives the process, so a new one starts where the last left off
+    with open_index(db) as index:
+        assert not index.update()
+        assert reads == {"sync": [], "local": []}
+        assert len(index.pending_updates()) == 2
+
+
+def test_only_changed_sync_dbs_are_reparsed(db, reads):
+    with open_index(db) as index:
+        index.update()
+        reads["sync"].clear()
+
+        republish(db / "sync" / "extra.db", [("mesa", "1:24.2.5-1", 29000000, 90600000)])
+
+        assert index.update()
+        assert reads["sync"] == ["extra.db"]
+        assert pending(index)[-1] == ("mesa", "1:24.2.5-1", "extra")
+
+
+def test_only_new_local_entries_are_read(db, reads):
+    with open_index(db) as index:
+        index.update()
+        reads["local"].clear()
+
+        # pacman -Syu replaced linux's local DB entry
+        (db / "local" / "linux-6.11.1.arch1-1" / "desc").unlink()
+        (db / "local" / "linux-6.11.1.arch1-1" / "files").unlink()
+        (db / "local" / "linux-6.11.1.arch1-1").rmdir()
+        write_local_db(db / "local", [("linux", "6.11.2.arch1-1", 150000000)])
+
+        assert index.update()
+        assert reads["local"] == ["linux-6.11.2.arch1-1"]
+        assert pending(index) == [("mesa", "1:24.2.4-1", "extra")]
+        assert index.package_details("linux")["local_version"] == "6.11.2.arch1-1"
+
+
+def test_repo_order_and_removed_repos_apply_without_reparsing(db, reads):
+    write_sync_db(db / "sync" / "testing.db", [("mesa", "1:24.3.0-1", 30000000, 91000000)])
+    (db / "pacman.conf").write_text("[options]\n\n[core]\n\n[extra]\n\n[testing]\n")
+    with open_index(db) as index:
+        index.update()
+        assert pending(index)[-1] == ("mesa", "1:24.2.4-1", "extra")
+        reads["sync"].clear()
+
+        (db / "pacman.conf").write_text("[options]\n\n[testing]\n\n[core]\n\n[extra]\n")
+        assert not index.update()
+        assert reads["sync"] == []
+        assert pending(index)[-1] == ("mesa", "1:24.3.0-1", "testing")
+
+        (db / "sync" / "testing.db").unlink()
+        assert index.update()
+        assert pending(index)[-1] == ("mesa", "1:24.2.4-1", "extra")
+        assert index.package_details("mesa")["repo"] == "extra"
+        assert index.package_details("not-installed") is None
+
+
+def test_add_repo_details_fills_matching_pacman_records(db, monkeypatch):
+    # The checker passes only the sync dir; the rest points at the fixture instead of /var/lib/pacman
+    monkeypatch.setattr(
+        package_index, "PackageIndex", lambda path, sync_dir: PackageIndex(path, sync_dir, db / "local", db / "pacman.conf")
+    )
+    records = [
+        {"name": "linux", "new_version": "6.11.2.arch1-1", "source": "pacman", "repo": None},
+        {"name": "mesa", "new_version": "1:24.2.3-9", "source": "pacman", "repo": None},
+        {"name": "yay", "new_version": "12.4.3-1", "source": "yay", "repo": "aur"},
+    ]
+
+    add_repo_details(records, db / "index.sqlite", db / "sync")
+
+    assert (records[0]["repo"], records[0]["download_size"]) == ("core", 140000000)
+    # A version the index does not know is left alone
+    assert records[1]["repo"] is None
+    assert records[2]["repo"] == "aur"
+
+
+def test_unusable_index_reports_none(db, capsys):
+    (db / "index.sqlite").write_bytes(b"not a database" * 100)
+
+    assert query_repo_updates(db / "index.sqlite", db / "sync") is None
+    assert "unavailable" in capsys.readouterr().err
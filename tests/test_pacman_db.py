@@ -0,0 +1,161 @@
+"""Tests for the native pacman database reader"""
+
+import io
+import shutil
+import subprocess
+import tarfile
+
+import pytest
+
+import pacman_db
+from pacman_db import compute_updates, find_repo_updates, parse_desc, read_local_db, read_sync_db, vercmp
+
+# Mostly taken from pacman's test/util/vercmptest.sh
+VERCMP_CASES = [
+    ("1.5.0", "1.5.0", 0),
+    ("1.5.1", "1.5.0", 1),
+    ("1.5.1", "1.5", 1),
+    ("1.5.0-1", "1.5.0-1", 0),
+    ("1.5.0-1", "1.5.0-2", -1),
+    ("1.5.0-1", "1.5.1-1", -1),
+    ("1.5.0-2", "1.5.1-1", -1),
+    ("1.5-1", "1.5", 0),
+    ("1.1-1", "1.1", 0),
+    ("1.0-1", "1.1", -1),
+    ("1.1-1", "1.0", 1),
+    ("1.5b-1", "1.5-1", -1),
+    ("1.5b", "1.5", -1),
+    ("1.5b-1", "1.5", -1),
+    ("1.5b", "1.5.1", -1),
+    ("1.0a", "1.0alpha", -1),
+    ("1.0alpha", "1.0b", -1),
+    ("1.0b", "1.0beta", -1),
+    ("1.0beta", "1.0rc", -1),
+    ("1.0rc", "1.0", -1),
+    ("1.5.a", "1.5", 1),
+    ("1.5.b", "1.5.a", 1),
+    ("1.5.1", "1.5.b", 1),
+    ("1.5.b-1", "1.5.b", 0),
+    ("1.5-1", "1.5.b", -1),
+    ("0:1.0", "1.0", 0),
+    ("0:1.0", "0:1.1", -1),
+    ("1:1.0", "0:1.0", 1),
+    ("1:1.0", "2.0", 1),
+    ("1.1.1-1", "1.1.1-1.1", -1),
+    ("1.0", "1.0.0", -1),
+    ("1.0.", "1.0", 1),
+    ("1.0", "1.0.a", -1),
+    ("1.0.1", "1.0.a", 1),
+    ("1.0.a", "1.0.b", -1),
+    ("2.0.0", "2.0.0a", 1),
+    ("1:6.11.1.arch1-1", "6.12.0.arch1-1", 1),
+]
+
+
+@pytest.mark.parametrize("a,b,expected", VERCMP_CASES)
+def test_vercmp(a, b, expected):
+    assert vercmp(a, b) == expected
+    assert vercmp(b, a) == -expected
+
+
+@pytest.mark.skipif(not shutil.which("vercmp"), reason="pacman's vercmp is not installed")
+@pytest.mark.parametrize("a,b,expected", VERCMP_CASES)
+def test_vercmp_matches_pacman(a, b, expected):
+    result = subprocess.run(["vercmp", a, b], capture_output=True, text=True, check=True)
+    assert int(result.stdout) == vercmp(a, b)
+
+
+def desc(name, version, **sizes):
+    text = f"%NAME%\n{name}\n\n%VERSION%\n{version}\n\n%DESC%\nA package\nwith two lines\n\n"
+    for key, value in sizes.items():
+        text += f"%{key}%\n{value}\n\n"
+    return text
+
+
+def write_local_db(local_dir, packages):
+    for name, version, isize in packages:
+        entry = local_dir / f"{name}-{version}"
+        entry.mkdir(parents=True)
+        (entry / "desc").write_text(desc(name, version, SIZE=isize))
+        (entry / "files").write_text("%FILES%\nusr/\n")
+
+
+def write_sync_db(db_file, packages):
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(db_file, "w:gz") as archive:
+        for name, version, csize, isize in packages:
+            data = desc(name, version, CSIZE=csize, ISIZE=isize).encode()
+            member = tarfile.TarInfo(f"{name}-{version}/desc")
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+
+
+def test_parse_desc_keeps_multiline_fields():
+    fields = parse_desc(desc("linux", "6.11.1.arch1-1", CSIZE=100))
+
+    assert fields["NAME"] == ["linux"]
+    assert fields["DESC"] == ["A package", "with two lines"]
+    assert fields["CSIZE"] == ["100"]
+
+
+def test_read_sync_db_archive(tmp_path):
+    write_sync_db(tmp_path / "core.db", [("linux", "6.11.2.arch1-1", 140000000, 150000000)])
+    (tmp_path / "broken.db").write_bytes(b"not an archive")
+
+    packages = read_sync_db(tmp_path / "core.db")
+
+    assert packages == {
+        "linux": {"name": "linux", "version": "6.11.2.arch1-1", "repo": "core", "csize": 140000000, "isize": 150000000}
+    }
+    assert read_sync_db(tmp_path / "broken.db") == {}
+
+
+def test_updates_follow_repository_priority(tmp_path):
+    write_local_db(tmp_path / "local", [
+        ("linux", "6.11.1.arch1-1", 149000000),
+        ("mesa", "1:24.2.3-1", 90000000),
+        ("yay", "12.4.2-1", 9000000),
+        ("bash", "5.2.037-1", 9000000),
+    ])
+    private = tmp_path / "private"
+    write_sync_db(private / "sync" / "testing.db", [("mesa", "1:24.3.0-1", 30000000, 91000000)])
+    write_sync_db(private / "sync" / "core.db", [
+        ("linux", "6.11.2.arch1-1", 140000000, 150000000),
+        ("bash", "5.2.037-1", 2000000, 9000000),
+    ])
+    write_sync_db(private / "sync" / "extra.db", [("mesa", "1:24.2.4-1", 29000000, 90500000)])
+    conf = tmp_path / "pacman.conf"
+    conf.write_text("[options]\nParallelDownloads = 5\n\n[core]\nInclude = x\n\n[extra]\nInclude = x\n")
+
+    updates = find_repo_updates(private, tmp_path / "local", conf)
+
+    # testing is not configured, so it comes last and extra's mesa wins
+    assert updates == [
+        {
+            "name": "linux",
+            "old_version": "6.11.1.arch1-1",
+            "new_version": "6.11.2.arch1-1",
+            "repo": "core",
+            "download_size": 140000000,
+            "installed_size_delta": 1000000,
+        },
+        {
+            "name": "mesa",
+            "old_version": "1:24.2.3-1",
+            "new_version": "1:24.2.4-1",
+            "repo": "extra",
+            "download_size": 29000000,
+            "installed_size_delta": 500000,
+        },
+    ]
+    assert pacman_db.parallel_downloads(conf) == 5
+    assert pacman_db.foreign_packages(
+        read_local_db(tmp_path / "local"), [read_sync_db(p) for p in (private / "sync").glob("*.db")]
+    ) == {"yay": "12.4.2-1"}
+
+
+def test_downgrade_in_sync_db_is_not_an_update():
+    local = {"linux": {"name": "linux", "version": "6.11.2.arch1-1", "isize": 0}}
+    sync = {"linux": {"name": "linux", "version": "6.11.1.arch1-1", "repo": "core", "csize": 0, "isize": 0}}
+
+    assert compute_updates(local, [sync]) == []
@@ -0,0 +1,130 @@
+"""Tests for the incremental pacman.log reader"""
+
+import os
+
+import pytest
+
+from pacman_log import PacmanLogReader, TransactionLog, parse_log_line
+
+
+def transaction(minute, *actions, command="pacman -Syu"):
+    stamp = f"[2026-10-16T09:{minute:02d}:00+0200]"
+    lines = [
+        f"{stamp} [PACMAN] Running '{command}'",
+        f"{stamp} [ALPM] transaction started",
+    ]
+    for action in actions:
+        lines.append(f"{stamp} [ALPM] {action}")
+        lines.append(f"{stamp} [ALPM-SCRIPTLET] ==> Running hook output")
+    lines.append(f"{stamp} [ALPM] transaction completed")
+    return "".join(line + "\n" for line in lines)
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "pacman.log"
+    path.write_text(transaction(0, "upgraded bash (5.2.036-1 -> 5.2.037-1)"))
+    return path
+
+
+def names(transactions):
+    return [[action["name"] for action in t["actions"]] for t in transactions]
+
+
+def test_parse_log_line_formats():
+    upgraded = parse_log_line("[2026-10-16T09:12:44+0200] [ALPM] upgraded linux (6.11.1.arch1-1 -> 6.11.2.arch1-1)")
+    installed = parse_log_line("[2019-05-01 10:00] [ALPM] installed yay (9.2.0-1)")
+    removed = parse_log_line("[2026-10-16T09:12:44+0200] [ALPM] removed xterm (395-1)")
+
+    assert (upgraded["old_version"], upgraded["new_version"]) == ("6.11.1.arch1-1", "6.11.2.arch1-1")
+    assert (installed["old_version"], installed["new_version"]) == ("", "9.2.0-1")
+    assert (removed["old_version"], removed["new_version"]) == ("395-1", "")
+    assert parse_log_line("[2026-10-16T09:12:44+0200] [ALPM-SCRIPTLET] upgraded x (1 -> 2)") is None
+
+
+def test_reads_resume_from_the_checkpoint(log_file):
+    reader = PacmanLogReader(log_file)
+    assert names(reader.transactions({})) == [["bash"]]
+    checkpoint = reader.checkpoint
+    assert checkpoint == {"inode": log_file.stat().st_ino, "offset": log_file.stat().st_size}
+
+    with open(log_file, "a") as f:
+        f.write(transaction(5, "upgraded linux (6.11.1.arch1-1 -> 6.11.2.arch1-1)"))
+
+    assert names(reader.transactions(checkpoint)) == [["linux"]]
+    assert names(reader.transactions(reader.checkpoint)) == []
+
+
+def test_running_transaction_and_partial_line_are_read_next_time(log_file):
+    reader = PacmanLogReader(log_file)
+    list(reader.transactions({}))
+    checkpoint = reader.checkpoint
+    pending = transaction(5, "upgraded mesa (1:24.2.3-1 -> 1:24.2.4-1)")
+    head, tail = pending.rsplit("[ALPM] transaction", 1)
+
+    with open(log_file, "a") as f:
+        f.write(head + "[ALPM] transac")
+    assert list(reader.transactions(checkpoint)) == []
+    assert reader.checkpoint == checkpoint
+
+    with open(log_file, "a") as f:
+        f.write("tion" + tail)
+    finished = list(reader.transactions(checkpoint))
+    assert names(finished) == [["mesa"]]
+    assert finished[0]["status"] == "completed"
+    assert finished[0]["command"] == "pacman -Syu"
+
+
+@pytest.mark.parametrize("rotated_name", ["pacman.log.1", "pacman.log-1"])
+def test_rotation_finishes_the_old_file_first(log_file, rotated_name):
+    reader = PacmanLogReader(log_file)
+    list(reader.transactions({}))
+    checkpoint = reader.checkpoint
+
+    with open(log_file, "a") as f:
+        f.write(transaction(5, "upgraded linux (6.11.1.arch1-1 -> 6.11.2.arch1-1)"))
+    os.rename(log_file, log_file.with_name(rotated_name))
+    log_file.write_text(transaction(10, "installed htop (3.3.0-3)", command="pacman -S htop"))
+
+    transactions = list(reader.transactions(checkpoint))
+
+    assert names(transactions) == [["linux"], ["htop"]]
+    assert reader.checkpoint == {"inode": log_file.stat().st_ino, "offset": log_file.stat().st_size}
+
+
+def test_rotated_file_gone_reads_the_new_log_from_the_start(log_file):
+    reader = PacmanLogReader(log_file)
+    list(reader.transactions({}))
+    checkpoint = reader.checkpoint
+    log_file.unlink()
+    log_file.write_text(transaction(10, "removed xterm (395-1)"))
+
+    assert names(reader.transactions(checkpoint)) == [["xterm"]]
+
+
+def test_truncation_restarts_at_the_beginning(log_file):
+    reader = PacmanLogReader(log_file)
+    list(reader.transactions({}))
+    checkpoint = reader.checkpoint
+
+    with open(log_file, "w") as f:
+        f.write(transaction(10, "upgraded zsh (5.9-4 -> 5.9-5)"))
+    assert log_file.stat().st_ino == checkpoint["inode"]
+    assert log_file.stat().st_size < checkpoint["offset"]
+
+    assert names(reader.transactions(checkpoint)) == [["zsh"]]
+
+
+def test_transaction_log_first_read_only_sets_the_checkpoint(tmp_path, log_file):
+    log = TransactionLog(tmp_path / "state", log_file)
+
+    assert log.applied() is None
+    assert log.load()["offset"] == log_file.stat().st_size
+
+    with open(log_file, "a") as f:
+        f.write(transaction(5, "upgraded linux (6.11.1.arch1-1 -> 6.11.2.arch1-1)", "removed xterm (395-1)"))
+    applied = log.applied()
+
+    assert sorted(applied) == ["linux", "xterm"]
+    assert applied["xterm"]["action"] == "removed"
+    assert log.applied() is None
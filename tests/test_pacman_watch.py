@@ -0,0 +1,117 @@
+"""Tests for the pacman watcher's stat polling fallback"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import pacman_watch
+from pacman_watch import PacmanWatcher, installed_versions, pending_updates
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "db"
+    (path / "local" / "linux-6.11.1.arch1-1").mkdir(parents=True)
+    (path / "sync").mkdir()
+    (path / "sync" / "core.db").write_bytes(b"core")
+    return path
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "log" / "pacman.log"
+    path.parent.mkdir()
+    path.write_text("")
+    return path
+
+
+@pytest.fixture
+def watcher(db_path, log_file, monkeypatch):
+    def no_libc(*args, **kwargs):
+        raise OSError("libc not found")
+
+    # Without inotify the watcher has to fall back to comparing stat results
+    monkeypatch.setattr(pacman_watch.ctypes, "CDLL", no_libc)
+    watcher = PacmanWatcher(db_path, log_file, settle=0.05, poll_interval=0.02)
+    assert not watcher.uses_inotify
+    return watcher
+
+
+def bump(path, seconds=10):
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + seconds))
+
+
+def test_nothing_changed_times_out(watcher):
+    started = time.monotonic()
+    assert watcher.wait(0.1) == set()
+    assert time.monotonic() - started >= 0.1
+
+
+def test_sync_install_and_log_changes_are_told_apart(watcher, db_path, log_file):
+    bump(db_path / "sync" / "core.db")
+    assert watcher.wait(1) == {"sync"}
+    # The new snapshot is kept, so the same change is reported once
+    assert watcher.wait(0.05) == set()
+
+    (db_path / "local" / "linux-6.11.2.arch1-1").mkdir()
+    bump(db_path / "local")
+    with open(log_file, "a") as f:
+        f.write("[2026-10-17T09:00:00+0200] [ALPM] upgraded linux (6.11.1.arch1-1 -> 6.11.2.arch1-1)\n")
+    assert watcher.wait(1) == {"local", "log"}
+
+
+def test_new_sync_db_and_rotated_log_are_noticed(watcher, db_path, log_file):
+    (db_path / "sync" / "extra.db").write_bytes(b"extra")
+    assert watcher.wait(1) == {"sync"}
+
+    # Same size, new inode: logrotate moved the old file away
+    log_file.rename(log_file.with_suffix(".log.1"))
+    log_file.write_text("")
+    assert watcher.wait(1) == {"log"}
+
+
+def test_changes_are_held_back_while_a_transaction_runs(watcher, db_path):
+    lock = db_path / "db.lck"
+    lock.write_text("")
+    bump(db_path / "local")
+
+    assert watcher.wait(0.1) == set()
+
+    threading.Timer(0.1, lock.unlink).start()
+    started = time.monotonic()
+    assert watcher.wait(5) == {"local"}
+    assert time.monotonic() - started < 2
+
+
+def test_start_runs_the_callback_until_stopped(watcher, db_path, monkeypatch):
+    # The loop waits 60s per round; a short wait keeps stopping it quick
+    wait = watcher.wait
+    monkeypatch.setattr(watcher, "wait", lambda timeout: wait(0.05))
+    seen = []
+    changed = threading.Event()
+    stop = threading.Event()
+
+    thread = watcher.start(lambda kinds: seen.append(kinds) or changed.set(), stop)
+    bump(db_path / "sync" / "core.db")
+
+    assert changed.wait(5)
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert seen == [{"sync"}]
+
+
+def test_pending_updates_drops_versions_already_installed(db_path):
+    installed = installed_versions(db_path / "local")
+    assert installed == {"linux": "6.11.1.arch1-1"}
+
+    lines = [
+        "linux 6.11.1.arch1-1 -> 6.11.2.arch1-1",
+        "linux 6.11.0.arch1-1 -> 6.11.1.arch1-1",
+        "mesa 24.2.3-1 -> 24.2.4-1",
+        "garbage",
+    ]
+    assert pending_updates(lines, installed) == ["linux 6.11.1.arch1-1 -> 6.11.2.arch1-1"]
@@ -0,0 +1,198 @@
+"""Tests for the Waybar poll snapshot and what invalidates it"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import backends
+import poll_snapshot
+import update_cache
+from poll_snapshot import _poll_config, cached_waybar_output, read_snapshot, snapshot_path, write_snapshot
+from update_checker import ArchUpdateChecker
+
+SRC = Path(poll_snapshot.__file__).parent
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    return tmp_path / "xdg"
+
+
+@pytest.fixture
+def fingerprint(monkeypatch):
+    """A pacman DB fingerprint the test can change, as a sync or install would"""
+    current = {"local": 1.0, "sync/core.db": 1.0}
+    monkeypatch.setattr(poll_snapshot, "pacman_db_fingerprint", lambda: dict(current))
+    monkeypatch.setattr(update_cache, "pacman_db_fingerprint", lambda: dict(current))
+    return current
+
+
+def bump(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def snapshot(tmp_path, fingerprint):
+    config = tmp_path / "config.json"
+    config.write_text("{}")
+    state = tmp_path / "state.json"
+    state.write_text("{}")
+    entry = {"timestamp": time.time(), "fingerprint": dict(fingerprint)}
+    write_snapshot(str(config), {state: poll_snapshot.file_key(state)}, entry, time.time() + 600, '{"text": "3"}')
+    return config, state
+
+
+def test_unchanged_snapshot_is_served(snapshot):
+    config, _ = snapshot
+
+    assert read_snapshot(str(config)) == '{"text": "3"}'
+    assert cached_waybar_output(["--check", f"--config={config}"]) == '{"text": "3"}'
+
+
+def test_config_change_invalidates(snapshot):
+    config, _ = snapshot
+    bump(config)
+
+    assert read_snapshot(str(config)) is None
+
+
+def test_state_file_change_invalidates(snapshot):
+    config, state = snapshot
+    state.write_text('{"cursor": "s=2"}')
+
+    assert read_snapshot(str(config)) is None
+
+
+def test_state_file_appearing_or_vanishing_invalidates(tmp_path, fingerprint):
+    config = tmp_path / "config.json"
+    config.write_text("{}")
+    missing = tmp_path / "runs"
+    entry = {"timestamp": time.time(), "fingerprint": dict(fingerprint)}
+    write_snapshot(str(config), {missing: None}, entry, time.time() + 600, "out")
+    assert read_snapshot(str(config)) == "out"
+
+    missing.mkdir()
+    assert read_snapshot(str(config)) is None
+
+
+def test_pacman_db_change_invalidates(snapshot, fingerprint):
+    config, _ = snapshot
+    fingerprint["local"] = 2.0
+
+    assert read_snapshot(str(config)) is None
+
+
+def test_expired_or_foreign_snapshots_are_ignored(tmp_path, fingerprint):
+    config = tmp_path / "config.json"
+    config.write_text("{}")
+    entry = {"timestamp": time.time(), "fingerprint": dict(fingerprint)}
+
+    write_snapshot(str(config), {}, entry, time.time() - 1, "out")
+    assert read_snapshot(str(config)) is None
+
+    write_snapshot(str(config), {}, {**entry, "timestamp": time.time() + 60}, time.time() + 600, "out")
+    assert read_snapshot(str(config)) is None
+
+    Path(snapshot_path(str(config))).write_bytes(b"not marshal data")
+    assert read_snapshot(str(config)) is None
+
+
+@pytest.mark.parametrize(
+    "argv, config",
+    [
+        ([], ""),
+        (["--check", "--no-daemon"], ""),
+        (["--config", "/etc/bar.json", "--check"], "/etc/bar.json"),
+        (["--config=/etc/bar.json"], "/etc/bar.json"),
+        (["--config"], None),
+        (["--check", "--list"], None),
+        (["--refresh"], None),
+    ],
+)
+def test_only_plain_polls_use_the_snapshot(argv, config):
+    assert _poll_config(argv) == config
+
+
+class OneUpdate(backends.UpdateBackend):
+    name = "pacman"
+
+    def check(self, timeout=None):
+        return 1, ["linux 6.11.1.arch1-1 -> 6.11.2.arch1-1"]
+
+
+@pytest.fixture
+def checker(tmp_path, monkeypatch):
+    monkeypatch.setitem(backends.BACKENDS, "pacman", OneUpdate)
+    config = tmp_path / "update_config.json"
+    config.write_text(json.dumps({
+        "update_settings": {
+            "check_interval": 600,
+            "check_timeout": 30,
+            "package_managers": ["pacman"],
+            "cache_dir": str(tmp_path / "cache"),
+            "pacman_log": str(tmp_path / "pacman.log"),
+            "journal": {"enabled": False},
+            "history": {"enabled": False},
+            "icons": {"no_updates": "ok", "updates_available": "up", "updating": "..", "error": "!"},
+            "colors": {"no_updates": "green", "updates_available": "yellow", "updating": "blue", "error": "red"},
+        }
+    }))
+    return ArchUpdateChecker(str(config))
+
+
+def poll(checker):
+    return cached_waybar_output(["--check", "--config", str(checker.config_path)])
+
+
+def test_checker_output_is_served_until_the_cache_changes(checker, fingerprint):
+    output = checker.get_waybar_output(checker.check_all_updates(force=True))
+    assert poll(checker) == output
+
+    # A new check rewrites the cache file the output was rendered from
+    checker.check_all_updates(force=True)
+    assert poll(checker) is None
+
+    output = checker.get_waybar_output(checker.check_all_updates())
+    assert poll(checker) == output
+    fingerprint["sync/core.db"] = 2.0
+    assert poll(checker) is None
+
+
+def test_running_update_invalidates_and_suppresses_the_snapshot(checker, fingerprint):
+    checker.get_waybar_output(checker.check_all_updates(force=True))
+    assert poll(checker) is not None
+
+    checker.runs_dir.mkdir(parents=True, exist_ok=True)
+    (checker.runs_dir / "run-1.json").write_text(json.dumps({"id": "run-1", "pid": os.getpid(), "started": 1.0}))
+    assert poll(checker) is None
+
+    # While the run is active the output shows it, so nothing is snapshotted
+    checker.get_waybar_output(checker.check_all_updates())
+    assert poll(checker) is None
+    assert not os.path.exists(snapshot_path(str(checker.config_path)))
+
+
+def test_launcher_answers_from_the_snapshot_without_the_checker(checker, cache_home):
+    # The subprocess reads the real pacman DB state, so the checker must too
+    output = checker.get_waybar_output(checker.check_all_updates(force=True))
+    code = (
+        "import sys, arch_updates_simple; arch_updates_simple.main(); "
+        "print('update_checker' in sys.modules, file=sys.stderr)"
+    )
+    env = {key: value for key, value in os.environ.items() if key != "WAYBAR_UPDATES_DBPATH"}
+    env["XDG_CACHE_HOME"] = str(cache_home)
+
+    result = subprocess.run(
+        [sys.executable, "-c", code, "--check", "--config", str(checker.config_path)],
+        cwd=SRC, env=env, capture_output=True, text=True, timeout=30,
+    )
+
+    assert result.stdout.strip() == output
+    assert result.stderr.strip() == "False"
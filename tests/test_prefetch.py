@@ -0,0 +1,191 @@
+"""Tests for the package prefetch stage against a file:// fixture repo and a stub pacman"""
+
+import json
+import os
+import stat
+
+import pytest
+
+import prefetch
+from prefetch import (
+    MANIFEST_FILE,
+    SYSTEM_PACKAGE_CACHE,
+    cache_dir_args,
+    download_packages,
+    pending_package_files,
+    prune_package_cache,
+    run_prefetch,
+)
+
+# Serves the repo behind the first `Server = file://...` line of --config:
+# every package in it is pending, and -Swu copies the missing ones (and their
+# signatures) into --cachedir. A FAIL file in the repo stops after the first one.
+PACMAN = """#!/bin/sh
+conf="" cachedir="" op=""
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --config) conf="$2"; shift ;;
+        --cachedir) cachedir="$2"; shift ;;
+        --dbpath|--logfile|--print-format) shift ;;
+        -*) [ -z "$op" ] && op="$1" ;;
+    esac
+    shift
+done
+repo=$(sed -n 's|^Server = file://||p' "$conf" | head -1 | sed 's|\\$repo|core|; s|\\$arch|x86_64|')
+[ -d "$repo" ] || { echo "error: failed retrieving file from $repo" >&2; exit 1; }
+case "$op" in
+    -Sy) exit 0 ;;
+    -Sup)
+        for f in "$repo"/*.pkg.tar.zst; do [ -e "$f" ] && basename "$f"; done
+        exit 0 ;;
+    -Swu)
+        for f in "$repo"/*.pkg.tar.zst; do
+            [ -e "$f" ] || continue
+            name=$(basename "$f")
+            [ -e "$cachedir/$name" ] && continue
+            cp "$f" "$cachedir/"
+            [ -e "$f.sig" ] && cp "$f.sig" "$cachedir/"
+            [ -e "$repo/FAIL" ] && { echo "error: failed retrieving file" >&2; exit 1; }
+        done
+        exit 0 ;;
+esac
+exit 1
+"""
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    path = bin_dir / "pacman"
+    path.write_text(PACMAN)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    directory = tmp_path / "mirror" / "core" / "os" / "x86_64"
+    directory.mkdir(parents=True)
+    return directory
+
+
+@pytest.fixture
+def conf(tmp_path, repo):
+    path = tmp_path / "pacman.conf"
+    path.write_text(f"[options]\nArchitecture = x86_64\n\n[core]\nServer = file://{tmp_path}/mirror/$repo/os/$arch\n")
+    return path
+
+
+def publish(repo, *names, sig=True):
+    for name in names:
+        (repo / name).write_bytes(name.encode())
+        if sig:
+            (repo / f"{name}.sig").write_bytes(b"sig")
+
+
+def withdraw(repo, *names):
+    for name in names:
+        for path in (repo / name, repo / f"{name}.sig"):
+            if path.exists():
+                path.unlink()
+
+
+LINUX = "linux-6.11.1.arch1-1-x86_64.pkg.tar.zst"
+LINUX_NEXT = "linux-6.11.2.arch1-1-x86_64.pkg.tar.zst"
+MESA = "mesa-1:24.2.3-1-x86_64.pkg.tar.zst"
+
+
+def manifest(package_cache):
+    return set(json.loads((package_cache / MANIFEST_FILE).read_text()))
+
+
+def test_pending_package_files_lists_repo_packages(tmp_path, repo, conf):
+    publish(repo, LINUX, MESA)
+
+    assert pending_package_files(tmp_path / "db", conf) == {LINUX, MESA}
+
+
+def test_pending_package_files_reports_failure(tmp_path, repo, conf, capsys):
+    conf.write_text("[core]\nServer = file:///nonexistent\n")
+
+    assert pending_package_files(tmp_path / "db", conf) is None
+    assert "failed retrieving" in capsys.readouterr().err
+
+
+def test_download_records_files_and_prune_removes_only_those(tmp_path, repo, conf):
+    package_cache = tmp_path / "pkg"
+    package_cache.mkdir()
+    # Files another tool keeps in the same directory
+    (package_cache / "notes.txt").write_text("keep")
+    (package_cache / "firefox-131.0-1-x86_64.pkg.tar.zst").write_bytes(b"")
+    (package_cache / "firefox-131.0-1-x86_64.pkg.tar.zst.sig").write_bytes(b"")
+    db = tmp_path / "db"
+
+    publish(repo, LINUX, MESA)
+    assert download_packages(db, package_cache, conf)
+    assert manifest(package_cache) == {LINUX, f"{LINUX}.sig", MESA, f"{MESA}.sig"}
+
+    withdraw(repo, LINUX)
+    publish(repo, LINUX_NEXT)
+    assert download_packages(db, package_cache, conf)
+    pending = pending_package_files(db, conf)
+    assert pending == {LINUX_NEXT, MESA}
+
+    assert prune_package_cache(package_cache, pending) == 2
+    assert sorted(p.name for p in package_cache.iterdir() if p.name != MANIFEST_FILE) == sorted([
+        "notes.txt",
+        "firefox-131.0-1-x86_64.pkg.tar.zst",
+        "firefox-131.0-1-x86_64.pkg.tar.zst.sig",
+        LINUX_NEXT,
+        f"{LINUX_NEXT}.sig",
+        MESA,
+        f"{MESA}.sig",
+    ])
+    assert manifest(package_cache) == {LINUX_NEXT, f"{LINUX_NEXT}.sig", MESA, f"{MESA}.sig"}
+
+
+def test_failed_download_still_records_partial_results(tmp_path, repo, conf):
+    package_cache = tmp_path / "pkg"
+    publish(repo, LINUX, MESA, sig=False)
+    (repo / "FAIL").touch()
+
+    assert not download_packages(tmp_path / "db", package_cache, conf)
+    downloaded = manifest(package_cache)
+    assert len(downloaded) == 1
+
+    assert prune_package_cache(package_cache, set()) == 1
+    assert not any(package_cache.glob("*.pkg.tar*"))
+
+
+def test_prune_ignores_manifest_entries_outside_the_cache(tmp_path):
+    package_cache = tmp_path / "pkg"
+    package_cache.mkdir()
+    victim = tmp_path / "victim.pkg.tar.zst"
+    victim.write_bytes(b"")
+    (package_cache / MANIFEST_FILE).write_text(json.dumps(["../victim.pkg.tar.zst", "notes.txt"]))
+    (package_cache / "notes.txt").write_text("keep")
+
+    assert prune_package_cache(package_cache, set()) == 0
+    assert victim.exists()
+    assert (package_cache / "notes.txt").exists()
+
+
+def test_run_prefetch_downloads_and_prunes(tmp_path, repo, conf):
+    package_cache = tmp_path / "pkg"
+    publish(repo, LINUX)
+    assert run_prefetch(package_cache, tmp_path / "db", conf)
+    assert (package_cache / LINUX).exists()
+    assert cache_dir_args(package_cache).endswith(f"--cachedir {package_cache}")
+
+    withdraw(repo, LINUX)
+    publish(repo, LINUX_NEXT)
+    assert run_prefetch(package_cache, tmp_path / "db", conf)
+    assert not (package_cache / LINUX).exists()
+    assert (package_cache / LINUX_NEXT).exists()
+
+
+def test_system_cache_is_refused(monkeypatch, capsys):
+    monkeypatch.setattr(prefetch, "sync_databases", lambda *args, **kwargs: pytest.fail("synced"))
+
+    assert not run_prefetch(SYSTEM_PACKAGE_CACHE)
+    assert "system package cache" in capsys.readouterr().err
+    assert not download_packages(SYSTEM_PACKAGE_CACHE, SYSTEM_PACKAGE_CACHE)
+    assert prune_package_cache(SYSTEM_PACKAGE_CACHE, set()) == 0
+    assert cache_dir_args(SYSTEM_PACKAGE_CACHE) == ""
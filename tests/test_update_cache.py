@@ -0,0 +1,148 @@
+"""Tests for the on-disk update cache, its freshness rules and the check lock"""
+
+import json
+import threading
+import time
+
+import pytest
+
+import update_cache
+from update_cache import UpdateCache, diff_updates, parse_update_line
+
+RECORD = {"name": "linux", "old_version": "6.11.1-1", "new_version": "6.11.2-1", "source": "pacman", "repo": "core"}
+
+
+@pytest.fixture
+def fingerprint(monkeypatch):
+    """A pacman DB fingerprint the test can change, as a sync or install would"""
+    current = {"local": 1.0, "sync/core.db": 1.0}
+    monkeypatch.setattr(update_cache, "pacman_db_fingerprint", lambda: dict(current))
+    return current
+
+
+@pytest.fixture
+def cache(tmp_path, fingerprint):
+    return UpdateCache(tmp_path / "cache" / "updates.json", ttl=600)
+
+
+def scheduled(after):
+    return {"checked": time.time(), "next": time.time() + after, "streak": 0, "failures": 0, "error": None}
+
+
+def test_saved_entry_is_fresh_until_a_backend_is_due(cache):
+    assert cache.load_fresh(["pacman"]) is None
+
+    cache.save({"pacman": 1, "total": 1}, [RECORD], {"pacman": scheduled(600), "yay": scheduled(1200)})
+
+    cached = cache.load_fresh(["pacman", "yay"])
+    assert cached["counts"]["total"] == 1
+    assert cached["packages"] == [RECORD]
+    assert cache.fresh_until(cached) == pytest.approx(time.time() + 600, abs=5)
+
+
+def test_due_backend_makes_the_entry_stale(cache):
+    cache.save({"total": 0}, [], {"pacman": scheduled(600), "yay": scheduled(-1)})
+
+    assert cache.load_fresh(["pacman", "yay"]) is None
+    # Stale entries are still there for stale-while-revalidate
+    assert cache.load()["counts"] == {"total": 0}
+
+
+def test_newly_enabled_backend_makes_the_entry_stale(cache):
+    cache.save({"total": 0}, [], {"pacman": scheduled(600)})
+
+    assert cache.load_fresh(["pacman"]) is not None
+    assert cache.load_fresh(["pacman", "flatpak"]) is None
+
+
+def test_pacman_db_change_makes_the_entry_stale(cache, fingerprint):
+    cache.save({"total": 0}, [], {"pacman": scheduled(600)})
+
+    fingerprint["sync/core.db"] = 2.0
+
+    assert cache.load_fresh(["pacman"]) is None
+
+
+def test_entries_without_schedules_use_the_ttl(cache):
+    cache.save({"total": 0})
+    assert cache.load_fresh() is not None
+
+    entry = cache.load()
+    entry["timestamp"] -= 601
+    cache.cache_file.write_text(json.dumps(entry))
+    assert cache.load_fresh() is None
+
+    # A timestamp from the future (clock went back) is not trusted either
+    entry["timestamp"] = time.time() + 3600
+    cache.cache_file.write_text(json.dumps(entry))
+    assert cache.load_fresh() is None
+
+
+@pytest.mark.parametrize("content", ["{", "[1, 2]", ""])
+def test_unreadable_cache_counts_as_missing(cache, content, capsys):
+    cache.cache_file.parent.mkdir()
+    cache.cache_file.write_text(content)
+
+    assert cache.load() is None
+    assert cache.load_fresh() is None
+
+
+def test_save_reports_new_and_applied_updates(cache):
+    mesa = {**RECORD, "name": "mesa"}
+    cache.save({"total": 1}, [RECORD])
+
+    changes = cache.save({"total": 2}, [{**RECORD, "new_version": "6.11.3-1"}, mesa])["changes"]
+
+    assert changes == {"new": ["linux", "mesa"], "applied": []}
+    assert cache.save({"total": 0}, [])["changes"] == {"new": [], "applied": ["linux", "mesa"]}
+    assert not list(cache.cache_file.parent.glob("*.tmp"))
+
+
+def test_diff_and_parse_helpers():
+    assert diff_updates([RECORD], [RECORD]) == {"new": [], "applied": []}
+    record = parse_update_line("yay 12.4.1-1 -> 12.4.2-1", "yay")
+    assert (record["name"], record["new_version"], record["repo"]) == ("yay", "12.4.2-1", "aur")
+    assert parse_update_line("linux 6.11.1-1 -> 6.11.2-1", "pacman")["repo"] is None
+    assert parse_update_line(":: warning: something", "pacman") is None
+
+
+def test_check_lock_is_exclusive(cache):
+    with cache.check_lock() as first:
+        assert first
+        started = time.monotonic()
+        with cache.check_lock(timeout=0.3) as second:
+            assert not second
+        assert time.monotonic() - started >= 0.3
+
+    with cache.check_lock() as again:
+        assert again
+
+
+def test_check_lock_waits_for_the_holder(cache):
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with cache.check_lock() as acquired:
+            assert acquired
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert held.wait(5)
+    threading.Timer(0.2, release.set).start()
+
+    with cache.check_lock(timeout=5) as acquired:
+        assert acquired
+    holder.join()
+
+
+def test_unusable_lock_file_does_not_block_checks(tmp_path, fingerprint, capsys):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = UpdateCache(blocker / "updates.json", ttl=600)
+
+    with cache.check_lock() as acquired:
+        assert acquired
+    assert "lock file" in capsys.readouterr().err
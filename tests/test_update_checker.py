@@ -0,0 +1,155 @@
+"""Tests for the checker's backend scheduling and command line"""
+
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+import backends
+import update_checker
+from update_checker import RESULT_MODES, SERVICE_MODES, ArchUpdateChecker, build_parser, selected_mode
+
+
+class CheapBackend(backends.UpdateBackend):
+    name = "pacman"
+
+    def check(self, timeout=None):
+        return 1, ["linux 6.11.1.arch1-1 -> 6.11.2.arch1-1"]
+
+
+class SlowBackend(backends.UpdateBackend):
+    name = "flatpak"
+    cost = "expensive"
+    # Set by the test once it has looked at the cache
+    release = threading.Event()
+
+    def check(self, timeout=None):
+        assert self.release.wait(5)
+        return 1, ["org.gnome.Maps 46.1 -> 46.2"]
+
+
+@pytest.fixture
+def checker(monkeypatch, tmp_path):
+    monkeypatch.setitem(backends.BACKENDS, "pacman", CheapBackend)
+    monkeypatch.setitem(backends.BACKENDS, "flatpak", SlowBackend)
+    SlowBackend.release = threading.Event()
+    pacman_log = tmp_path / "pacman.log"
+    pacman_log.write_text("")
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({
+        "update_settings": {
+            "check_interval": 600,
+            "check_timeout": 30,
+            "package_managers": ["pacman", "flatpak"],
+            "cache_dir": str(tmp_path / "cache"),
+            "pacman_log": str(pacman_log),
+            "journal": {"enabled": False},
+            "history": {"enabled": False},
+            "icons": {"no_updates": "ok", "updates_available": "up", "updating": "..", "error": "!"},
+            "colors": {"no_updates": "green", "updates_available": "yellow", "updating": "blue", "error": "red"},
+        }
+    }))
+    return ArchUpdateChecker(str(config))
+
+
+def test_cheap_results_are_cached_before_expensive_backends_finish(checker):
+    seen = []
+
+    def on_partial(counts):
+        seen.append((counts, checker.cache.load()["counts"]))
+        SlowBackend.release.set()
+
+    counts = checker.check_all_updates(force=True, on_partial=on_partial)
+
+    partial, cached = seen[0]
+    assert partial["pacman"] == cached["pacman"] == 1
+    assert partial.get("flatpak", 0) == cached.get("flatpak", 0) == 0
+    assert counts["flatpak"] == 1
+    assert checker.cache.load()["counts"]["total"] == 2
+
+
+def test_first_waybar_poll_defers_expensive_backends(checker, monkeypatch):
+    started = []
+    monkeypatch.setattr(checker, "start_background_refresh", lambda: started.append(True))
+
+    checker.check_all_updates(background=True)
+
+    assert started == [True]
+    cached = checker.cache.load()
+    assert cached["counts"]["pacman"] == 1
+    assert cached["counts"].get("flatpak", 0) == 0
+
+
+def test_journal_scan_runs_next_to_the_cheap_backends(checker, monkeypatch):
+    scans = []
+    seen = []
+    monkeypatch.setitem(checker.journal.settings, "enabled", True)
+    monkeypatch.setattr(checker.journal, "scan", lambda: scans.append(threading.current_thread().name) or [])
+    SlowBackend.release.set()
+
+    checker.check_all_updates(force=True, on_partial=lambda counts: seen.append(list(scans)))
+
+    assert len(scans) == 1
+    assert scans[0].startswith("update-check")
+    assert seen == [scans]
+
+
+def test_lock_timeout_serves_the_other_checks_result(checker, monkeypatch):
+    monkeypatch.setitem(checker.config["update_settings"], "check_timeout", 0.5)
+    monkeypatch.setattr(checker, "_run_all_checks", lambda *args, **kwargs: pytest.fail("checked twice"))
+
+    with checker.cache.check_lock() as acquired:
+        assert acquired
+        # The process holding the lock publishes while this one waits
+        threading.Timer(0.1, checker.cache.save, ({"pacman": 3, "total": 3},)).start()
+        counts = checker.check_all_updates()
+
+    assert counts["pacman"] == 3
+    assert json.loads(checker.get_waybar_output(counts))["class"] == "updates-available"
+
+
+def test_lock_timeout_without_a_cache_reports_an_error(checker, monkeypatch):
+    monkeypatch.setitem(checker.config["update_settings"], "check_timeout", 0.2)
+    monkeypatch.setattr(checker, "_run_all_checks", lambda *args, **kwargs: pytest.fail("checked twice"))
+
+    with checker.cache.check_lock():
+        counts = checker.check_all_updates()
+
+    output = json.loads(checker.get_waybar_output(counts))
+    assert output["class"] == "error"
+    assert "still running" in output["tooltip"]
+
+
+FEATURE_MODULES = (
+    "journal_scan", "pacman_log", "pacman_watch", "prefetch", "update_daemon", "update_executor",
+    "waybar_watch", "fleet", "lan_cache", "aur_build", "upgrade_plan", "update_history", "package_index",
+)
+
+
+def test_importing_the_checker_loads_no_feature_modules():
+    code = f"import sys, update_checker; print([m for m in {FEATURE_MODULES!r} if m in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(update_checker.__file__).parent, capture_output=True, text=True
+    )
+
+    assert result.stdout.strip() == "[]", result.stderr
+
+
+@pytest.mark.parametrize(
+    "argv, modes, handler",
+    [
+        (["--serve-cache"], SERVICE_MODES, "run_serve_cache"),
+        (["--watch", "--daemon"], SERVICE_MODES, "run_daemon"),
+        (["--status", "--list"], RESULT_MODES, "run_list"),
+        (["--history"], RESULT_MODES, "run_history"),
+        (["--refresh"], RESULT_MODES, None),
+        ([], SERVICE_MODES, None),
+    ],
+)
+def test_command_line_modes(argv, modes, handler):
+    selected = selected_mode(build_parser().parse_args(argv), modes)
+
+    assert (selected.__name__ if selected else None) == handler
@@ -0,0 +1,199 @@
+"""Tests for progress parsing and publishing of running update commands"""
+
+import json
+import os
+import subprocess
+
+import pytest
+
+import update_executor
+from update_executor import PUBLISH_INTERVAL, ProgressParser, ProgressPublisher, active_runs, format_progress
+
+# pacman -Syu on a tty with ParallelDownloads = 3, as captured from the terminal log
+PACMAN_SYU = (
+    ":: Synchronizing package databases...\n"
+    " core                 115.9 KiB   450 KiB/s 00:00 [######################] 100%\r"
+    " extra                  7.9 MiB  9.10 MiB/s 00:01 [######################] 100%\n"
+    ":: Starting full system upgrade...\n"
+    "resolving dependencies...\n"
+    "looking for conflicting packages...\n"
+    "\n"
+    "Packages (3) linux-6.11.2.arch1-1  mesa-1:24.2.4-1  vim-9.1.0785-1\n"
+    "\n"
+    "Total Download Size:   180.50 MiB\n"
+    "Total Installed Size:  400.12 MiB\n"
+    "\n"
+    ":: Proceed with installation? [Y/n] \n"
+    ":: Retrieving packages...\n"
+    " linux-6.11.2.arch1-1-x86_64   50.0 MiB  10.0 MiB/s 00:05 [####------------------]  35%\r"
+    " Total (0/3)                   60.0 MiB  12.0 MiB/s 00:10 [######----------------]  33%\r"
+    " Total (2/3)                  150.0 MiB  12.0 MiB/s 00:02 [##################----]  83%\r"
+    " Total (3/3)                  180.5 MiB  12.0 MiB/s 00:00 [######################] 100%\n"
+    "(3/3) checking keys in keyring                   [######################] 100%\r"
+    "(3/3) checking package integrity                 [######################] 100%\n"
+    ":: Processing package changes...\n"
+    "(1/3) upgrading linux                            [######################] 100%\n"
+    "(2/3) upgrading mesa                             [##########------------]  50%\r"
+    "(2/3) upgrading mesa                             [######################] 100%\n"
+    ":: Running post-transaction hooks...\n"
+    "(1/2) Updating linux initcpios...\n"
+)
+
+# The same upgrade without a tty: one line per file and per step, no bars
+PACMAN_PLAIN = (
+    ":: Retrieving packages...\n"
+    " linux-6.11.2.arch1-1-x86_64 downloading...\n"
+    " mesa-1:24.2.4-1-x86_64 downloading...\n"
+    ":: Processing package changes...\n"
+    "upgrading linux...\n"
+)
+
+YAY = (
+    ":: Searching AUR for updates...\n"
+    " -> Packages to upgrade: yay-bin\n"
+    "==> Making package: yay-bin 12.4.2-1 (Wed 16 Oct 2026 09:12:44 CEST)\n"
+    "==> Checking runtime dependencies...\n"
+)
+
+
+def bar(label, percent):
+    return f" {label:<30} 10.0 MiB  5.0 MiB/s 00:01 [##########] {percent:3d}%\r"
+
+
+def replay(parser, output, chunk=7):
+    """Feed output in small chunks, like a pipe would deliver it; return every progress change"""
+    changes = []
+    for start in range(0, len(output), chunk):
+        if parser.feed(output[start:start + chunk]):
+            changes.append(dict(parser.progress))
+    if parser.finish():
+        changes.append(dict(parser.progress))
+    return changes
+
+
+def phases(changes):
+    seen = []
+    for progress in changes:
+        if not seen or seen[-1] != progress["phase"]:
+            seen.append(progress["phase"])
+    return seen
+
+
+def test_pacman_upgrade_moves_through_every_phase():
+    parser = ProgressParser(3)
+    changes = replay(parser, PACMAN_SYU)
+
+    assert phases(changes) == ["sync", "resolve", "download", "verify", "install", "hooks"]
+    download = [p for p in changes if p["phase"] == "download"]
+    # The aggregate Total bar wins over the per-file bar once pacman draws it
+    assert [p["percent"] for p in download if p["rate"] == "12.0 MiB/s"][-3:] == [33, 83, 100]
+    assert download[-1]["done"] == download[-1]["total"] == 3
+    assert [(p["done"], p["percent"]) for p in changes if p["phase"] == "install"][-2:] == [(1, 50), (2, 67)]
+    assert parser.progress["packages"] == 3
+    assert parser.progress["download_size"] == "180.50 MiB"
+
+
+def test_parallel_download_bars_are_summed_per_slot():
+    parser = ProgressParser(2)
+    parser.feed("Packages (4) a-1-1  b-1-1  c-1-1  d-1-1\n:: Retrieving packages...\n")
+
+    parser.feed(bar("a-1-1-x86_64", 50) + bar("b-1-1-x86_64", 50))
+    assert (parser.progress["percent"], parser.progress["active_downloads"]) == (25, 2)
+
+    parser.feed(bar("a-1-1-x86_64", 100) + bar("c-1-1-x86_64", 20))
+    assert parser.progress["done"] == 1
+    assert (parser.progress["percent"], parser.progress["active_downloads"]) == (42, 2)
+
+    # Only two bars fit on screen, so b is no longer drawn once d starts
+    parser.feed(bar("d-1-1-x86_64", 10) + bar("c-1-1-x86_64", 40))
+    assert (parser.progress["percent"], parser.progress["active_downloads"]) == (37, 2)
+    assert "2/2 parallel" in format_progress({"name": "System Update", **parser.progress})
+
+
+def test_plain_output_counts_files_and_steps():
+    parser = ProgressParser()
+    parser.feed("Packages (2) linux-6.11.2.arch1-1  mesa-1:24.2.4-1\n")
+    changes = replay(parser, PACMAN_PLAIN)
+
+    download = [p for p in changes if p["phase"] == "download"]
+    assert [(p["done"], p["total"], p["percent"]) for p in download][-1] == (2, 2, 100)
+    assert (parser.progress["phase"], parser.progress["current"], parser.progress["percent"]) == ("install", "linux", 50)
+
+
+def test_aur_helper_build_is_reported():
+    parser = ProgressParser()
+    changes = replay(parser, YAY, chunk=3)
+
+    assert phases(changes) == ["resolve", "build"]
+    assert parser.progress["current"] == "yay-bin"
+    assert format_progress({"name": "AUR Update", **parser.progress}) == "AUR Update: build yay-bin"
+
+
+def test_last_line_without_newline_is_parsed_on_finish():
+    parser = ProgressParser()
+    assert not parser.feed(":: Running post-transaction hooks...")
+    assert parser.finish()
+    assert parser.progress["phase"] == "hooks"
+
+
+def test_format_progress():
+    run = {
+        "name": "System Update",
+        "phase": "download",
+        "done": 3,
+        "total": 12,
+        "percent": 45,
+        "rate": "4.2 MiB/s",
+        "parallel_downloads": 5,
+    }
+
+    assert format_progress(run) == "System Update: download 3/12 45% (5 parallel, 4.2 MiB/s)"
+    assert format_progress({**run, "active_downloads": 4}) == "System Update: download 3/12 45% (4/5 parallel, 4.2 MiB/s)"
+    assert format_progress({"name": "Pacman Update"}) == "Pacman Update: starting"
+
+
+@pytest.fixture
+def signals(monkeypatch):
+    sent = []
+    monkeypatch.setattr(update_executor, "signal_waybar", sent.append)
+    return sent
+
+
+def test_publisher_lifecycle(tmp_path, signals):
+    path = tmp_path / "run-1.json"
+    seen = []
+    publisher = ProgressPublisher(
+        path, {"id": "run-1", "name": "System Update", "pid": os.getpid(), "started": 1.0}, seen.append, 8
+    )
+
+    publisher.update({"phase": "starting", "percent": None}, force=True)
+    assert json.loads(path.read_text())["phase"] == "starting"
+    assert [run["id"] for run in active_runs(tmp_path)] == ["run-1"]
+
+    # Within PUBLISH_INTERVAL only a phase change is written
+    publisher.update({"phase": "starting", "percent": 1})
+    assert json.loads(path.read_text())["percent"] is None
+    publisher.update({"phase": "download", "percent": 2})
+    assert json.loads(path.read_text())["percent"] == 2
+    publisher._written -= PUBLISH_INTERVAL
+    publisher.update({"phase": "download", "percent": 3})
+    assert json.loads(path.read_text())["percent"] == 3
+    assert [run["percent"] for run in seen] == [None, 2, 3]
+    assert len(signals) == 2
+
+    publisher.close()
+    publisher.close()
+    assert not path.exists()
+    assert active_runs(tmp_path) == []
+    assert len(signals) == 3
+
+
+def test_runs_of_dead_processes_are_removed(tmp_path):
+    process = subprocess.Popen(["true"])
+    process.wait()
+    (tmp_path / "run-1.json").write_text(json.dumps({"id": "run-1", "pid": process.pid, "started": 1.0}))
+    (tmp_path / "run-2.json").write_text(json.dumps({"id": "run-2", "pid": os.getpid(), "started": 2.0}))
+    (tmp_path / "run-3.json").write_text("{")
+
+    assert [run["id"] for run in active_runs(tmp_path)] == ["run-2"]
+    assert not (tmp_path / "run-1.json").exists()
@@ -0,0 +1,143 @@
+"""Tests for the SQLite update history store"""
+
+import time
+
+import pytest
+
+import update_history
+from update_history import COMPACT_INTERVAL, UpdateHistory, maintain_history, record_history
+
+pytest.importorskip("sqlite3")
+
+
+def noon(day):
+    """Local noon on 2026-10-<day>, so the local date never depends on the time zone"""
+    return time.mktime((2026, 10, day, 12, 0, 0, 0, 0, -1))
+
+
+def record(name, repo, source="pacman"):
+    return {"name": name, "old_version": "1-1", "new_version": "2-1", "source": source, "repo": repo}
+
+
+def upgraded(day, name):
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(noon(day)))
+    return f"[{stamp}] [ALPM] upgraded {name} (1-1 -> 2-1)\n"
+
+
+@pytest.fixture
+def settings(tmp_path):
+    log = tmp_path / "pacman.log"
+    log.write_text("")
+    return {"enabled": True, "raw_days": 90, "pacman_log": str(log)}
+
+
+@pytest.fixture
+def history(tmp_path, settings):
+    with UpdateHistory(tmp_path / "history.sqlite", settings) as history:
+        yield history
+
+
+def test_checks_are_summarised_per_day(history):
+    history.record_check(
+        noon(14), 2.0, {"pacman": 1.5, "aur": 0.5}, {}, {"total": 2},
+        [record("linux", "core"), record("mesa", "extra")],
+    )
+    history.record_check(
+        noon(14) + 60, 4.0, {"pacman": 2.5}, {"aur": "timed out"}, {"total": 1}, [record("linux", "core")]
+    )
+    history.record_check(noon(15), 1.0, {"pacman": 1.0}, {}, {"total": 0}, [])
+
+    days = list(history.by_day())
+
+    assert [day["day"] for day in days] == ["2026-10-14", "2026-10-15"]
+    first = days[0]
+    assert first["checks"] == 2
+    assert first["check_seconds"] == {"avg": 3.0, "max": 4.0}
+    assert first["updates"] == {"avg": 1.5, "max": 2}
+    assert first["backends"]["pacman"] == {"failures": 0, "checks": 2, "avg_seconds": 2.0, "max_seconds": 2.5}
+    assert first["backends"]["aur"]["failures"] == 1
+    assert first["pending"] == {"core": {"avg": 1.0, "max": 1}, "extra": {"avg": 0.5, "max": 1}}
+    assert list(history.by_day(since=noon(15) - 3600))[0]["day"] == "2026-10-15"
+
+
+def test_maintain_imports_new_upgrades_once_with_their_repo(history, settings):
+    history.record_check(noon(14), 1.0, {}, {}, {"total": 2}, [record("linux", "core"), record("yay", "aur", "yay")])
+    log = settings["pacman_log"]
+    with open(log, "a") as f:
+        f.write(upgraded(15, "linux") + upgraded(15, "yay") + upgraded(15, "vim"))
+
+    assert history.maintain(noon(15)) == 3
+    assert history.maintain(noon(15)) == 0
+    with open(log, "a") as f:
+        f.write(upgraded(16, "linux"))
+    assert history.maintain(noon(16)) == 1
+
+    repos = {row["repo"]: row for row in history.by_repo()}
+    assert repos["core"] == {"repo": "core", "pending_avg": 1.0, "pending_max": 1, "upgrades": 2}
+    assert repos["aur"]["upgrades"] == 1
+    assert repos["unknown"]["upgrades"] == 1
+    assert list(history.by_day())[1]["upgrades"] == {"aur": 1, "core": 1, "unknown": 1}
+
+
+def test_import_log_batches_a_long_first_import(history, settings, monkeypatch):
+    monkeypatch.setattr(update_history, "IMPORT_BATCH", 3)
+    with open(settings["pacman_log"], "a") as f:
+        f.writelines(upgraded(15, f"pkg{i}") for i in range(10))
+
+    assert history.maintain(noon(15)) == 10
+    assert history.conn.execute("SELECT COUNT(*) FROM upgrades").fetchone()[0] == 10
+
+
+def test_compact_rolls_up_old_samples_and_frees_pages(history):
+    assert history.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    records = [record(f"package-with-a-long-name-{i}", f"repo{i}") for i in range(50)]
+    for minute in range(200):
+        history.record_check(noon(1) + minute * 60, 1.0, {"pacman": 0.5}, {}, {"total": 50}, records)
+    history.record_check(noon(15), 3.0, {"pacman": 0.5}, {}, {"total": 0}, [])
+    before = list(history.by_day())
+    pages = history.conn.execute("PRAGMA page_count").fetchone()[0]
+
+    # 2026-10-01 is older than raw_days from 2027-01-05, 2026-10-15 is not
+    history.compact(noon(15) + 82 * 86400)
+
+    assert list(history.by_day()) == before
+    assert history.conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == 3
+    assert history.conn.execute("SELECT COUNT(DISTINCT day) FROM rollups").fetchone()[0] == 1
+    assert history.conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert history.conn.execute("PRAGMA page_count").fetchone()[0] < pages
+
+
+def test_maintain_compacts_once_per_interval(history, monkeypatch):
+    calls = []
+    compact = history.compact
+    monkeypatch.setattr(history, "compact", lambda now: calls.append(now) or compact(now))
+
+    history.maintain(noon(15))
+    history.maintain(noon(15) + COMPACT_INTERVAL - 1)
+    history.maintain(noon(15) + COMPACT_INTERVAL)
+
+    assert calls == [noon(15), noon(15) + COMPACT_INTERVAL]
+
+
+def test_recording_a_check_leaves_the_log_alone(tmp_path, settings):
+    path = tmp_path / "history.sqlite"
+    with open(settings["pacman_log"], "a") as f:
+        f.write(upgraded(15, "linux"))
+
+    record_history(path, settings, noon(15), 1.0, {}, {}, {"total": 0}, [])
+    with UpdateHistory(path, settings) as history:
+        assert history.conn.execute("SELECT COUNT(*) FROM upgrades").fetchone()[0] == 0
+
+    maintain_history(path, settings)
+    with UpdateHistory(path, settings) as history:
+        assert history.conn.execute("SELECT COUNT(*) FROM upgrades").fetchone()[0] == 1
+
+
+def test_disabled_history_writes_nothing(tmp_path, settings):
+    path = tmp_path / "history.sqlite"
+    settings["enabled"] = False
+
+    record_history(path, settings, noon(15), 1.0, {}, {}, {"total": 0}, [])
+    maintain_history(path, settings)
+
+    assert not path.exists()
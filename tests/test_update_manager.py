@@ -0,0 +1,260 @@
+"""Tests for the update menu and its fallback when no GUI toolkit is installed"""
+
+import json
+import os
+import queue
+import stat
+import subprocess
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+import update_manager
+from update_manager import (
+    MENU_COMMAND_EVENT,
+    MENU_STATUS_KEY,
+    MENU_UPDATES_EVENT,
+    ArchUpdateManager,
+    gui_available,
+)
+
+SRC = Path(update_manager.__file__).parent
+SHIPPED_CONFIG = SRC.parent / "scripts" / "update_config.json"
+
+LINUX = {"name": "linux", "old_version": "6.11.1-1", "new_version": "6.11.2-1", "source": "pacman", "repo": "core"}
+YAY = {"name": "yay", "old_version": "12.4.1-1", "new_version": "12.4.2-1", "source": "yay", "repo": "aur"}
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """The shipped configuration with its state moved into tmp_path"""
+    config = json.loads(SHIPPED_CONFIG.read_text())
+    config["update_settings"].update({
+        "package_managers": [],
+        "cache_dir": str(tmp_path / "cache"),
+        "journal": {"enabled": False},
+        "history": {"enabled": False},
+    })
+    path = tmp_path / "update_config.json"
+    path.write_text(json.dumps(config))
+    return path
+
+
+@pytest.fixture
+def manager(config_path, monkeypatch):
+    monkeypatch.setattr(update_manager, "query_daemon", lambda *args, **kwargs: None)
+    return ArchUpdateManager(str(config_path))
+
+
+def seed_cache(manager, records):
+    """Store a fresh result so no backend has to run"""
+    manager.update_details = records
+    manager.update_count = {"total": len(records)}
+    manager.cache_updates()
+
+
+@pytest.fixture
+def no_gui(monkeypatch):
+    # A None entry makes `import PySimpleGUI` raise ImportError
+    monkeypatch.setitem(sys.modules, "PySimpleGUI", None)
+    monkeypatch.setattr(update_manager, "sg", update_manager._ConsoleDialogs)
+    monkeypatch.setattr(update_manager, "_gui_loaded", None)
+
+
+def test_gui_available_falls_back_to_console_dialogs(no_gui):
+    assert not gui_available()
+    assert update_manager.sg is update_manager._ConsoleDialogs
+    # The failed import is remembered
+    sys.modules["PySimpleGUI"] = types.ModuleType("PySimpleGUI")
+    assert not gui_available()
+
+
+def test_gui_available_imports_the_toolkit_once(monkeypatch):
+    fake = types.ModuleType("PySimpleGUI")
+    monkeypatch.setitem(sys.modules, "PySimpleGUI", fake)
+    monkeypatch.setattr(update_manager, "sg", update_manager._ConsoleDialogs)
+    monkeypatch.setattr(update_manager, "_gui_loaded", None)
+
+    assert gui_available()
+    assert update_manager.sg is fake
+
+
+def test_menu_without_gui_points_at_the_terminal_modes(manager, no_gui, capsys):
+    manager.show_popup_menu()
+
+    out = capsys.readouterr().out
+    assert "--list" in out and "--upgrade" in out
+
+
+def test_interactive_update_without_gui_prints_journal_errors(manager, no_gui, monkeypatch, capsys):
+    groups = [{"unit": "foo.service", "message": "segfault", "count": 2, "priority": 3, "last_seen": 1.0}]
+    acknowledged = []
+    monkeypatch.setattr(manager, "check_journal_errors", lambda: groups)
+    monkeypatch.setattr(manager, "acknowledge_journal_errors", acknowledged.append)
+    monkeypatch.setattr(update_manager, "format_group", lambda group: f"{group['unit']}: {group['message']}")
+
+    manager.run_interactive_update()
+
+    out = capsys.readouterr().out
+    assert "foo.service: segfault" in out
+    assert "--upgrade" in out
+    assert acknowledged == [groups]
+
+
+@pytest.mark.parametrize("answer, confirmed", [("y", True), ("YES", True), ("", False), ("n", False)])
+def test_confirm_command_asks_on_the_terminal_without_gui(manager, no_gui, monkeypatch, answer, confirmed):
+    monkeypatch.setattr("builtins.input", lambda prompt: answer)
+
+    assert manager.confirm_command("sudo pacman -Syu") is confirmed
+
+
+def test_declined_command_does_not_run(manager, no_gui, monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda prompt: "n")
+    monkeypatch.setattr(update_manager, "UpdateExecutor", lambda *args: pytest.fail("executed"))
+
+    assert not manager.execute_command("sudo pacman -Syu", requires_confirmation=True)
+
+
+def stub_script(path, body):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"#!/bin/sh\n{body}\n")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+
+def test_full_update_button_runs_the_installed_checker(manager, no_gui, tmp_path, monkeypatch, capfd):
+    # Stands in for the checker install.sh puts in ~/.config/waybar/scripts
+    home = tmp_path / "home"
+    checker = home / ".config" / "waybar" / "scripts" / "arch_updates_simple.py"
+    stub_script(checker, 'echo "checker $*"; echo "cachedirs=$WAYBAR_UPDATES_CACHEDIRS"')
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setattr("builtins.input", lambda prompt: "y")
+    monkeypatch.setattr("update_executor.signal_waybar", lambda signal: None)
+    # A prefetched package makes the upgrade pass the extra --cachedir
+    manager.package_cache.mkdir(parents=True)
+    (manager.package_cache / "linux-6.11.2-1-x86_64.pkg.tar.zst").write_bytes(b"")
+    button = next(b for b in manager.config["menu_buttons"] if b["key"] == "full_update")
+    seen = []
+
+    assert manager.execute_command(button["command"], False, button["requires_confirmation"], button["name"], seen.append)
+
+    out = capfd.readouterr().out
+    assert "checker --upgrade" in out
+    assert f"--cachedir {manager.package_cache}" in out
+    assert seen and seen[0]["name"] == "System Update"
+
+
+def test_list_and_upgrade_work_without_the_gui_toolkit(manager, tmp_path, config_path):
+    seed_cache(manager, [LINUX, YAY])
+    # Shadows any installed toolkit with one that cannot be imported
+    blocked = tmp_path / "blocked"
+    blocked.mkdir()
+    (blocked / "PySimpleGUI.py").write_text("raise ImportError('no display')\n")
+    env = {**os.environ, "PYTHONPATH": str(blocked)}
+
+    listed = subprocess.run(
+        [sys.executable, str(SRC / "arch_updates.py"), "--config", str(config_path), "--no-daemon", "--list"],
+        capture_output=True, text=True, env=env, timeout=30,
+    )
+    # update_terminal.sh counts AUR updates by this prefix
+    assert listed.stdout.splitlines() == ["core/linux 6.11.1-1 -> 6.11.2-1", "aur/yay 12.4.1-1 -> 12.4.2-1"]
+    assert listed.returncode == 0, listed.stderr
+
+    help_text = subprocess.run(
+        [sys.executable, str(SRC / "arch_updates_simple.py"), "--help"], capture_output=True, text=True, env=env
+    ).stdout
+    assert "--upgrade" in help_text and "--list" in help_text
+
+
+class FakeElement:
+    def __init__(self, key):
+        self.key = key
+        self.updates = []
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+
+    def set_tooltip(self, tooltip):
+        self.updates.append({"tooltip": tooltip})
+
+
+class FakeWindow:
+    """Replays queued events; the menu's own worker events arrive through write_event_value"""
+
+    def __init__(self, *args, **kwargs):
+        self.events = queue.Queue()
+        self.elements = {}
+        self.read_events = []
+        self.closed = False
+        FakeWindow.last = self
+
+    def __getitem__(self, key):
+        return self.elements.setdefault(key, FakeElement(key))
+
+    def read(self, timeout=None):
+        try:
+            event, values = self.events.get(timeout=5)
+        except queue.Empty:
+            event, values = "close", {}
+        self.read_events.append(event)
+        return event, values
+
+    def write_event_value(self, event, value):
+        self.events.put((event, {event: value}))
+        # Close once the menu recounted after the command finished
+        finished = [e for e in self.read_events if isinstance(e, tuple) and e[0] == MENU_COMMAND_EVENT]
+        if event == MENU_UPDATES_EVENT and finished:
+            self.events.put(("close", {}))
+
+    def keep_on_top_set(self):
+        pass
+
+    def keep_on_top_clear(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def fake_toolkit():
+    sg = types.ModuleType("PySimpleGUI")
+    sg.WINDOW_CLOSED = None
+    sg.TIMEOUT_KEY = "__TIMEOUT__"
+    sg.theme = lambda name: None
+    sg.Text = sg.Button = lambda *args, **kwargs: (args, kwargs)
+    sg.HSeparator = lambda *args, **kwargs: None
+    sg.Window = FakeWindow
+    return sg
+
+
+def test_menu_runs_a_button_command_and_recounts(manager, monkeypatch):
+    monkeypatch.setitem(sys.modules, "PySimpleGUI", fake_toolkit())
+    monkeypatch.setattr(update_manager, "_gui_loaded", None)
+    monkeypatch.setitem(manager.config["menu_buttons"][0], "requires_confirmation", False)
+    seed_cache(manager, [LINUX])
+    executed = []
+
+    def execute(command, terminal, requires_confirmation, name, on_progress):
+        executed.append((command, terminal, name))
+        on_progress({"name": name, "phase": "download", "done": 0, "total": 1})
+        seed_cache(manager, [])
+        return True
+
+    monkeypatch.setattr(manager, "execute_command", execute)
+    # Press the button before anything else happens
+    original_init = FakeWindow.__init__
+
+    def init(window, *args, **kwargs):
+        original_init(window, *args, **kwargs)
+        window.events.put(("full_update", {}))
+
+    monkeypatch.setattr(FakeWindow, "__init__", init)
+
+    manager.show_popup_menu()
+
+    window = FakeWindow.last
+    assert window.closed
+    assert executed == [("~/.config/waybar/scripts/arch_updates_simple.py --upgrade", True, "System Update")]
+    assert window["full_update"].updates == [{"disabled": True}, {"disabled": False}]
+    assert window[MENU_STATUS_KEY].updates[-2]["value"] == "✅ System up to date"
@@ -0,0 +1,49 @@
+"""Tests for the fused upgrade planner"""
+
+import os
+
+import upgrade_plan
+from update_cache import parse_update_line
+
+
+def touch_dbs(sync_dir, repos, mtime):
+    sync_dir.mkdir(parents=True, exist_ok=True)
+    for repo in repos:
+        path = sync_dir / f"{repo}.db"
+        path.write_bytes(b"")
+        os.utime(path, (mtime, mtime))
+
+
+def test_plan_from_records_without_sizes(monkeypatch, tmp_path):
+    monkeypatch.setattr(upgrade_plan, "configured_repos", lambda: [])
+    records = [
+        parse_update_line("linux 6.11.1.arch1-1 -> 6.11.2.arch1-1", "pacman"),
+        parse_update_line("mesa 1:24.2.3-1 -> 1:24.2.4-1", "pacman"),
+    ]
+    records[1]["download_size"] = 1024
+
+    plan = upgrade_plan.build_upgrade_plan(records, {"sync_db_path": str(tmp_path)}, now=1000)
+
+    assert plan["repo"]["download_size"] == 1024
+    assert [p["download_size"] for p in plan["repo"]["packages"]] == [0, 1024]
+    assert plan["steps"][0]["command"][:3] == ["sudo", "pacman", "-Syu"]
+
+
+def test_fresh_system_dbs_are_used_without_sync(tmp_path):
+    touch_dbs(tmp_path / "system", ["core", "extra"], 900)
+    touch_dbs(tmp_path / "private", ["core", "extra"], 800)
+
+    plan = upgrade_plan.database_plan(tmp_path / "private", tmp_path / "system", ["core", "extra"], 3600, now=1000)
+
+    assert plan["action"] == "current"
+
+
+def test_fresher_private_dbs_are_never_installed(tmp_path):
+    touch_dbs(tmp_path / "system", ["core", "extra"], 100)
+    touch_dbs(tmp_path / "private", ["core", "extra"], 990)
+
+    plan = upgrade_plan.database_plan(tmp_path / "private", tmp_path / "system", ["core", "extra"], 3600, now=1000)
+
+    # Stale system DBs are always synced together with the upgrade
+    assert plan["action"] == "sync"
+    assert "files" not in plan